@@ -0,0 +1,342 @@
+# -*- coding: utf-8 -*-
+
+"""
+***************************************************************************
+    pdal_batch_pipeline_executor.py
+    -------------------------
+    begin                : October 2026
+    copyright            : (C) 2026 by Luigi Pirelli
+    email                : luipir at gmail dot com
+    dev for              : http://cartolab.udc.es/cartoweb/
+    Project              : http://cartolab.udc.es/geomove/
+***************************************************************************
+*                                                                         *
+*   This program is free software; you can redistribute it and/or modify  *
+*   it under the terms of the GNU General Public License as published by  *
+*   the Free Software Foundation; either version 2 of the License, or     *
+*   (at your option) any later version.                                   *
+*                                                                         *
+***************************************************************************
+"""
+
+__author__ = 'Luigi Pirelli'
+__date__ = 'October 2026'
+__copyright__ = '(C) 2026, Luigi Pirelli'
+
+# other common modules
+import os
+import glob
+import string
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from qgis.core import (
+    QgsProcessingException,
+    QgsProcessingParameterFile,
+    QgsProcessingParameterBoolean,
+    QgsProcessingParameterNumber,
+    QgsProcessingParameterFolderDestination,
+    QgsProcessingParameterString,
+    QgsProcessingOutputNumber,
+    QgsProcessingOutputString)
+from ..pdal_tools_algorithm import PDALtoolsAlgorithm
+from ..pdal_tools_utils import PDALtoolsUtils
+
+class PdalBatchPipelineExecutor(PDALtoolsAlgorithm):
+    """
+    Run the same pipeline on a list of input files using a pool
+    of concurrent pdal processes.
+    Inputs are all files of the input folder matching the patterns
+    (e.g. *.las;*.laz) and/or the files listed one per line.
+    Each output is written in the output folder with a name
+    generated by the output template where {basename} is replaced
+    with the input filename without extension, {name} with the
+    input filename and {index} with the job number,
+    e.g. {basename}_dtm.tif. The template is a file name: folders,
+    absolute paths and ".." are not allowed.
+    Failed jobs does not stop the others: their errors are
+    reported in the ERRORS output.
+    """
+
+    INPUT_FOLDER = 'INPUT_FOLDER'
+    INPUT_PATTERNS = 'INPUT_PATTERNS'
+    INPUT_FILES = 'INPUT_FILES'
+    INPUT_PIPELINE = 'INPUT_PIPELINE'
+    INPUT_SKIP_IF_OUT_EXISTS = 'INPUT_SKIP_IF_OUT_EXISTS'
+    OUTPUT_TEMPLATE = 'OUTPUT_TEMPLATE'
+    OUTPUT_TEMPLATE_FIELDS = ('basename', 'name', 'index')
+    WORKERS = 'WORKERS'
+    OUTPUT_FOLDER = 'OUTPUT_FOLDER'
+    PROCESSED = 'PROCESSED'
+    SKIPPED = 'SKIPPED'
+    FAILED = 'FAILED'
+    ERRORS = 'ERRORS'
+    EXECUTION_MODE = 'EXECUTION_MODE'
+    EXECUTION_MODE_REASON = 'EXECUTION_MODE_REASON'
+
+    # every job is a separated pdal process to use all cores
+    allowInProcess = False
+
+    def createInstance(self):
+        return PdalBatchPipelineExecutor()
+
+    def name(self):
+        """
+        Returns the algorithm name, used for identifying the algorithm. This
+        string should be fixed for the algorithm, and must not be localised.
+        The name should be unique within each provider. Names should contain
+        lowercase alphanumeric characters only and no spaces or other
+        formatting characters.
+        """
+        return 'pdalbatchpipelineexecutor'
+
+    def displayName(self):
+        """
+        Returns the translated algorithm name, which should be used for any
+        user-visible display of the algorithm name.
+        """
+        return self.tr('PDAL batch pipeline executor')
+
+    def group(self):
+        """
+        Returns the name of the group this algorithm belongs to. This string
+        should be localised.
+        """
+        return self.tr('Utilities')
+
+    def groupId(self):
+        """
+        Returns the unique ID of the group this algorithm belongs to. This
+        string should be fixed for the algorithm, and must not be localised.
+        The group id should be unique within each provider. Group id should
+        contain lowercase alphanumeric characters only and no spaces or other
+        formatting characters.
+        """
+        return 'utilities'
+
+    def shortHelpString(self):
+        """
+        Returns a localised short helper string for the algorithm. This string
+        should provide a basic description about what the algorithm does and the
+        parameters and outputs associated with it..
+        """
+        return self.tr(self.__doc__)
+
+    def initAlgorithm(self, config=None):
+        self.addParameter(
+            QgsProcessingParameterFile(
+                name=self.INPUT_FOLDER,
+                description=self.tr('Input folder'),
+                behavior=QgsProcessingParameterFile.Folder,
+                defaultValue=None,
+                optional=True
+            )
+        )
+        self.addParameter(
+            QgsProcessingParameterString(
+                name=self.INPUT_PATTERNS,
+                description=self.tr('Input folder file patterns (; separated)'),
+                defaultValue='*.las;*.laz',
+                optional=True
+            )
+        )
+        self.addParameter(
+            QgsProcessingParameterString(
+                name=self.INPUT_FILES,
+                description=self.tr('Input files (one per line)'),
+                defaultValue=None,
+                multiLine=True,
+                optional=True
+            )
+        )
+        self.addParameter(
+            QgsProcessingParameterString(
+                name=self.INPUT_PIPELINE,
+                description=self.tr('Input pipeline (file or json)'),
+                defaultValue=None,
+                multiLine=True,
+                optional=False
+            )
+        )
+        self.addParameter(
+            QgsProcessingParameterString(
+                name=self.OUTPUT_TEMPLATE,
+                description=self.tr('Output filename template'),
+                defaultValue='{basename}.las',
+                optional=False
+            )
+        )
+        self.addParameter(
+            QgsProcessingParameterNumber(
+                name=self.WORKERS,
+                description=self.tr('Concurrent pdal processes'),
+                type=QgsProcessingParameterNumber.Integer,
+                defaultValue=os.cpu_count() or 1,
+                minValue=1,
+                optional=False
+            )
+        )
+        self.addParameter(
+            QgsProcessingParameterBoolean(
+                name=self.INPUT_SKIP_IF_OUT_EXISTS,
+                description=self.tr('Skip outputs up to date with inputs and pipeline'),
+                defaultValue=True,
+                optional=False
+            )
+        )
+        self.addVerbosityParameter()
+
+        # set outputs
+        self.addParameter(
+            QgsProcessingParameterFolderDestination(
+                name=self.OUTPUT_FOLDER,
+                description=self.tr('Output folder'),
+                defaultValue=None,
+                createByDefault=True
+            )
+        )
+        self.addOutput(QgsProcessingOutputNumber(self.PROCESSED, self.tr('Processed files')))
+        self.addOutput(QgsProcessingOutputNumber(self.SKIPPED, self.tr('Skipped files')))
+        self.addOutput(QgsProcessingOutputNumber(self.FAILED, self.tr('Failed files')))
+        self.addOutput(QgsProcessingOutputString(self.ERRORS, self.tr('Errors')))
+        self.addOutput(QgsProcessingOutputString(self.EXECUTION_MODE, self.tr('Execution mode')))
+        self.addOutput(QgsProcessingOutputString(self.EXECUTION_MODE_REASON, self.tr('Execution mode reason')))
+        self.addResourceUsageOutputs()
+
+    def inputFiles(self, parameters, context):
+        '''Return the sorted list of input files.'''
+        inputFiles = set()
+
+        folder = self.parameterAsFile(parameters, self.INPUT_FOLDER, context)
+        if folder:
+            patterns = self.parameterAsString(parameters, self.INPUT_PATTERNS, context) or '*'
+            for pattern in patterns.split(';'):
+                pattern = pattern.strip()
+                if pattern:
+                    inputFiles.update(glob.glob(os.path.join(folder, pattern)))
+
+        files = self.parameterAsString(parameters, self.INPUT_FILES, context)
+        if files:
+            for fileName in files.splitlines():
+                fileName = fileName.strip()
+                if fileName.startswith('file://'):
+                    fileName = fileName[7:]
+                if fileName:
+                    inputFiles.add(fileName)
+
+        return sorted(inputFile for inputFile in inputFiles if os.path.isfile(inputFile))
+
+    def validateOutputTemplate(self, outputTemplate):
+        '''Check that the output template only references named fields
+        of OUTPUT_TEMPLATE_FIELDS, that it can be formatted and that it is
+        a file name: outputs are always written in the output folder.'''
+        allowed = ', '.join('{{{}}}'.format(field) for field in self.OUTPUT_TEMPLATE_FIELDS)
+        try:
+            for _, field, _, _ in string.Formatter().parse(outputTemplate):
+                # field can have attribute or index access e.g. {name[0]}
+                if field is not None and field.partition('.')[0].partition('[')[0] not in self.OUTPUT_TEMPLATE_FIELDS:
+                    raise QgsProcessingException(self.tr(
+                        'Invalid field "{{{}}}" in output template. Allowed fields are: {}').format(field, allowed))
+            outputName = outputTemplate.format(basename='input', name='input.las', index=0)
+        except (ValueError, KeyError, IndexError, AttributeError) as ex:
+            raise QgsProcessingException(self.tr(
+                'Invalid output template "{}": {}. Allowed fields are: {}').format(outputTemplate, str(ex), allowed))
+        # fields are file names or numbers, then only the template can
+        # add folders, absolute paths or ".."
+        if '/' in outputName or '\\' in outputName or os.path.isabs(outputName) or outputName in ('', '.', '..'):
+            raise QgsProcessingException(self.tr(
+                'Invalid output template "{}": it must be a file name without folders').format(outputTemplate))
+
+    def processAlgorithm(self, parameters, context, feedback):
+        # saving feedback in instance variable to avoid passing
+        # it to all methods. It's shared by all jobs
+        self.feedback = feedback
+
+        incremental = self.parameterAsBool(parameters, self.INPUT_SKIP_IF_OUT_EXISTS, context)
+        workers = self.parameterAsInt(parameters, self.WORKERS, context)
+        outputTemplate = self.parameterAsString(parameters, self.OUTPUT_TEMPLATE, context)
+        self.validateOutputTemplate(outputTemplate)
+        pdal_pipeline = self.parameterAsPipeline(parameters, self.INPUT_PIPELINE, context)
+        verbosity = self.verbosityOption(parameters, context)
+
+        outputFolder = self.parameterAsFileOutput(parameters, self.OUTPUT_FOLDER, context)
+        if not os.path.exists(outputFolder):
+            os.makedirs(outputFolder)
+
+        inputFiles = self.inputFiles(parameters, context)
+        if not inputFiles:
+            raise QgsProcessingException(self.tr('No input files found'))
+
+        # create all commands before starting. Commands are created with
+        # the same method of pdal pipeline executor
+        jobs = []
+        outputInputs = {}
+        for index, inputFile in enumerate(inputFiles):
+            name = os.path.basename(inputFile)
+            outputFile = os.path.join(outputFolder, outputTemplate.format(
+                basename=PDALtoolsUtils.splitExtension(name)[0],
+                name=name,
+                index=index))
+            # e.g. inputs with the same name in different folders
+            key = os.path.normcase(os.path.normpath(outputFile))
+            if key in outputInputs:
+                raise QgsProcessingException(self.tr(
+                    'Inputs {} and {} have the same output {}. Use {{index}} in the output template '
+                    'to have distinct outputs').format(outputInputs[key], inputFile, outputFile))
+            outputInputs[key] = inputFile
+            commandline = self.createPdalCommand(
+                verbosity,
+                pdal_pipeline,
+                inputFile,
+                None,
+                outputFile)
+            jobs.append((inputFile, outputFile, commandline))
+
+        # all jobs share the same pipeline => same execution mode
+        modeOptions, mode, reason = PDALtoolsUtils.executionMode(jobs[0][2])
+        feedback.pushInfo('Execution mode: {} ({})'.format(mode, reason))
+        jobs = [(inputFile, outputFile, PDALtoolsUtils.replaceOptions(commandline, [verbosity] + modeOptions))
+                for inputFile, outputFile, commandline in jobs]
+
+        # validate once: all jobs share the same validation key
+        if not PDALtoolsUtils.skipValidation():
+            self.validatePipeline(jobs[0][2])
+
+        def _runJob(job):
+            inputFile, outputFile, commandline = job
+            if feedback.isCanceled():
+                return None
+            return self.runPipeline(commandline, outputFile, incremental=incremental)
+
+        processed = 0
+        skipped = 0
+        errors = []
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = {executor.submit(_runJob, job): job for job in jobs}
+            for done, future in enumerate(as_completed(futures), 1):
+                inputFile = futures[future][0]
+                try:
+                    executed = future.result()
+                    if executed:
+                        processed += 1
+                    elif executed is not None:
+                        skipped += 1
+                except Exception as ex:
+                    errors.append('{}: {}'.format(inputFile, str(ex)))
+                    feedback.reportError('Failed job {}: {}'.format(inputFile, str(ex)))
+
+                feedback.setProgress(100.0 * done / len(jobs))
+                feedback.pushInfo('Completed {}/{} jobs'.format(done, len(jobs)))
+
+        if feedback.isCanceled():
+            raise QgsProcessingException(self.tr('Batch execution has been cancelled'))
+
+        results = {
+            self.OUTPUT_FOLDER: outputFolder,
+            self.PROCESSED: processed,
+            self.SKIPPED: skipped,
+            self.FAILED: len(errors),
+            self.ERRORS: '\n'.join(errors),
+            self.EXECUTION_MODE: mode,
+            self.EXECUTION_MODE_REASON: reason,
+        }
+        results.update(self.resourceUsageResults())
+        return results
@@ -0,0 +1,181 @@
+# -*- coding: utf-8 -*-
+
+"""
+***************************************************************************
+    pdal_catalog_pipeline.py
+    -------------------------
+    begin                : October 2026
+    copyright            : (C) 2026 by Luigi Pirelli
+    email                : luipir at gmail dot com
+    dev for              : http://cartolab.udc.es/cartoweb/
+    Project              : http://cartolab.udc.es/geomove/
+***************************************************************************
+*                                                                         *
+*   This program is free software; you can redistribute it and/or modify  *
+*   it under the terms of the GNU General Public License as published by  *
+*   the Free Software Foundation; either version 2 of the License, or     *
+*   (at your option) any later version.                                   *
+*                                                                         *
+***************************************************************************
+"""
+
+__author__ = 'Luigi Pirelli'
+__date__ = 'October 2026'
+__copyright__ = '(C) 2026, Luigi Pirelli'
+
+# other common modules
+import os
+import re
+from qgis.core import (
+    QgsProcessingParameterFile,
+    QgsProcessingParameterBoolean,
+    QgsProcessingParameterFileDestination,
+    QgsProcessingParameterRasterDestination,
+    QgsProcessingParameterVectorDestination,
+    QgsProcessingOutputString)
+from ..pdal_tools_algorithm import PDALtoolsAlgorithm
+from ..pdal_tools_utils import PDALtoolsUtils
+
+class PdalCatalogPipeline(PDALtoolsAlgorithm):
+    """
+    Run the pipeline {fileName}
+    Inputs override the filename of the readers of the pipeline
+    (the pipeline one is used if not set) and outputs the filename
+    of its writers. Only tagged stages or stages with a type not
+    used by other stages can be overridden.
+    """
+
+    INPUT_SKIP_IF_OUT_EXISTS = 'INPUT_SKIP_IF_OUT_EXISTS'
+    EXECUTION_MODE = 'EXECUTION_MODE'
+
+    def __init__(self, definition):
+        '''definition is the pipeline description made by
+        PDALtoolsPipelineCatalog.'''
+        super().__init__()
+        self.definition = definition
+
+    def createInstance(self):
+        return PdalCatalogPipeline(self.definition)
+
+    def name(self):
+        return self.definition['name']
+
+    def displayName(self):
+        return self.definition['displayName']
+
+    def group(self):
+        return self.definition['group']
+
+    def groupId(self):
+        return re.sub(r'[^a-z0-9]', '', self.definition['group'].lower())
+
+    def shortHelpString(self):
+        return self.tr(self.__doc__).format(fileName=self.definition['fileName'])
+
+    def pipelineFileName(self, stage):
+        '''Return the filename of the reader stage of the pipeline if it's a
+        real file (or url), None if not set or a placeholder (e.g. input.las).
+        Relative filenames are relative to the pipeline folder as for pdal.'''
+        fileName = stage['filename']
+        if not fileName or '://' in fileName:
+            return fileName or None
+        fileName = os.path.join(os.path.dirname(self.definition['fileName']), fileName)
+        return fileName if os.path.exists(fileName) else None
+
+    def initAlgorithm(self, config=None):
+        for stage in self.definition['inputs']:
+            defaultFileName = self.pipelineFileName(stage)
+            self.addParameter(
+                QgsProcessingParameterFile(
+                    name=stage['parameter'],
+                    description=self.tr('Input of {}').format(stage['override']),
+                    behavior=QgsProcessingParameterFile.File,
+                    extension=None,
+                    defaultValue=defaultFileName,
+                    # pipeline filename is used if not set. Placeholders
+                    # have to be replaced
+                    optional=bool(defaultFileName)
+                )
+            )
+        self.addParameter(
+            QgsProcessingParameterBoolean(
+                name=self.INPUT_SKIP_IF_OUT_EXISTS,
+                description=self.tr('Skip if outputs are up to date with inputs and pipeline'),
+                defaultValue=True,
+                optional=False
+            )
+        )
+        self.addVerbosityParameter()
+
+        # set outputs
+        for stage in self.definition['outputs']:
+            description = self.tr('Output of {}').format(stage['override'])
+            if stage['kind'] == 'raster':
+                parameter = QgsProcessingParameterRasterDestination(
+                    name=stage['parameter'],
+                    description=description,
+                    defaultValue=None,
+                    createByDefault=True
+                )
+            elif stage['kind'] == 'vector':
+                parameter = QgsProcessingParameterVectorDestination(
+                    name=stage['parameter'],
+                    description=description,
+                    defaultValue=None,
+                    createByDefault=True
+                )
+            else:
+                parameter = QgsProcessingParameterFileDestination(
+                    name=stage['parameter'],
+                    description=description,
+                    fileFilter='{0} files (*.{0})'.format(stage['extension']),
+                    defaultValue=None,
+                    createByDefault=True
+                )
+            self.addParameter(parameter)
+        self.addOutput(QgsProcessingOutputString(self.EXECUTION_MODE, self.tr('Execution mode')))
+        self.addResourceUsageOutputs()
+
+    def processAlgorithm(self, parameters, context, feedback):
+        # saving feedback in instance variable to avoid passing
+        # it to all methods
+        self.feedback = feedback
+
+        pdal_pipeline = self.definition['fileName']
+        verbosity = self.verbosityOption(parameters, context)
+
+        inputs = []
+        for stage in self.definition['inputs']:
+            # the pipeline filename too is overridden as absolute path
+            fileName = self.parameterAsFile(parameters, stage['parameter'], context)
+            if fileName:
+                inputs.append((stage['override'], fileName))
+
+        results = {}
+        outputs = []
+        for stage in self.definition['outputs']:
+            if stage['kind'] == 'file':
+                fileName = self.parameterAsFileOutput(parameters, stage['parameter'], context)
+            else:
+                fileName = self.parameterAsOutputLayer(parameters, stage['parameter'], context)
+            outputFolder = os.path.dirname(fileName)
+            if outputFolder and not os.path.exists(outputFolder):
+                os.makedirs(outputFolder)
+            outputs.append((stage['override'], fileName))
+            results[stage['parameter']] = fileName
+
+        # same overrides of the pipeline executor, e.g. LAS writers of
+        # .copc.laz outputs become writers.copc and gdal writers get bounds
+        commandline = self.createPdalCommand(verbosity, pdal_pipeline, None, None, None, outputs, inputs)
+
+        # use stream mode (lowest memory) if all stages support it
+        modeOptions, mode, reason = PDALtoolsUtils.executionMode(commandline)
+        feedback.pushInfo('Execution mode: {} ({})'.format(mode, reason))
+        commandline = PDALtoolsUtils.replaceOptions(commandline, [verbosity] + modeOptions)
+
+        incremental = self.parameterAsBool(parameters, self.INPUT_SKIP_IF_OUT_EXISTS, context)
+        self.runPipeline(commandline, [fileName for _, fileName in outputs], incremental=incremental)
+
+        results[self.EXECUTION_MODE] = mode
+        results.update(self.resourceUsageResults())
+        return results
@@ -25,36 +25,74 @@ __copyright__ = '(C) 2018, Luigi Pirelli'
 
 # other common modules
 import os
-# cannot import pdal because most stable versions just use python-pdal for py2
-# import pdal
+import re
+import glob
+import json
+import uuid
+import shutil
+import tempfile
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from PyQt5.QtCore import Qt
+# python-pdal (if installed) is used by PDALtoolsAlgorithm.runAndWait
+# to run the pipeline in-process. See pdal_tools_bindings.py
 from qgis.core import (
     QgsProcessingException,
+    QgsProcessingUtils,
     QgsProcessingParameterFile,
     QgsProcessingParameterBoolean,
     QgsProcessingParameterDefinition,
     QgsProcessingParameterFileDestination,
-    QgsProcessingParameterString)
+    QgsProcessingParameterRasterDestination,
+    QgsProcessingParameterVectorDestination,
+    QgsProcessingParameterNumber,
+    QgsProcessingParameterString,
+    QgsProcessingOutputString)
 from ..pdal_tools_algorithm import PDALtoolsAlgorithm
 from ..pdal_tools_utils import PDALtoolsUtils
+from ..pdal_tools_tiling import PDALtoolsTiling
+from ..pdal_tools_profiler import PDALtoolsProfiler
 
 class PdalPipelineExecutor(PDALtoolsAlgorithm):
     """
     Generic algorithm to process get 0|1|2 params input
     files as input to a configurable pipeline.
-    The interface allow to set only one output file. Output
-    can be a gdal/ogr managed format if managed by the pipeline.
+    Output file is set to the writer managing its format (or to
+    the writer with the output file tag). Output can be a gdal/ogr
+    managed format if managed by the pipeline.
+    Output raster and vector are set to the writers tagged with
+    their tags (default raster and vector) then a single pass of
+    the pipeline can produce e.g. a point cloud and a DTM.
     Pipeline filname is an input string becasue is the most flexible
     way to allow creting dinamic pipelines file names as input.
     In case it's necessary to have an interface to select a specific
     pipeline, would be better to integrate the executor in a processing
     modeler with file selection input.
+    If tile size is set, input extent is split in tiles processed by
+    concurrent pdal processes. Each tile reads also the points in
+    the tile buffer (e.g. needed by ground or neighbour filters) that
+    are clipped before writing. Tile results are merged in the output.
+    The profile report has the pipeline wall time and point counts of
+    each stage. Stage wall time is reported only for pdal subprocess
+    executions in standard mode (null for python-pdal and stream mode).
     """
 
     INPUT_PCL_1 = 'INPUT_PCL_1'
     INPUT_PCL_2 = 'INPUT_PCL_2'
     INPUT_PIPELINE = 'INPUT_PIPELINE'
     INPUT_SKIP_IF_OUT_EXISTS = 'INPUT_SKIP_IF_OUT_EXISTS'
+    INPUT_HASH_CONTENT = 'INPUT_HASH_CONTENT'
+    TILE_SIZE = 'TILE_SIZE'
+    TILE_BUFFER = 'TILE_BUFFER'
+    WORKERS = 'WORKERS'
     OUTPUT_PCL = 'OUTPUT_PCL'
+    OUTPUT_PCL_TAG = 'OUTPUT_PCL_TAG'
+    OUTPUT_RASTER = 'OUTPUT_RASTER'
+    OUTPUT_RASTER_TAG = 'OUTPUT_RASTER_TAG'
+    OUTPUT_VECTOR = 'OUTPUT_VECTOR'
+    OUTPUT_VECTOR_TAG = 'OUTPUT_VECTOR_TAG'
+    EXECUTION_MODE = 'EXECUTION_MODE'
+    EXECUTION_MODE_REASON = 'EXECUTION_MODE_REASON'
+    PROFILE_REPORT = 'PROFILE_REPORT'
 
     def createInstance(self):
         return PdalPipelineExecutor()
@@ -125,19 +163,57 @@ class PdalPipelineExecutor(PDALtoolsAlgorithm):
         self.addParameter(
             QgsProcessingParameterString(
                 name=self.INPUT_PIPELINE,
-                description=self.tr('Input pipeline'),
+                description=self.tr('Input pipeline (file or json)'),
                 defaultValue=None,
+                multiLine=True,
                 optional=False
             )
         )
         self.addParameter(
             QgsProcessingParameterBoolean(
                 name=self.INPUT_SKIP_IF_OUT_EXISTS,
-                description=self.tr('Skip if output already exists'),
+                description=self.tr('Skip if output is up to date with inputs and pipeline'),
                 defaultValue=True,
                 optional=False
             )
         )
+        hashContent = QgsProcessingParameterBoolean(
+            name=self.INPUT_HASH_CONTENT,
+            description=self.tr('Check input file content (hash) to state if output is up to date'),
+            defaultValue=False,
+            optional=True
+        )
+        hashContent.setFlags(hashContent.flags() | QgsProcessingParameterDefinition.FlagAdvanced)
+        self.addParameter(hashContent)
+
+        tileSize = QgsProcessingParameterNumber(
+            name=self.TILE_SIZE,
+            description=self.tr('Tile size (0 to process input in a single pass)'),
+            type=QgsProcessingParameterNumber.Double,
+            defaultValue=0,
+            minValue=0,
+            optional=True
+        )
+        tileBuffer = QgsProcessingParameterNumber(
+            name=self.TILE_BUFFER,
+            description=self.tr('Tile buffer'),
+            type=QgsProcessingParameterNumber.Double,
+            defaultValue=0,
+            minValue=0,
+            optional=True
+        )
+        workers = QgsProcessingParameterNumber(
+            name=self.WORKERS,
+            description=self.tr('Concurrent pdal processes for tiles'),
+            type=QgsProcessingParameterNumber.Integer,
+            defaultValue=os.cpu_count() or 1,
+            minValue=1,
+            optional=True
+        )
+        for parameter in [tileSize, tileBuffer, workers]:
+            parameter.setFlags(parameter.flags() | QgsProcessingParameterDefinition.FlagAdvanced)
+            self.addParameter(parameter)
+        self.addVerbosityParameter()
 
         # set outputs
         self.addParameter(
@@ -148,6 +224,60 @@ class PdalPipelineExecutor(PDALtoolsAlgorithm):
                 createByDefault=True
             )
         )
+        self.addParameter(
+            QgsProcessingParameterRasterDestination(
+                name=self.OUTPUT_RASTER,
+                description=self.tr('Output raster (writer tagged as raster tag)'),
+                defaultValue=None,
+                optional=True,
+                createByDefault=False
+            )
+        )
+        self.addParameter(
+            QgsProcessingParameterVectorDestination(
+                name=self.OUTPUT_VECTOR,
+                description=self.tr('Output vector (writer tagged as vector tag)'),
+                defaultValue=None,
+                optional=True,
+                createByDefault=False
+            )
+        )
+        outputTags = [
+            QgsProcessingParameterString(
+                name=self.OUTPUT_PCL_TAG,
+                description=self.tr('Tag of the writer of output file (empty to select it by file extension)'),
+                defaultValue='',
+                optional=True
+            ),
+            QgsProcessingParameterString(
+                name=self.OUTPUT_RASTER_TAG,
+                description=self.tr('Tag of the writer of output raster'),
+                defaultValue='raster',
+                optional=True
+            ),
+            QgsProcessingParameterString(
+                name=self.OUTPUT_VECTOR_TAG,
+                description=self.tr('Tag of the writer of output vector'),
+                defaultValue='vector',
+                optional=True
+            ),
+        ]
+        for parameter in outputTags:
+            parameter.setFlags(parameter.flags() | QgsProcessingParameterDefinition.FlagAdvanced)
+            self.addParameter(parameter)
+        profileReport = QgsProcessingParameterFileDestination(
+            name=self.PROFILE_REPORT,
+            description=self.tr('Profile report (stage timings)'),
+            fileFilter='JSON files (*.json)',
+            defaultValue=None,
+            optional=True,
+            createByDefault=False
+        )
+        profileReport.setFlags(profileReport.flags() | QgsProcessingParameterDefinition.FlagAdvanced)
+        self.addParameter(profileReport)
+        self.addOutput(QgsProcessingOutputString(self.EXECUTION_MODE, self.tr('Execution mode')))
+        self.addOutput(QgsProcessingOutputString(self.EXECUTION_MODE_REASON, self.tr('Execution mode reason')))
+        self.addResourceUsageOutputs()
 
     def processAlgorithm(self, parameters, context, feedback):
         # saving feedback in instance variable to avoid passing 
@@ -162,6 +292,12 @@ class PdalPipelineExecutor(PDALtoolsAlgorithm):
             context
         )
 
+        hash_content = self.parameterAsBool(
+            parameters,
+            self.INPUT_HASH_CONTENT,
+            context
+        )
+
         # gets outputs
         output_pcl = self.parameterAsFileOutput(
             parameters,
@@ -169,19 +305,36 @@ class PdalPipelineExecutor(PDALtoolsAlgorithm):
             context
         )
 
-        # skip all process il parameter already exist
-        if skip_if_out_exists and \
-           os.path.exists(output_pcl) and \
-           os.path.isfile(output_pcl):
-            feedback.pushConsoleInfo("Skipped step because output file already exists: {}".format(output_pcl))
-            return {self.OUTPUT_PCL: output_pcl}
+        # profiling is enabled setting where to save its report
+        profile_report = self.parameterAsFileOutput(
+            parameters,
+            self.PROFILE_REPORT,
+            context
+        )
+        metadata_file = None
+        if profile_report:
+            self.profiler = PDALtoolsProfiler()
+            metadata_file = os.path.join(QgsProcessingUtils.tempFolder(), 'pdaltools_metadata_{}.json'.format(uuid.uuid4().hex))
+
+        # outputs of writers referenced by tag
+        outputs = []
+        output_pcl_tag = self.parameterAsString(parameters, self.OUTPUT_PCL_TAG, context)
+        if output_pcl_tag:
+            outputs.append((output_pcl_tag, output_pcl))
+        output_raster = self.parameterAsOutputLayer(parameters, self.OUTPUT_RASTER, context)
+        if output_raster:
+            outputs.append((self.parameterAsString(parameters, self.OUTPUT_RASTER_TAG, context) or 'raster', output_raster))
+        output_vector = self.parameterAsOutputLayer(parameters, self.OUTPUT_VECTOR, context)
+        if output_vector:
+            outputs.append((self.parameterAsString(parameters, self.OUTPUT_VECTOR_TAG, context) or 'vector', output_vector))
 
         # create output folders in the strange case they don't exist
-        output_pcl_folder = os.path.dirname(output_pcl)
-        if not os.path.exists(output_pcl_folder):
-            os.makedirs(output_pcl_folder)
+        for _, output in [(None, output_pcl)] + outputs:
+            output_folder = os.path.dirname(output)
+            if output_folder and not os.path.exists(output_folder):
+                os.makedirs(output_folder)
 
-        # no skip => gest all imputs
+        # gets all inputs
         input_pcl_1 = self.parameterAsFile(
             parameters,
             self.INPUT_PCL_1,
@@ -194,45 +347,205 @@ class PdalPipelineExecutor(PDALtoolsAlgorithm):
             context
         )
 
-        pdal_pipeline = self.parameterAsString(
+        pdal_pipeline = self.parameterAsPipeline(
             parameters,
             self.INPUT_PIPELINE,
             context
         )
-        if not pdal_pipeline:
-            raise QgsProcessingException(self.invalidSourceError(parameters, self.INPUT_PIPELINE))
-        # strips tiling and heading spaces and chars attached during drag&drop (linux)
-        pdal_pipeline = pdal_pipeline.lstrip().rstrip()
-        pdal_pipeline = pdal_pipeline.rstrip('\r\n')
-        if pdal_pipeline.startswith('file://'):
-            pdal_pipeline = pdal_pipeline[7:]
-        if not os.path.exists(pdal_pipeline) or not os.path.isfile(pdal_pipeline):
-            raise QgsProcessingException(self.invalidSourceError(parameters, self.INPUT_PIPELINE))
-
-        # first validate pipeline
-        options = '--validate'
-        commandline = self.createPdalCommand(
-            options,
-            pdal_pipeline,
-            input_pcl_1,
-            input_pcl_2,
-            output_pcl)
-        self.runAndWait(commandline)
 
         # run pipeline
-        outDriver = PDALtoolsUtils.getDriverType(output_pcl)
-        options = '--verbose=8'
-        if outDriver == 'gdal':
-            #options = '--verbose=8 --nostream'
-            pass
-
+        options = [self.verbosityOption(parameters, context)]
+        if metadata_file:
+            # stage point counts for profiling
+            options.append('--metadata={}'.format(metadata_file))
         commandline = self.createPdalCommand(
             options,
             pdal_pipeline,
             input_pcl_1,
             input_pcl_2,
-            output_pcl)
-        self.runAndWait(commandline)
+            None if output_pcl_tag else output_pcl,
+            outputs)
+
+        # use stream mode (lowest memory) if all stages support it
+        modeOptions, mode, reason = PDALtoolsUtils.executionMode(commandline)
+        feedback.pushInfo('Execution mode: {} ({})'.format(mode, reason))
+        commandline = PDALtoolsUtils.replaceOptions(commandline, options + modeOptions)
+
+        run = None
+        tile_size = self.parameterAsDouble(parameters, self.TILE_SIZE, context)
+        if tile_size > 0:
+            tile_buffer = self.parameterAsDouble(parameters, self.TILE_BUFFER, context)
+            workers = self.parameterAsInt(parameters, self.WORKERS, context) or 1
+            run = lambda commandline: self.runTiles(commandline, tile_size, tile_buffer, workers)
+
+        output_files = [output_pcl] + [output for tag, output in outputs if tag != output_pcl_tag]
+        try:
+            self.runPipeline(commandline, output_files,
+                             incremental=skip_if_out_exists,
+                             hashContent=hash_content,
+                             run=run)
+            if self.profiler:
+                # tiles point counts are parsed by runTiles from the
+                # metadata of each tile
+                if run is None:
+                    self.profiler.parseMetadataFile(metadata_file)
+                self.profiler.writeReport(profile_report)
+        finally:
+            if metadata_file and os.path.exists(metadata_file):
+                os.remove(metadata_file)
+
+        results = {
+            self.OUTPUT_PCL: output_pcl,
+            self.EXECUTION_MODE: mode,
+            self.EXECUTION_MODE_REASON: reason,
+        }
+        if output_raster:
+            results[self.OUTPUT_RASTER] = output_raster
+        if output_vector:
+            results[self.OUTPUT_VECTOR] = output_vector
+        results.update(self.resourceUsageResults())
+
+        if self.profiler:
+            results[self.PROFILE_REPORT] = profile_report
 
         # Return the results of the algorithm.
-        return {self.OUTPUT_PCL: output_pcl}
+        return results
+
+    def runTiles(self, commandline, tileSize, tileBuffer, workers):
+        '''Execute a "pdal pipeline" commandline splitting input extent in
+        tiles processed concurrently. Tile results are merged in the output of
+        the pipeline writer: as point cloud or as a mosaic for gdal rasters.'''
+        options, _, _ = PDALtoolsUtils.parsePipelineCommand(commandline)
+        stages = PDALtoolsUtils.commandStages(commandline)
+
+        writers = [stage for stage in stages if stage.get('type', '').startswith('writers.')]
+        if len(writers) != 1:
+            raise QgsProcessingException('Tiled execution needs pipelines with only one writer')
+        writer = writers[0]
+        resolution = None
+        if writer['type'] == 'writers.gdal':
+            try:
+                resolution = float(writer['resolution'])
+            except (KeyError, ValueError):
+                raise QgsProcessingException('Tiled execution needs resolution of writers.gdal')
+
+        # tiles cover the extent of all readers get from their header
+        bounds = None
+        for stage in stages:
+            if not stage.get('type', '').startswith('readers.') or not stage.get('filename'):
+                continue
+            pdalInfoJson = self.getPCLMetadata(stage['filename'])
+            if not pdalInfoJson:
+                raise QgsProcessingException('Cannot get extent of {}'.format(stage['filename']))
+            metadata = pdalInfoJson['metadata']
+            readerBounds = (metadata['minx'], metadata['miny'], metadata['maxx'], metadata['maxy'])
+            if bounds is None:
+                bounds = readerBounds
+            else:
+                bounds = (min(bounds[0], readerBounds[0]), min(bounds[1], readerBounds[1]),
+                          max(bounds[2], readerBounds[2]), max(bounds[3], readerBounds[3]))
+        if bounds is None:
+            raise QgsProcessingException('Tiled execution needs readers with a filename')
+
+        tiles = PDALtoolsTiling.tiles(bounds, tileSize, tileBuffer, resolution)
+        self.feedback.pushInfo('Processing {} tiles'.format(len(tiles)))
+
+        tempFolder = tempfile.mkdtemp(prefix='pdaltools_tiles_', dir=QgsProcessingUtils.tempFolder())
+        try:
+            # readers not able to read only the tile area are split in a
+            # single streamed pass, then tiles do not read the whole input
+            splitFileNames = {}
+            for index in PDALtoolsTiling.splitReaders(stages):
+                if not stages[index].get('filename'):
+                    continue
+                splitTemplate = os.path.join(tempFolder, 'split_{}_#.las'.format(index))
+                self.feedback.pushInfo('Splitting {} in tiles'.format(stages[index]['filename']))
+                self.runSubprocess(PDALtoolsTiling.splitCommand(
+                    stages[index]['filename'], splitTemplate, bounds, tileSize, tileBuffer, resolution))
+                splitFileNames[index] = {}
+                for splitFileName in glob.glob(splitTemplate.replace('#', '*')):
+                    match = re.search(r'_(-?\d+)_(-?\d+)\.las$', splitFileName)
+                    if match:
+                        splitFileNames[index][(int(match.group(1)), int(match.group(2)))] = splitFileName
+
+            # each tile writes its own metadata file (profiling)
+            tileOptions = [option for option in options if not option.startswith('--metadata=')]
+            profiling = len(tileOptions) != len(options)
+
+            extension = PDALtoolsUtils.splitExtension(writer['filename'])[1]
+            jobs = []
+            for tile in tiles:
+                splitInputs = {index: PDALtoolsTiling.splitFiles(tile, fileNames, tileBuffer)
+                               for index, fileNames in splitFileNames.items()}
+                tileOutputFileName = os.path.join(tempFolder, tile.name() + extension)
+                tileStages = PDALtoolsTiling.tileStages(stages, tile, tileOutputFileName, splitInputs)
+                if tileStages is None:
+                    # no input points in the tile
+                    continue
+                metadataFileName = os.path.join(tempFolder, tile.name() + '_metadata.json') if profiling else None
+                # tile pipelines are inline => sent via stdin without files
+                tileCommandline = ['pdal', 'pipeline'] + tileOptions
+                if metadataFileName:
+                    tileCommandline.append('--metadata={}'.format(metadataFileName))
+                tileCommandline += ['-i', json.dumps({'pipeline': tileStages})]
+                jobs.append((tileOutputFileName, metadataFileName, tileCommandline))
+            if not jobs:
+                raise QgsProcessingException('No input points in the tiles')
+
+            # tiles are independent pdal processes. On the first failure
+            # (or cancel) running tiles are killed and the others not run
+            from ..pdal_tools_runner import PDALtoolsRunnerGroup
+            group = PDALtoolsRunnerGroup()
+            self.feedback.canceled.connect(group.kill, Qt.DirectConnection)
+            try:
+                with ThreadPoolExecutor(max_workers=workers) as executor:
+                    futures = [executor.submit(self.runSubprocess, tileCommandline, None, group)
+                               for _, _, tileCommandline in jobs]
+                    try:
+                        for done, future in enumerate(as_completed(futures), 1):
+                            future.result()
+                            self.feedback.setProgress(100.0 * done / (len(jobs) + 1))
+                    except Exception:
+                        for future in futures:
+                            future.cancel()
+                        group.kill()
+                        raise
+            finally:
+                self.feedback.canceled.disconnect(group.kill)
+
+            if self.profiler:
+                for _, metadataFileName, _ in jobs:
+                    if metadataFileName:
+                        self.profiler.parseMetadataFile(metadataFileName, accumulate=True)
+
+            tileOutputFileNames = [tileOutputFileName for tileOutputFileName, _, _ in jobs]
+            if resolution:
+                self.mosaicRasters(tileOutputFileNames, writer)
+            else:
+                self.mergePointClouds(tileOutputFileNames, writer)
+            self.feedback.setProgress(100)
+        finally:
+            shutil.rmtree(tempFolder, ignore_errors=True)
+
+    def mergePointClouds(self, fileNames, writer):
+        '''Merge point clouds with the writer stage used by the pipeline to
+        preserve its options.'''
+        self.runSubprocess(['pdal', 'pipeline', '-i', json.dumps({'pipeline': fileNames + [writer]})])
+
+    def mosaicRasters(self, fileNames, writer):
+        '''Mosaic raster tiles in the file of the writers.gdal stage.'''
+        # gdal is slow to import and only needed by tiled rasters
+        import gdal
+        vrtFileName = os.path.splitext(fileNames[0])[0] + '_mosaic.vrt'
+        vrt = gdal.BuildVRT(vrtFileName, fileNames)
+        if vrt is None:
+            raise QgsProcessingException('Cannot build mosaic of tiles: {}'.format(gdal.GetLastErrorMsg()))
+        vrt = None
+
+        creationOptions = [option.strip() for option in writer.get('gdalopts', '').split(',') if option.strip()]
+        dataset = gdal.Translate(writer['filename'], vrtFileName,
+                                 format=writer.get('gdaldriver', 'GTiff'),
+                                 creationOptions=creationOptions)
+        if dataset is None:
+            raise QgsProcessingException('Cannot write mosaic of tiles: {}'.format(gdal.GetLastErrorMsg()))
+        dataset = None
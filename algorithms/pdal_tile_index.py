@@ -0,0 +1,399 @@
+# -*- coding: utf-8 -*-
+
+"""
+***************************************************************************
+    pdal_tile_index.py
+    -------------------------
+    begin                : October 2026
+    copyright            : (C) 2026 by Luigi Pirelli
+    email                : luipir at gmail dot com
+    dev for              : http://cartolab.udc.es/cartoweb/
+    Project              : http://cartolab.udc.es/geomove/
+***************************************************************************
+*                                                                         *
+*   This program is free software; you can redistribute it and/or modify  *
+*   it under the terms of the GNU General Public License as published by  *
+*   the Free Software Foundation; either version 2 of the License, or     *
+*   (at your option) any later version.                                   *
+*                                                                         *
+***************************************************************************
+"""
+
+__author__ = 'Luigi Pirelli'
+__date__ = 'October 2026'
+__copyright__ = '(C) 2026, Luigi Pirelli'
+
+# other common modules
+import os
+import fnmatch
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from qgis.core import (
+    QgsProcessingException,
+    QgsProcessingParameterFile,
+    QgsProcessingParameterBoolean,
+    QgsProcessingParameterNumber,
+    QgsProcessingParameterCrs,
+    QgsProcessingParameterString,
+    QgsProcessingParameterFileDestination,
+    QgsProcessingOutputNumber)
+from ..pdal_tools_algorithm import PDALtoolsAlgorithm
+
+class PdalTileIndex(PDALtoolsAlgorithm):
+    """
+    Build a tile index of the point cloud files of a folder: a
+    GeoPackage (or SQLite) layer with a spatial index where each
+    feature is the footprint (bounding box) of a file with its
+    location, point count, SRS, size and modification time.
+    LAS/LAZ/COPC metadata are read from the file header, other
+    formats with pdal info. Files are read concurrently.
+    If the index exists it's updated: only new or changed files
+    (size or modification time) are read and files no more in the
+    folder are removed.
+    Footprints are reprojected to the index CRS, by default the
+    CRS of the first indexed file.
+    """
+
+    INPUT_FOLDER = 'INPUT_FOLDER'
+    INPUT_PATTERNS = 'INPUT_PATTERNS'
+    RECURSIVE = 'RECURSIVE'
+    WORKERS = 'WORKERS'
+    CRS = 'CRS'
+    OUTPUT = 'OUTPUT'
+    ADDED = 'ADDED'
+    UPDATED = 'UPDATED'
+    REMOVED = 'REMOVED'
+    UNCHANGED = 'UNCHANGED'
+    FAILED = 'FAILED'
+
+    LAYER_NAME = 'tile_index'
+
+    # files committed in a single transaction
+    COMMIT_SIZE = 1000
+
+    def createInstance(self):
+        return PdalTileIndex()
+
+    def name(self):
+        """
+        Returns the algorithm name, used for identifying the algorithm. This
+        string should be fixed for the algorithm, and must not be localised.
+        The name should be unique within each provider. Names should contain
+        lowercase alphanumeric characters only and no spaces or other
+        formatting characters.
+        """
+        return 'pdaltileindex'
+
+    def displayName(self):
+        """
+        Returns the translated algorithm name, which should be used for any
+        user-visible display of the algorithm name.
+        """
+        return self.tr('PDAL tile index')
+
+    def group(self):
+        """
+        Returns the name of the group this algorithm belongs to. This string
+        should be localised.
+        """
+        return self.tr('Utilities')
+
+    def groupId(self):
+        """
+        Returns the unique ID of the group this algorithm belongs to. This
+        string should be fixed for the algorithm, and must not be localised.
+        The group id should be unique within each provider. Group id should
+        contain lowercase alphanumeric characters only and no spaces or other
+        formatting characters.
+        """
+        return 'utilities'
+
+    def shortHelpString(self):
+        """
+        Returns a localised short helper string for the algorithm. This string
+        should provide a basic description about what the algorithm does and the
+        parameters and outputs associated with it..
+        """
+        return self.tr(self.__doc__)
+
+    def initAlgorithm(self, config=None):
+        self.addParameter(
+            QgsProcessingParameterFile(
+                name=self.INPUT_FOLDER,
+                description=self.tr('Input folder'),
+                behavior=QgsProcessingParameterFile.Folder,
+                defaultValue=None,
+                optional=False
+            )
+        )
+        self.addParameter(
+            QgsProcessingParameterString(
+                name=self.INPUT_PATTERNS,
+                description=self.tr('Input folder file patterns (; separated)'),
+                defaultValue='*.las;*.laz',
+                optional=True
+            )
+        )
+        self.addParameter(
+            QgsProcessingParameterBoolean(
+                name=self.RECURSIVE,
+                description=self.tr('Scan subfolders'),
+                defaultValue=True,
+                optional=False
+            )
+        )
+        self.addParameter(
+            QgsProcessingParameterNumber(
+                name=self.WORKERS,
+                description=self.tr('Files read concurrently'),
+                type=QgsProcessingParameterNumber.Integer,
+                defaultValue=os.cpu_count() or 1,
+                minValue=1,
+                optional=False
+            )
+        )
+        self.addParameter(
+            QgsProcessingParameterCrs(
+                name=self.CRS,
+                description=self.tr('Index CRS (default CRS of the first file)'),
+                defaultValue=None,
+                optional=True
+            )
+        )
+
+        # set outputs
+        self.addParameter(
+            QgsProcessingParameterFileDestination(
+                name=self.OUTPUT,
+                description=self.tr('Tile index'),
+                fileFilter='GeoPackage (*.gpkg);;SQLite (*.sqlite)',
+                defaultValue=None,
+                createByDefault=True
+            )
+        )
+        self.addOutput(QgsProcessingOutputNumber(self.ADDED, self.tr('Added files')))
+        self.addOutput(QgsProcessingOutputNumber(self.UPDATED, self.tr('Updated files')))
+        self.addOutput(QgsProcessingOutputNumber(self.REMOVED, self.tr('Removed files')))
+        self.addOutput(QgsProcessingOutputNumber(self.UNCHANGED, self.tr('Unchanged files')))
+        self.addOutput(QgsProcessingOutputNumber(self.FAILED, self.tr('Failed files')))
+
+    def scanFolder(self, folder, patterns, recursive):
+        '''Return {filename: (size, mtime)} of the files of folder
+        matching patterns.'''
+        files = {}
+        for root, dirs, fileNames in os.walk(folder):
+            if not recursive:
+                dirs[:] = []
+            for fileName in fileNames:
+                if not any(fnmatch.fnmatch(fileName.lower(), pattern) for pattern in patterns):
+                    continue
+                fileName = os.path.join(root, fileName)
+                try:
+                    stat = os.stat(fileName)
+                except OSError:
+                    continue
+                files[fileName] = (stat.st_size, stat.st_mtime_ns)
+        return files
+
+    def openIndex(self, fileName):
+        '''Open or create the index dataset. Returns (dataset, layer)
+        where layer is None if not yet created.'''
+        import ogr
+        if os.path.exists(fileName):
+            dataset = ogr.Open(fileName, update=1)
+            if dataset is None:
+                raise QgsProcessingException(self.tr('Cannot open tile index {}').format(fileName))
+            return dataset, dataset.GetLayerByName(self.LAYER_NAME)
+
+        if fileName.lower().endswith('.sqlite'):
+            driver = ogr.GetDriverByName('SQLite')
+            dataset = driver.CreateDataSource(fileName, options=['SPATIALITE=YES'])
+        else:
+            driver = ogr.GetDriverByName('GPKG')
+            dataset = driver.CreateDataSource(fileName)
+        if dataset is None:
+            raise QgsProcessingException(self.tr('Cannot create tile index {}').format(fileName))
+        return dataset, None
+
+    def createLayer(self, dataset, srs):
+        import ogr
+        layer = dataset.CreateLayer(self.LAYER_NAME, srs, ogr.wkbPolygon, options=['SPATIAL_INDEX=YES'])
+        if layer is None:
+            raise QgsProcessingException(self.tr('Cannot create tile index layer'))
+        for name, fieldType in [('location', ogr.OFTString),
+                                ('count', ogr.OFTInteger64),
+                                ('srs', ogr.OFTString),
+                                ('size', ogr.OFTInteger64),
+                                ('mtime', ogr.OFTInteger64)]:
+            layer.CreateField(ogr.FieldDefn(name, fieldType))
+        # fast lookup of files by location
+        dataset.ExecuteSQL('CREATE UNIQUE INDEX IF NOT EXISTS {0}_location ON {0} (location)'.format(self.LAYER_NAME))
+        return layer
+
+    @staticmethod
+    def spatialReference(wkt):
+        import osr
+        if not wkt:
+            return None
+        srs = osr.SpatialReference()
+        if srs.ImportFromWkt(wkt) != 0:
+            return None
+        # keep x/y axis order of the point clouds with GDAL >= 3
+        if hasattr(srs, 'SetAxisMappingStrategy'):
+            srs.SetAxisMappingStrategy(osr.OAMS_TRADITIONAL_GIS_ORDER)
+        return srs
+
+    @staticmethod
+    def footprint(metadata, srs, indexSrs):
+        '''Return the bounding box of metadata as polygon in indexSrs.'''
+        import ogr
+        import osr
+        ring = ogr.Geometry(ogr.wkbLinearRing)
+        for x, y in [(metadata['minx'], metadata['miny']), (metadata['maxx'], metadata['miny']),
+                     (metadata['maxx'], metadata['maxy']), (metadata['minx'], metadata['maxy']),
+                     (metadata['minx'], metadata['miny'])]:
+            ring.AddPoint_2D(x, y)
+        polygon = ogr.Geometry(ogr.wkbPolygon)
+        polygon.AddGeometry(ring)
+        if srs is not None and indexSrs is not None and not srs.IsSame(indexSrs):
+            # densify to follow the curvature of the reprojected edges
+            polygon.Segmentize(max(metadata['maxx'] - metadata['minx'], metadata['maxy'] - metadata['miny']) / 8)
+            polygon.Transform(osr.CoordinateTransformation(srs, indexSrs))
+        return polygon
+
+    def processAlgorithm(self, parameters, context, feedback):
+        # gdal is slow to import and only needed by this algorithm
+        import ogr
+
+        # saving feedback in instance variable to avoid passing
+        # it to all methods. It's shared by all readers
+        self.feedback = feedback
+
+        folder = os.path.abspath(self.parameterAsFile(parameters, self.INPUT_FOLDER, context))
+        patterns = self.parameterAsString(parameters, self.INPUT_PATTERNS, context) or '*'
+        patterns = [pattern.strip().lower() for pattern in patterns.split(';') if pattern.strip()]
+        recursive = self.parameterAsBool(parameters, self.RECURSIVE, context)
+        workers = self.parameterAsInt(parameters, self.WORKERS, context)
+        crs = self.parameterAsCrs(parameters, self.CRS, context)
+        output = self.parameterAsFileOutput(parameters, self.OUTPUT, context)
+
+        outputFolder = os.path.dirname(output)
+        if outputFolder and not os.path.exists(outputFolder):
+            os.makedirs(outputFolder)
+
+        files = self.scanFolder(folder, patterns, recursive)
+        feedback.pushInfo('Found {} files'.format(len(files)))
+
+        dataset, layer = self.openIndex(output)
+        try:
+            # indexed files of the folder => (fid, size, mtime)
+            indexed = {}
+            if layer is not None:
+                for feature in layer:
+                    location = feature.GetField('location')
+                    # entries of other folders are left untouched
+                    if not location or not location.startswith(folder + os.sep):
+                        continue
+                    if recursive or os.path.dirname(location) == folder:
+                        indexed[location] = (feature.GetFID(), feature.GetField('size'), feature.GetField('mtime'))
+                layer.ResetReading()
+
+            changed = [fileName for fileName, stat in files.items()
+                       if fileName not in indexed or indexed[fileName][1:] != stat]
+            removed = [fileName for fileName in indexed if fileName not in files]
+            unchanged = len(files) - len(changed)
+            feedback.pushInfo('Files to index: {}, to remove: {}, unchanged: {}'.format(
+                len(changed), len(removed), unchanged))
+
+            indexSrs = None
+            if crs.isValid():
+                indexSrs = self.spatialReference(crs.toWkt())
+            elif layer is not None:
+                indexSrs = layer.GetSpatialRef()
+
+            if layer is not None:
+                layer.StartTransaction()
+                for fileName in removed:
+                    layer.DeleteFeature(indexed[fileName][0])
+                layer.CommitTransaction()
+
+            added = 0
+            updated = 0
+            failed = 0
+            pending = 0
+            # a transaction can be open without pending features when the
+            # file failed after starting it
+            transaction = False
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                # header reads (or pdal info) run concurrently, writes
+                # are done by this thread because OGR is not thread safe
+                futures = {executor.submit(self.getPCLMetadata, fileName): fileName for fileName in changed}
+                try:
+                    for done, future in enumerate(as_completed(futures), 1):
+                        if feedback.isCanceled():
+                            break
+                        fileName = futures[future]
+                        try:
+                            pdalInfoJson = future.result()
+                            if not pdalInfoJson:
+                                raise QgsProcessingException('no metadata')
+                            metadata = pdalInfoJson['metadata']
+                            wkt = metadata.get('comp_spatialreference') or metadata.get('spatialreference') or ''
+                            srs = self.spatialReference(wkt)
+
+                            if layer is None:
+                                indexSrs = indexSrs or srs
+                                layer = self.createLayer(dataset, indexSrs)
+                            if not transaction:
+                                layer.StartTransaction()
+                                transaction = True
+
+                            feature = ogr.Feature(layer.GetLayerDefn())
+                            feature.SetField('location', fileName)
+                            feature.SetField('count', int(metadata['count']))
+                            feature.SetField('srs', wkt)
+                            feature.SetField('size', files[fileName][0])
+                            feature.SetField('mtime', files[fileName][1])
+                            feature.SetGeometry(self.footprint(metadata, srs, indexSrs))
+                            if fileName in indexed:
+                                feature.SetFID(indexed[fileName][0])
+                                layer.SetFeature(feature)
+                                updated += 1
+                            else:
+                                layer.CreateFeature(feature)
+                                added += 1
+
+                            pending += 1
+                            if pending >= self.COMMIT_SIZE:
+                                layer.CommitTransaction()
+                                transaction = False
+                                pending = 0
+                        except Exception as ex:
+                            failed += 1
+                            feedback.reportError('Cannot index {}: {}'.format(fileName, str(ex)))
+
+                        feedback.setProgress(100.0 * done / len(changed))
+                finally:
+                    for future in futures:
+                        future.cancel()
+                    # files indexed before cancel are kept => next run continues
+                    if transaction:
+                        layer.CommitTransaction()
+
+            # empty folder => empty index
+            if layer is None:
+                layer = self.createLayer(dataset, indexSrs)
+        finally:
+            layer = None
+            dataset = None
+
+        if feedback.isCanceled():
+            raise QgsProcessingException(self.tr('Tile index has been cancelled'))
+
+        return {
+            self.OUTPUT: output,
+            self.ADDED: added,
+            self.UPDATED: updated,
+            self.REMOVED: len(removed),
+            self.UNCHANGED: unchanged,
+            self.FAILED: failed,
+        }
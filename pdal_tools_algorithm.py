@@ -23,29 +23,56 @@ __date__ = 'August 2018'
 __copyright__ = '(C) 2018, Luigi Pirelli'
 
 import os
+import time
+import uuid
+import shutil
 import signal
-import subprocess
+import threading
 import json
+from contextlib import nullcontext
 
+from PyQt5.QtCore import Qt
 from PyQt5.QtGui import QIcon
 from qgis.core import (
     QgsApplication,
+    QgsExpression,
     QgsProcessingAlgorithm,
     QgsProcessingException,
+    QgsProcessingOutputNumber,
+    QgsProcessingParameterDefinition,
+    QgsProcessingParameterNumber,
+    QgsProcessingUtils,
     QgsMessageLog,
     Qgis)
-from processing.tools.system import isWindows, isMac
+from processing.tools.system import isWindows
 
 from .pdal_tools_utils import (
     PDALtoolsUtils,
-    NonBlockingStreamReader
+    PDALtoolsPipeline,
+    ExecutionLog,
+    LogForwarder,
+    ProcessOutputReader
 )
+from .pdal_tools_bindings import PDALtoolsBindings
+from .pdal_tools_profiler import PDALtoolsProfiler
 
 class PDALtoolsAlgorithm(QgsProcessingAlgorithm):
     '''Base class for all PDAL algorithms.'''
 
+    PEAK_MEMORY = 'PEAK_MEMORY'
+    USER_TIME = 'USER_TIME'
+    SYSTEM_TIME = 'SYSTEM_TIME'
+    WALL_TIME = 'WALL_TIME'
+    VERBOSITY = 'VERBOSITY'
+
     feedback = None
-    readlineTimeout = 0.2
+    # commands can be run in-process with python-pdal. See runAndWait
+    allowInProcess = True
+    # set to a PDALtoolsProfiler to collect execution timings
+    profiler = None
+    # resources used by all pdal processes. See accountResources
+    resourceUsage = None
+    resourceUsageLock = threading.Lock()
 
     def tr(self, string, context=''):
         if context == '':
@@ -57,43 +84,145 @@ class PDALtoolsAlgorithm(QgsProcessingAlgorithm):
         return QIcon(iconPath)
 
     def flags(self):
+        # processes are supervised by PDALtoolsRunner without event loop,
+        # then algorithms can run in background threads and in parallel
         return QgsProcessingAlgorithm.FlagSupportsBatch | \
                QgsProcessingAlgorithm.FlagCanCancel
 
 
+    def parameterAsPipeline(self, parameters, name, context):
+        '''Return the pipeline filename set in a string parameter cleaned
+        by chars attached during drag&drop.
+        The parameter can also be the pipeline json text where [% %]
+        QGIS expressions are replaced with their values, e.g. to generate
+        a pipeline for each row of a batch. Inline pipelines are passed
+        to pdal through stdin.'''
+        pdal_pipeline = self.parameterAsString(
+            parameters,
+            name,
+            context
+        )
+        if not pdal_pipeline:
+            raise QgsProcessingException(self.invalidSourceError(parameters, name))
+        if PDALtoolsPipeline.isInline(pdal_pipeline):
+            if '[%' in pdal_pipeline:
+                pdal_pipeline = QgsExpression.replaceExpressionText(pdal_pipeline, context.expressionContext())
+            # fail early on malformed json
+            PDALtoolsPipeline.load(pdal_pipeline)
+            return pdal_pipeline
+
+        # strips tiling and heading spaces and chars attached during drag&drop (linux)
+        pdal_pipeline = pdal_pipeline.lstrip().rstrip()
+        pdal_pipeline = pdal_pipeline.rstrip('\r\n')
+        if pdal_pipeline.startswith('file://'):
+            pdal_pipeline = pdal_pipeline[7:]
+        if not os.path.exists(pdal_pipeline) or not os.path.isfile(pdal_pipeline):
+            raise QgsProcessingException(self.invalidSourceError(parameters, name))
+
+        return pdal_pipeline
+
+    def profileSpan(self, name, **attributes):
+        '''Return a context manager profiling the enclosed code if
+        profiling is enabled.'''
+        if self.profiler is None:
+            return nullcontext()
+        return self.profiler.span(name, **attributes)
+
     def getPCLMetadata(self, pclFileName):
-        '''Extract metadata with pdal info --metadata.
+        '''Extract metadata reading LAS/LAZ header or, for other
+        formats, with pdal info --metadata. Metadata are get from the
+        persistent cache if the file is not changed since last read.
         Returns metadata JSON or None.'''
-        metadata = None
-        if pclFileName:
-            options = '--metadata'
-            commandline = ["pdal", "info", options, pclFileName]
-            returnedJson = self.runAndWait(commandline)
+        if not pclFileName:
+            return None
+
+        with self.profileSpan('metadata', filename=pclFileName):
+            return self._getPCLMetadata(pclFileName)
 
-            # clean returned string to be real json
-            # e.g. skip first stdout warning: 'Warning 1: Cannot find pcs.csv'
-            rows = returnedJson.split('\n')
-            if 'Warning 1: Cannot find pcs.csv' in rows[0]:
-                rows = rows[1:]
-            returnedJson = '\n'.join(rows)
+    def _getPCLMetadata(self, pclFileName):
 
-            # parse json
+        cache = None
+        if PDALtoolsUtils.useMetadataCache():
+            from .pdal_tools_cache import PDALtoolsMetadataCache
+            cache = PDALtoolsMetadataCache.instance()
+            metadata = cache.get(pclFileName)
+            if metadata:
+                return metadata
+
+        metadata = None
+        if PDALtoolsUtils.isLasFile(pclFileName):
             try:
-                metadata = json.loads(returnedJson)
+                metadata = PDALtoolsUtils.readLasMetadata(pclFileName)
             except Exception as ex:
+                self.feedback.pushConsoleInfo('Cannot read LAS header of {}: {}'.format(pclFileName, str(ex)))
+
+        if not metadata:
+            options = '--metadata'
+            commandline = ["pdal", "info", options, pclFileName]
+            # json is written in a dedicated file to avoid mixing it
+            # with warnings written by pdal or gdal
+            metadataFileName = os.path.join(QgsProcessingUtils.tempFolder(), 'pdaltools_info_{}.json'.format(uuid.uuid4().hex))
+            try:
+                self.runAndWait(commandline, outputFileName=metadataFileName)
+                with open(metadataFileName, 'r') as f:
+                    metadata = json.load(f)
+            except (OSError, ValueError) as ex:
                 self.feedback.pushConsoleInfo(str(ex))
+            finally:
+                if os.path.exists(metadataFileName):
+                    os.remove(metadataFileName)
+
+        if metadata and cache:
+            cache.put(pclFileName, metadata)
 
         return metadata
 
-    def createPdalCommand(self, options, pdal_pipeline, input_pcl_1, input_pcl_2, output_pcl):
+    def createPdalCommand(self, options, pdal_pipeline, input_pcl_1, input_pcl_2, output_pcl, outputs=None, inputs=None):
+        '''Return the "pdal pipeline" commandline overriding pipeline inputs
+        and outputs. output_pcl is set to the writer of the type managing its
+        extension. outputs is a list of (tag, filename) set to the writers
+        with that tag, e.g. to produce a point cloud and a raster in a single
+        pass of the pipeline. inputs is a list of (tag, filename) set to the
+        readers with that tag. Untagged stages can be referenced by their
+        type if unique (see PDALtoolsPipeline.stageIndex).'''
+        # options can be a single option or a list of them
+        if isinstance(options, str):
+            options = [options]
         # check out driver
-        commandline = ["pdal", "pipeline", options, "-i", pdal_pipeline]
+        pipeline = PDALtoolsPipeline.load(pdal_pipeline)
+        driver = PDALtoolsUtils.getDriverType(output_pcl) if output_pcl else None
+        if driver == 'ept' or any(PDALtoolsUtils.isEpt(fileName) for _, fileName in outputs or []):
+            raise QgsProcessingException("PDAL cannot write EPT datasets: use a .copc.laz output for a cloud optimized point cloud")
+
+        # stages of outputs are found before writers are retyped
+        outputIndexes = [(pipeline.stageIndex(tag), tag, fileName) for tag, fileName in outputs or []]
+
+        # LAS writers producing COPC outputs become writers.copc
+        retype = self.copcWriters(pipeline, driver, outputs)
+        if retype:
+            pdal_pipeline = json.dumps(pipeline.withStageTypes(retype, PDALtoolsUtils.LAS_ONLY_OPTIONS))
+            pipeline = PDALtoolsPipeline.load(pdal_pipeline)
+
+        commandline = ["pdal", "pipeline"] + options + ["-i", pdal_pipeline]
+
+        # readers referenced by tag or type
+        inputOverrides = []
+        for name, fileName in inputs or []:
+            index = pipeline.stageIndex(name)
+            reader = pipeline.stages()[index] if index is not None else None
+            if reader is None or PDALtoolsPipeline.kind(reader) not in ('readers', None):
+                raise QgsProcessingException("Pipeline has no reader '{}'".format(name))
+            inputOverrides.append((pipeline.overrideName(reader), 'filename', fileName))
+            commandline.append("--{}.filename={}".format(pipeline.overrideName(reader), fileName))
+        readers = [stage for stage in pipeline.stages(inputOverrides) if PDALtoolsPipeline.kind(stage) == 'readers']
 
         if input_pcl_1 and input_pcl_2:
             commandline.append("--stage.input1.filename={}".format(input_pcl_1))
             commandline.append("--stage.input2.filename={}".format(input_pcl_2))
         elif input_pcl_1 and not input_pcl_2:
-            commandline.append("--readers.las.filename={}".format(input_pcl_1))
+            # override the first reader of the pipeline
+            reader = (readers and pipeline.overrideName(readers[0])) or 'readers.las'
+            commandline.append("--{}.filename={}".format(reader, input_pcl_1))
         elif not input_pcl_1 and not input_pcl_2:
             # not PCL inputs specified => can be set inside the pipeline
             pass
@@ -101,7 +230,6 @@ class PDALtoolsAlgorithm(QgsProcessingAlgorithm):
             raise QgsProcessingException("None PCL or at least {} have to be set ".format(self.INPUT_PCL_1))
 
         if output_pcl:
-            driver = PDALtoolsUtils.getDriverType(output_pcl)
             commandline.append("--writers.{}.filename={}".format(driver, output_pcl))
 
             # add BBOX if driver is gdal. BBOX is get from input_pcl_1 metadata
@@ -109,96 +237,411 @@ class PDALtoolsAlgorithm(QgsProcessingAlgorithm):
             # is nto streamable and, due to a PDAL bug need to have
             # set BBOX as option of the writer
             if driver == 'gdal':
-                if input_pcl_1:
-                    pdalInfoJson = self.getPCLMetadata(input_pcl_1)
-                else:
-                    # get the pcl name from the pipeline
-                    with open(pdal_pipeline, 'r') as f:
-                        jsondata = f.readlines()
-                    # strip all comments that does not part of json standard
-                    jsondata = [line.strip() for line in jsondata if (not line.strip().startswith('/') and not line.strip().startswith('*') )]
-                    jsondata = "".join(jsondata)
-                    try:
-                        jsondata = json.loads(jsondata)
-                    except Exception as ex:
-                        raise QgsProcessingException(str(ex))
-
-                    stage_map = {
-                        "reader1":0,
-                    }
-                    pcl_from_pipeline = jsondata["pipeline"][stage_map['reader1']]['filename']
-                    if not pcl_from_pipeline:
-                        raise QgsProcessingException("cannot determine a PCL from get boundingbox for gdal writer")
-
-                    pdalInfoJson = self.getPCLMetadata(pcl_from_pipeline)
-
-                minx = pdalInfoJson['metadata']['minx']
-                miny = pdalInfoJson['metadata']['miny']
-                maxx = pdalInfoJson['metadata']['maxx']
-                maxy = pdalInfoJson['metadata']['maxy']
-
-                # bounds format is ([minX, maxX],[minY,maxY]).
-                commandline.append('--writers.{}.bounds=([{}, {}], [{}, {}])'.format(driver, minx, maxx, miny, maxy))
+                commandline.append('--writers.{}.bounds={}'.format(driver, self.gdalBounds(input_pcl_1, readers)))
+
+        # writers referenced by tag (pdal does not accept --writers.<tag>)
+        # or by type. Type is the retyped one, e.g. writers.copc
+        for index, tag, fileName in outputIndexes:
+            writer = pipeline.stages()[index] if index is not None else None
+            if writer is None or PDALtoolsPipeline.kind(writer) not in ('writers', None):
+                raise QgsProcessingException("Pipeline has no writer with tag '{}'".format(tag))
+            override = pipeline.overrideName(writer)
+            commandline.append("--{}.filename={}".format(override, fileName))
+
+            writerType = writer.get('type') or 'writers.{}'.format(PDALtoolsUtils.getDriverType(fileName))
+            if writerType == 'writers.gdal' and 'bounds' not in writer:
+                commandline.append('--{}.bounds={}'.format(override, self.gdalBounds(input_pcl_1, readers)))
 
         return commandline
 
-    def runAndWait(self, commandline):
+    def copcWriters(self, pipeline, driver, outputs):
+        '''Return index => writers.copc for the LAS writers of pipeline
+        producing .copc.laz outputs: the output of driver (set by type)
+        and the outputs (tag, filename) set by tag.
+        COPC files are LAZ organized as an octree, then QGIS and other
+        pipelines can read only the nodes they need.'''
+        stages = pipeline.stages()
+        retype = {}
+        if driver == 'copc' and not [stage for stage in stages if stage.get('type') == 'writers.copc']:
+            lasWriters = [index for index, stage in enumerate(stages) if stage.get('type') == 'writers.las']
+            # --writers.copc would set all of them
+            if len(lasWriters) == 1:
+                retype[lasWriters[0]] = 'writers.copc'
+        for tag, fileName in outputs or []:
+            if PDALtoolsUtils.getDriverType(fileName) != 'copc':
+                continue
+            index = pipeline.stageIndex(tag)
+            if index is not None and stages[index].get('type') == 'writers.las':
+                retype[index] = 'writers.copc'
+        return retype
+
+    def gdalBounds(self, input_pcl_1, readers):
+        '''Return the bounds for a gdal writer get from metadata of
+        input_pcl_1 or of the first reader of the pipeline.'''
+        if input_pcl_1:
+            pdalInfoJson = self.getPCLMetadata(input_pcl_1)
+        else:
+            # get the pcl name from the first reader of the pipeline
+            pcl_from_pipeline = readers[0].get('filename') if readers else None
+            if not pcl_from_pipeline:
+                raise QgsProcessingException("cannot determine a PCL from get boundingbox for gdal writer")
+
+            pdalInfoJson = self.getPCLMetadata(pcl_from_pipeline)
+
+        minx = pdalInfoJson['metadata']['minx']
+        miny = pdalInfoJson['metadata']['miny']
+        maxx = pdalInfoJson['metadata']['maxx']
+        maxy = pdalInfoJson['metadata']['maxy']
+
+        # bounds format is ([minX, maxX],[minY,maxY]).
+        return '([{}, {}], [{}, {}])'.format(minx, maxx, miny, maxy)
+
+    def runPipeline(self, commandline, outputFileName, incremental=False, hashContent=False, run=None):
+        '''Validate and run a "pdal pipeline" commandline. outputFileName can
+        be a filename or a list of them for pipelines with several writers.
+        Outputs, with their sidecar files, are written in temporary folders
+        and moved beside outputFileName only at the end of a successful run,
+        then a manifest of the execution is saved beside them.
+        If incremental, execution is skipped when the manifests of existing
+        outputs match the current inputs, pipeline and pdal version.
+        run(commandline) is the function executing the pipeline, by default
+        runAndWait.
+        Returns False if skipped.'''
+        run = run or self.runAndWait
+        outputFileNames = outputFileName if isinstance(outputFileName, (list, tuple)) else [outputFileName]
+        outputFileNames = [fileName for fileName in outputFileNames if fileName]
+
+        manifest = None
+        if outputFileNames:
+            manifest = PDALtoolsUtils.buildManifest(commandline, hashContent)
+            if incremental and all(PDALtoolsUtils.isUpToDate(fileName, manifest) for fileName in outputFileNames):
+                self.feedback.pushConsoleInfo("Skipped step because output file is up to date: {}".format(", ".join(outputFileNames)))
+                return False
+
+        # first validate pipeline. Validation errors are reported
+        # by the run itself if validation is skipped
+        if not PDALtoolsUtils.skipValidation():
+            self.validatePipeline(commandline)
+
+        if not outputFileNames:
+            run(commandline)
+            return True
+
+        # outputs are written in temporary folders beside them to
+        # move also their sidecar files (e.g. .shx/.dbf of shapefiles)
+        tempFolders = []
+        try:
+            for fileName in outputFileNames:
+                PDALtoolsUtils.removeManifest(fileName)
+                tempFolder = PDALtoolsUtils.temporaryFolder(fileName)
+                tempFolders.append(tempFolder)
+                commandline = PDALtoolsUtils.replaceOutput(commandline, fileName, os.path.join(tempFolder, os.path.basename(fileName)))
+            run(commandline)
+            for fileName, tempFolder in zip(outputFileNames, tempFolders):
+                if not os.path.exists(os.path.join(tempFolder, os.path.basename(fileName))):
+                    raise QgsProcessingException("Output {} has not been created by the pipeline".format(fileName))
+            for fileName, tempFolder in zip(outputFileNames, tempFolders):
+                outputFolder = os.path.dirname(os.path.abspath(fileName))
+                for producedFileName in os.listdir(tempFolder):
+                    os.replace(os.path.join(tempFolder, producedFileName), os.path.join(outputFolder, producedFileName))
+        finally:
+            for tempFolder in tempFolders:
+                shutil.rmtree(tempFolder, ignore_errors=True)
+
+        for fileName in outputFileNames:
+            PDALtoolsUtils.writeManifest(fileName, manifest)
+        return True
+
+    def validatePipeline(self, commandline):
+        '''Validate the pipeline of a "pdal pipeline" commandline with
+        --validate option. Validation is done only once for the same
+        pipeline, stage overrides and pdal version.'''
+        validationKey = PDALtoolsUtils.validationKey(commandline)
+        if PDALtoolsUtils.isValidated(validationKey):
+            self.feedback.pushConsoleInfo('Pipeline already validated: {}'.format(" ".join(commandline)))
+            return
+
+        # same command with validate option in place of the run options
+        validationCommandline = PDALtoolsUtils.replaceOptions(commandline, ['--validate'])
+        with self.profileSpan('validation'):
+            self.runAndWait(validationCommandline)
+
+        PDALtoolsUtils.setValidated(validationKey)
+
+    def addVerbosityParameter(self):
+        '''Add advanced parameter setting pdal log verbosity. High verbosity
+        produces huge logs on big inputs but is needed by stage profiling.'''
+        verbosity = QgsProcessingParameterNumber(
+            name=self.VERBOSITY,
+            description=self.tr('pdal log verbosity (0-8)'),
+            type=QgsProcessingParameterNumber.Integer,
+            defaultValue=8,
+            minValue=0,
+            maxValue=8,
+            optional=True
+        )
+        verbosity.setFlags(verbosity.flags() | QgsProcessingParameterDefinition.FlagAdvanced)
+        self.addParameter(verbosity)
+
+    def verbosityOption(self, parameters, context):
+        '''Return pdal option for the verbosity set by addVerbosityParameter.'''
+        verbosity = 8
+        if parameters.get(self.VERBOSITY) is not None:
+            verbosity = self.parameterAsInt(parameters, self.VERBOSITY, context)
+        return '--verbose={}'.format(verbosity)
+
+    def addResourceUsageOutputs(self):
+        '''Add outputs reporting resources used by pdal processes.'''
+        self.addOutput(QgsProcessingOutputNumber(self.PEAK_MEMORY, self.tr('Peak memory of pdal processes (MB)')))
+        self.addOutput(QgsProcessingOutputNumber(self.USER_TIME, self.tr('User cpu time of pdal processes (s)')))
+        self.addOutput(QgsProcessingOutputNumber(self.SYSTEM_TIME, self.tr('System cpu time of pdal processes (s)')))
+        self.addOutput(QgsProcessingOutputNumber(self.WALL_TIME, self.tr('Wall time of pdal processes (s)')))
+
+    def resourceUsageResults(self):
+        '''Return results for outputs added by addResourceUsageOutputs.'''
+        usage = self.resourceUsage or {}
+        return {
+            self.PEAK_MEMORY: usage.get('peak_rss', 0) / (1024 * 1024),
+            self.USER_TIME: usage.get('user_time', 0),
+            self.SYSTEM_TIME: usage.get('system_time', 0),
+            self.WALL_TIME: usage.get('wall_time', 0),
+        }
+
+    def accountResources(self, usage):
+        '''Sum usage of a pdal execution to resourceUsage: peak rss is the
+        max of all executions, times are summed.'''
+        with self.resourceUsageLock:
+            if self.resourceUsage is None:
+                self.resourceUsage = {
+                    'peak_rss': 0,
+                    'user_time': 0.0,
+                    'system_time': 0.0,
+                    'wall_time': 0.0,
+                }
+            for key, value in usage.items():
+                if key == 'peak_rss':
+                    self.resourceUsage[key] = max(self.resourceUsage[key], value)
+                else:
+                    self.resourceUsage[key] += value
+
+    def runAndWait(self, commandline, outputFileName=None):
+        '''Execute pdal command waiting it's end. Command is run in-process
+        with python-pdal if enabled and available, otherwise as subprocess.
+        If outputFileName is set, command output (e.g. pdal info json) is
+        written there and not in the log.
+        Returns head and tail of the log of execution.
+        '''
+        daemonSocket = PDALtoolsUtils.daemonSocket()
+        if daemonSocket and commandline[1] == 'pipeline':
+            with self.profileSpan('pdal', command=commandline[1], daemon=True):
+                return self.runInDaemon(commandline, daemonSocket)
+
+        if self.allowInProcess and PDALtoolsBindings.canExecute(commandline):
+            with self.profileSpan('pdal', command=commandline[1], inProcess=True):
+                return self.runInProcess(commandline, outputFileName)
+
+        with self.profileSpan('pdal', command=commandline[1], inProcess=False):
+            return self.runSubprocess(commandline, outputFileName)
+
+    def logForwarder(self):
+        '''Return the forwarder of pdal output to message log and processing
+        console depending on settings. GUI sinks are slow then output is
+        forwarded in batches, the full log is kept by ExecutionLog.'''
+        sinks = []
+        if PDALtoolsUtils.logToMessageLog():
+            sinks.append(lambda text: QgsMessageLog.logMessage(text, 'PDALTools', Qgis.Info))
+        if PDALtoolsUtils.logToConsole():
+            sinks.append(self.feedback.pushConsoleInfo)
+        return LogForwarder(sinks)
+
+    def runInDaemon(self, commandline, daemonSocket):
+        '''Execute a "pdal pipeline" commandline submitting it to the warm
+        python-pdal workers of a PDALtoolsDaemon. Cancelling kills the
+        worker that is replaced by the daemon.
+        Returns head and tail of the log of execution.'''
+        from .pdal_tools_daemon import PDALtoolsDaemonClient
+
+        self.feedback.pushConsoleInfo('Daemon {}: {}'.format(daemonSocket, " ".join(commandline)))
+        options, _, _ = PDALtoolsUtils.parsePipelineCommand(commandline)
+        metadataFileName = None
+        verbosity = 0
+        for option in options:
+            if option.startswith('--metadata='):
+                metadataFileName = option[len('--metadata='):]
+            elif option.startswith('--verbose='):
+                verbosity = int(option[len('--verbose='):])
+
+        # stages are sent with overrides applied
+        request = {
+            'pipeline': {'pipeline': PDALtoolsUtils.commandStages(commandline)},
+            'stream': '--stream' in options,
+            'validate': '--validate' in options,
+            'metadata': bool(metadataFileName),
+            'loglevel': verbosity,
+        }
+
+        workers = []
+        def kill():
+            for pid in workers:
+                try:
+                    os.kill(pid, signal.SIGKILL)
+                except (ProcessLookupError, PermissionError):
+                    pass
+        def onStarted(pid):
+            workers.append(pid)
+            if self.feedback.isCanceled():
+                kill()
+
+        start = time.time()
+        # direct connection: see runSubprocess
+        self.feedback.canceled.connect(kill, Qt.DirectConnection)
+        try:
+            if self.feedback.isCanceled():
+                raise QgsProcessingException("Command {} has been cancelled".format(commandline))
+            response = PDALtoolsDaemonClient(daemonSocket).submit(request, onStarted)
+        except (OSError, ValueError) as ex:
+            if self.feedback.isCanceled():
+                raise QgsProcessingException("Command {} has been cancelled".format(commandline))
+            raise QgsProcessingException("Failed submitting command {} to pdal daemon: {}".format(commandline, str(ex)))
+        finally:
+            self.feedback.canceled.disconnect(kill)
+        # workers memory is shared by jobs => only wall time is meaningful
+        self.accountResources({'wall_time': time.time() - start})
+
+        if response.get('status') != 'ok':
+            raise QgsProcessingException("Failed execution of command {} in pdal daemon: {}".format(commandline, response.get('error')))
+        if metadataFileName:
+            with open(metadataFileName, 'w') as f:
+                json.dump(response.get('metadata', {}), f)
+
+        executionLog = ExecutionLog()
+        forwarder = self.logForwarder()
+        if response.get('log'):
+            # the log file of the job is owned by the client
+            try:
+                with open(response['log'], 'r', errors='replace') as f:
+                    for out in iter(lambda: ''.join(f.readlines(ProcessOutputReader.chunkSize)), ''):
+                        executionLog.append(out)
+                        forwarder.append(out)
+                        if self.profiler:
+                            self.profiler.parseLog(out)
+            finally:
+                os.remove(response['log'])
+        forwarder.close()
+        if self.profiler and PDALtoolsProfiler.isPipelineRun(commandline):
+            # python-pdal log has no timing: only the pipeline is timed
+            self.profiler.pipelineRun(response.get('wall_time'))
+
+        return executionLog.text()
+
+    def runInProcess(self, commandline, outputFileName=None):
+        '''Execute pdal command in-process with python-pdal.
+        Returns log of execution. The execution is blocking and cannot
+        be cancelled once started.
+        '''
+        self.feedback.pushConsoleInfo(" ".join(commandline))
+        if self.feedback.isCanceled():
+            raise QgsProcessingException("Command {} has been cancelled".format(commandline))
+
+        start = time.time()
+        log = PDALtoolsBindings.execute(commandline, outputFileName)
+        wallTime = time.time() - start
+        # memory is shared with QGIS => only wall time is meaningful
+        self.accountResources({'wall_time': wallTime})
+        if self.profiler:
+            # python-pdal log has no timing: only the pipeline is timed
+            self.profiler.parseLog(log)
+            if PDALtoolsProfiler.isPipelineRun(commandline):
+                self.profiler.pipelineRun(wallTime)
+
+        executionLog = ExecutionLog()
+        executionLog.append(log)
+        forwarder = self.logForwarder()
+        forwarder.append(executionLog.text())
+        forwarder.close()
+
+        return executionLog.text()
+
+    def runSubprocess(self, commandline, outputFileName=None, group=None):
         '''Subprocess pdal pipeline waiting it's end.
-        Returns stdout/error log of execution. The execution is not blocking.
+        If outputFileName is set, stdout is written there and only
+        stderr is logged. If group (a PDALtoolsRunnerGroup) is set, the
+        process is part of it while running, e.g. to be killed together
+        with the other processes of the group.
+        Returns head and tail of stdout/error log of execution. Full log
+        is saved compressed in processing temporary folder.
         '''
-        executionLog = ''
+        executionLog = ExecutionLog(QgsProcessingUtils.tempFolder())
 
         QgsMessageLog.logMessage(" ".join(commandline),'PDALTools', Qgis.Info)
         self.feedback.pushConsoleInfo(" ".join(commandline))
 
-        # !Note! subprocess call is similar as in Grass7Utils.executeGrass
-        # For MS-Windows, we need to hide the console window.
-        si = None
-        if isWindows():
-            si = subprocess.STARTUPINFO()
-            si.dwFlags |= subprocess.STARTF_USESHOWWINDOW
-            si.wShowWindow = subprocess.SW_HIDE
-
-        proc = subprocess.Popen(commandline,
-                                shell=True if isMac() else False,
-                                stdout=subprocess.PIPE,
-                                stdin=open(os.devnull),
-                                stderr=subprocess.STDOUT,
-                                universal_newlines=True,
-                                startupinfo=si)
-        nbsr = NonBlockingStreamReader(proc.stdout)
-        while proc.poll() is None:
+        # stages are timed by the elapsed time pdal writes in the log
+        timedCommandline = None
+        if self.profiler:
+            timedCommandline = PDALtoolsProfiler.logTimingCommand(commandline)
+        # pdal elapsed time restarts for each process
+        runId = object()
+
+        def onOutput(out):
+            executionLog.append(out)
+            forwarder.append(out)
+            if self.profiler:
+                self.profiler.parseLog(out, runId if timedCommandline else None)
+
+        # subprocess machinery is imported only when needed
+        from .pdal_tools_runner import PDALtoolsRunner
+
+        # optional memory and cpu limits
+        runner = PDALtoolsRunner(timedCommandline or commandline,
+                                 outputFileName=outputFileName,
+                                 limits=PDALtoolsUtils.resourceLimits(),
+                                 onOutput=onOutput)
+
+        # cancel is notified by the feedback signal, no need to poll
+        # isCanceled. The slot is called directly by the thread emitting
+        # canceled (e.g. the GUI one) because algorithm threads (processing
+        # tasks, batch and tile pools) have no event loop to run a queued
+        # slot. runner.kill is thread safe
+        self.feedback.canceled.connect(runner.kill, Qt.DirectConnection)
+        forwarder = self.logForwarder()
+        if group is not None:
+            group.add(runner)
+        try:
             if self.feedback.isCanceled():
-                proc.kill()
-
-            out = nbsr.readline(self.readlineTimeout)
-            if out:
-                QgsMessageLog.logMessage(out,'PDALTools', Qgis.Info)
-                self.feedback.pushConsoleInfo(out)
-                executionLog += out
-
-            # allow the dialog to be responsive allowing accept cancel process
-            QgsApplication.instance().processEvents()
-
-        # proc is terminated but could have more messages in stdout to read
-        out = nbsr.readline(self.readlineTimeout)
-        while out is not None:
-            QgsMessageLog.logMessage(out,'PDALTools', Qgis.Info)
-            self.feedback.pushConsoleInfo(out)
-            executionLog += out
-            out = nbsr.readline(self.readlineTimeout)
+                runner.kill()
+            with self.profileSpan('spawn'):
+                runner.start()
+            runner.wait()
+            usage = runner.usage
+            self.accountResources(usage)
+            if self.profiler and PDALtoolsProfiler.isPipelineRun(commandline):
+                self.profiler.pipelineRun(usage.get('wall_time'), runId if timedCommandline else None)
+        finally:
+            self.feedback.canceled.disconnect(runner.kill)
+            if group is not None:
+                group.remove(runner)
+            executionLog.close()
+            forwarder.close()
+        proc = runner.proc
 
         # check return code depending on platform
         if isWindows():
             pass
         else:
             # it is a unix env
-            if proc.returncode == -(signal.SIGKILL.value):
+            if proc.returncode == -(signal.SIGKILL.value) and runner.killed:
                 raise QgsProcessingException("Command {} has been cancelled with signal: {}".format(commandline, proc.returncode))
+            if proc.returncode < 0:
+                # e.g. killed by OOM killer or by resource limits
+                raise QgsProcessingException("Command {} has been killed with signal: {} (peak memory: {:.1f} MB, cpu time: {:.1f} s)".format(
+                    commandline, -proc.returncode,
+                    usage.get('peak_rss', 0) / (1024 * 1024),
+                    usage.get('user_time', 0) + usage.get('system_time', 0)))
 
         # check generic return code
         if proc.returncode != 0:
-            raise QgsProcessingException("Failed execution of command {} with return code: {}".format(commandline, proc.returncode))
+            raise QgsProcessingException("Failed execution of command {} with return code: {}. Full log in {}".format(commandline, proc.returncode, executionLog.fileName))
 
         # return only pdal log
-        return executionLog
+        return executionLog.text()
@@ -0,0 +1,165 @@
+# -*- coding: utf-8 -*-
+"""
+***************************************************************************
+    pdal_tools_bindings.py
+    -------------------------
+    begin                : October 2026
+    copyright            : (C) 2026 by Luigi Pirelli
+    email                : luipir at gmail dot com
+    dev for              : http://cartolab.udc.es/cartoweb/
+    Project              : http://cartolab.udc.es/geomove/
+***************************************************************************
+*                                                                         *
+*   This program is free software; you can redistribute it and/or modify  *
+*   it under the terms of the GNU General Public License as published by  *
+*   the Free Software Foundation; either version 2 of the License, or     *
+*   (at your option) any later version.                                   *
+*                                                                         *
+***************************************************************************
+"""
+
+__author__ = 'Luigi Pirelli'
+__date__ = 'October 2026'
+__copyright__ = '(C) 2026, Luigi Pirelli'
+
+import json
+import threading
+from qgis.core import (
+    QgsProcessingException,
+    QgsMessageLog,
+    Qgis
+)
+
+from .pdal_tools_utils import PDALtoolsUtils
+from .pdal_tools_common import setPipelineLogLevel
+
+# python-pdal is an optional dependency. If not available all
+# commands are executed with pdal executable. It's imported on first
+# use because loading libpdal slows down QGIS startup
+_pdal = None
+_pdalLock = threading.Lock()
+
+
+def pdalModule():
+    '''Return python-pdal module or None if not installed.'''
+    global _pdal
+    if _pdal is None:
+        with _pdalLock:
+            if _pdal is None:
+                try:
+                    import pdal
+                    _pdal = pdal
+                except ImportError:
+                    _pdal = False
+    return _pdal or None
+
+
+class PDALtoolsBindings:
+    '''In-process execution of pdal commands using python-pdal bindings.
+    Only the subset of pdal command line used by the plugin is managed:
+    "pdal pipeline" and "pdal info --metadata". Everything else have to
+    be executed as subprocess.'''
+
+    @staticmethod
+    def isAvailable():
+        return pdalModule() is not None
+
+    @staticmethod
+    def canExecute(commandline):
+        '''True if commandline can be executed in-process.'''
+        if not PDALtoolsUtils.usePythonPdal():
+            return False
+        if not PDALtoolsBindings.isAvailable():
+            return False
+        if len(commandline) < 3 or commandline[0] != 'pdal':
+            return False
+        if commandline[1] == 'pipeline':
+            options, pipelineFileName, _ = PDALtoolsUtils.parsePipelineCommand(commandline)
+            if not pipelineFileName:
+                return False
+            # validation is available only in some python-pdal versions
+            if '--validate' in options and not hasattr(pdalModule().Pipeline, 'validate'):
+                return False
+            return True
+        if commandline[1] == 'info':
+            return commandline[2:-1] == ['--metadata']
+        return False
+
+    @staticmethod
+    def execute(commandline, outputFileName=None):
+        '''Execute commandline in-process. If outputFileName is set, command
+        output (e.g. pdal info json) is written there.
+        Returns the log of the execution as does running pdal executable.'''
+        QgsMessageLog.logMessage('In-process: {}'.format(" ".join(commandline)), 'PDALTools', Qgis.Info)
+        try:
+            if commandline[1] == 'info':
+                output = PDALtoolsBindings._info(commandline[-1])
+                if not outputFileName:
+                    return output
+                with open(outputFileName, 'w') as f:
+                    f.write(output)
+                return ''
+            return PDALtoolsBindings._pipeline(commandline)
+        except QgsProcessingException:
+            raise
+        except Exception as ex:
+            raise QgsProcessingException("Failed execution of command {}: {}".format(commandline, str(ex)))
+
+    @staticmethod
+    def _pipeline(commandline):
+        options, _, _ = PDALtoolsUtils.parsePipelineCommand(commandline)
+        stages = PDALtoolsUtils.commandStages(commandline)
+
+        pipeline = pdalModule().Pipeline(json.dumps({'pipeline': stages}))
+        # same log of pdal executable: it's forwarded and used by the profiler
+        PDALtoolsBindings._setLogLevel(pipeline, options)
+        if '--validate' in options:
+            pipeline.validate()
+            return ''
+
+        if '--stream' in options and hasattr(pipeline, 'execute_streaming'):
+            pipeline.execute_streaming()
+        else:
+            pipeline.execute()
+
+        for option in options:
+            if option.startswith('--metadata='):
+                with open(option[len('--metadata='):], 'w') as f:
+                    f.write(PDALtoolsBindings._metadataAsString(pipeline))
+
+        return getattr(pipeline, 'log', '') or ''
+
+    @staticmethod
+    def _setLogLevel(pipeline, options):
+        '''Set the log level of pipeline as the --verbose option of the
+        command line (pdal default is 0, errors only).'''
+        verbosity = 0
+        for option in options:
+            if option.startswith('--verbose='):
+                verbosity = int(option[len('--verbose='):])
+        setPipelineLogLevel(pdalModule(), pipeline, verbosity)
+
+    @staticmethod
+    def _info(pclFileName):
+        '''Emulate "pdal info --metadata" reading only the header of the file.'''
+        pipeline = pdalModule().Pipeline(json.dumps({'pipeline': [{'filename': pclFileName, 'count': 0}]}))
+        pipeline.execute()
+
+        metadata = json.loads(PDALtoolsBindings._metadataAsString(pipeline))
+        metadata = metadata.get('metadata', metadata)
+        readerMetadata = {}
+        for key, value in metadata.items():
+            if key.startswith('readers.'):
+                # depending on version can be a list of stage metadata
+                readerMetadata = value[0] if isinstance(value, list) else value
+                break
+
+        return json.dumps({'filename': pclFileName, 'metadata': readerMetadata})
+
+    @staticmethod
+    def _metadataAsString(pipeline):
+        # python-pdal 2.x returns a json string, 3.x returns a dict
+        metadata = pipeline.metadata
+        if isinstance(metadata, str):
+            return metadata
+        return json.dumps(metadata)
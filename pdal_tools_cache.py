@@ -0,0 +1,170 @@
+# -*- coding: utf-8 -*-
+"""
+***************************************************************************
+    pdal_tools_cache.py
+    -------------------------
+    begin                : October 2026
+    copyright            : (C) 2026 by Luigi Pirelli
+    email                : luipir at gmail dot com
+    dev for              : http://cartolab.udc.es/cartoweb/
+    Project              : http://cartolab.udc.es/geomove/
+***************************************************************************
+*                                                                         *
+*   This program is free software; you can redistribute it and/or modify  *
+*   it under the terms of the GNU General Public License as published by  *
+*   the Free Software Foundation; either version 2 of the License, or     *
+*   (at your option) any later version.                                   *
+*                                                                         *
+***************************************************************************
+"""
+
+__author__ = 'Luigi Pirelli'
+__date__ = 'October 2026'
+__copyright__ = '(C) 2026, Luigi Pirelli'
+
+import os
+import glob
+import json
+import time
+import sqlite3
+import threading
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+
+from qgis.core import (
+    QgsApplication,
+    QgsMessageLog,
+    Qgis
+)
+
+from .pdal_tools_utils import PDALtoolsUtils
+
+
+class PDALtoolsMetadataCache:
+    '''Persistent cache of PCL metadata (e.g. as returned by pdal info)
+    stored in a SQLite db in the QGIS profile folder.
+    Entries are valid while absolute path, size and mtime of the file
+    does not change. Least recently used entries are removed when
+    the cache grows more than maxEntries.
+    The cache can be used by concurrent threads and processes: every
+    call opens its own short lived connection (no connection is left
+    open by ended pool threads) and db is in WAL mode.'''
+
+    _instance = None
+    _instanceLock = threading.Lock()
+
+    def __init__(self, dbFileName=None, maxEntries=None):
+        if not dbFileName:
+            dbFileName = os.path.join(QgsApplication.qgisSettingsDirPath(), 'pdaltools', 'metadata_cache.sqlite')
+        self.dbFileName = dbFileName
+        self.maxEntries = maxEntries or PDALtoolsUtils.metadataCacheSize()
+
+        os.makedirs(os.path.dirname(self.dbFileName), exist_ok=True)
+        with self._connection() as conn:
+            # WAL mode is persistent in the db file
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('''CREATE TABLE IF NOT EXISTS metadata (
+                                path TEXT NOT NULL,
+                                size INTEGER NOT NULL,
+                                mtime INTEGER NOT NULL,
+                                metadata TEXT NOT NULL,
+                                last_access REAL NOT NULL,
+                                PRIMARY KEY (path, size, mtime))''')
+            conn.execute('CREATE INDEX IF NOT EXISTS metadata_last_access ON metadata (last_access)')
+
+    @staticmethod
+    def instance():
+        '''Return the process wide cache.'''
+        if PDALtoolsMetadataCache._instance is None:
+            with PDALtoolsMetadataCache._instanceLock:
+                if PDALtoolsMetadataCache._instance is None:
+                    PDALtoolsMetadataCache._instance = PDALtoolsMetadataCache()
+        return PDALtoolsMetadataCache._instance
+
+    @contextmanager
+    def _connection(self):
+        '''Open a connection committing at the end of the block, or rolling
+        back if it raises, and closing it.'''
+        conn = sqlite3.connect(self.dbFileName, timeout=30)
+        try:
+            conn.execute('PRAGMA synchronous=NORMAL')
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    @staticmethod
+    def _key(fileName):
+        fileName = os.path.abspath(fileName)
+        stat = os.stat(fileName)
+        return fileName, stat.st_size, stat.st_mtime_ns
+
+    def get(self, fileName):
+        '''Return cached metadata of fileName or None if not cached
+        or file is changed.'''
+        try:
+            key = self._key(fileName)
+            with self._connection() as conn:
+                row = conn.execute('SELECT metadata FROM metadata WHERE path=? AND size=? AND mtime=?', key).fetchone()
+                if row is None:
+                    return None
+                conn.execute('UPDATE metadata SET last_access=? WHERE path=? AND size=? AND mtime=?', (time.time(),) + key)
+            return json.loads(row[0])
+        except (OSError, sqlite3.Error, ValueError) as ex:
+            QgsMessageLog.logMessage('Metadata cache read failed for {}: {}'.format(fileName, str(ex)), 'PDALTools', Qgis.Warning)
+            return None
+
+    def put(self, fileName, metadata):
+        '''Store metadata of fileName removing old entries of the same file.'''
+        try:
+            key = self._key(fileName)
+            with self._connection() as conn:
+                conn.execute('DELETE FROM metadata WHERE path=?', (key[0],))
+                conn.execute('INSERT OR REPLACE INTO metadata VALUES (?, ?, ?, ?, ?)',
+                             key + (json.dumps(metadata), time.time()))
+                self._evict(conn)
+        except (OSError, sqlite3.Error) as ex:
+            QgsMessageLog.logMessage('Metadata cache write failed for {}: {}'.format(fileName, str(ex)), 'PDALTools', Qgis.Warning)
+
+    def _evict(self, conn):
+        '''Remove least recently used entries exceeding maxEntries.'''
+        count = conn.execute('SELECT COUNT(*) FROM metadata').fetchone()[0]
+        if count <= self.maxEntries:
+            return
+        # remove some more entries to avoid evicting at every insert
+        toRemove = count - int(self.maxEntries * 0.9)
+        conn.execute('''DELETE FROM metadata WHERE rowid IN (
+                            SELECT rowid FROM metadata ORDER BY last_access LIMIT ?)''', (toRemove,))
+
+    def clear(self):
+        with self._connection() as conn:
+            conn.execute('DELETE FROM metadata')
+
+    def prefill(self, folder, patterns=('*.las', '*.laz'), recursive=True, metadataReader=None, workers=None):
+        '''Cache metadata of all files in folder matching patterns reading
+        them in parallel. By default metadata are get from LAS headers.
+        metadataReader(fileName) can be used to read other formats.
+        Returns the number of files added to the cache.'''
+        metadataReader = metadataReader or PDALtoolsUtils.readLasMetadata
+
+        fileNames = set()
+        for pattern in patterns:
+            if recursive:
+                pattern = os.path.join('**', pattern)
+            fileNames.update(glob.glob(os.path.join(folder, pattern), recursive=recursive))
+
+        def _cacheFile(fileName):
+            if self.get(fileName) is not None:
+                return False
+            try:
+                metadata = metadataReader(fileName)
+            except Exception as ex:
+                QgsMessageLog.logMessage('Cannot read metadata of {}: {}'.format(fileName, str(ex)), 'PDALTools', Qgis.Warning)
+                return False
+            if not metadata:
+                return False
+            self.put(fileName, metadata)
+            return True
+
+        with ThreadPoolExecutor(max_workers=workers or os.cpu_count()) as executor:
+            return sum(executor.map(_cacheFile, sorted(fileNames)))
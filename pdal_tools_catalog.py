@@ -0,0 +1,175 @@
+# -*- coding: utf-8 -*-
+"""
+***************************************************************************
+    pdal_tools_catalog.py
+    -------------------------
+    begin                : October 2026
+    copyright            : (C) 2026 by Luigi Pirelli
+    email                : luipir at gmail dot com
+    dev for              : http://cartolab.udc.es/cartoweb/
+    Project              : http://cartolab.udc.es/geomove/
+***************************************************************************
+*                                                                         *
+*   This program is free software; you can redistribute it and/or modify  *
+*   it under the terms of the GNU General Public License as published by  *
+*   the Free Software Foundation; either version 2 of the License, or     *
+*   (at your option) any later version.                                   *
+*                                                                         *
+***************************************************************************
+"""
+
+__author__ = 'Luigi Pirelli'
+__date__ = 'October 2026'
+__copyright__ = '(C) 2026, Luigi Pirelli'
+
+import os
+import re
+import glob
+import json
+
+from qgis.core import (
+    QgsApplication,
+    QgsMessageLog,
+    Qgis
+)
+
+from .pdal_tools_utils import PDALtoolsUtils, PDALtoolsPipeline
+
+
+class PDALtoolsPipelineCatalog:
+    '''Definitions of the algorithms generated from the pipelines
+    (*.json) of a list of folders. A definition describes the inputs
+    (readers) and the outputs (writers) of a pipeline that can be
+    overridden by the command line:
+    {
+        "fileName": pipeline file,
+        "name": algorithm name,
+        "displayName": algorithm display name,
+        "group": folder of the pipeline,
+        "inputs": [{"parameter", "override", "type", "filename"}],
+        "outputs": [{"parameter", "override", "type", "filename", "kind", "extension", "bounds"}]
+    }
+    Definitions are kept in a json index invalidated by size and mtime
+    of the pipelines, then only new or changed pipelines are parsed.'''
+
+    # bump when the definition format changes
+    INDEX_VERSION = 1
+
+    def __init__(self, indexFileName=None):
+        if not indexFileName:
+            indexFileName = os.path.join(QgsApplication.qgisSettingsDirPath(), 'pdaltools', 'pipelines_index.json')
+        self.indexFileName = indexFileName
+
+    def definitions(self, folders):
+        '''Return the definitions of the pipelines of folders, sorted
+        by algorithm name. Pipelines not valid are skipped.'''
+        index = self._readIndex()
+        entries = {}
+        changed = False
+
+        for folder in folders:
+            for fileName in sorted(glob.glob(os.path.join(folder, '*.json'))):
+                fileName = os.path.abspath(fileName)
+                try:
+                    fingerprint = PDALtoolsUtils.fileFingerprint(fileName)
+                except OSError:
+                    continue
+                entry = index.get(fileName)
+                if entry is None or entry['fingerprint'] != fingerprint:
+                    entry = {'fingerprint': fingerprint}
+                    try:
+                        entry['definition'] = self.parse(fileName)
+                    except Exception as ex:
+                        # reported only when the pipeline changes
+                        entry['error'] = str(ex)
+                        QgsMessageLog.logMessage('Pipeline not loaded {}: {}'.format(fileName, str(ex)), 'PDALTools', Qgis.Warning)
+                    changed = True
+                entries[fileName] = entry
+
+        if changed or set(entries) != set(index):
+            self._writeIndex(entries)
+
+        definitions = []
+        names = set()
+        for entry in entries.values():
+            definition = entry.get('definition')
+            if not definition:
+                continue
+            # same pipeline name in different folders
+            name = definition['name']
+            suffix = 1
+            while name in names:
+                suffix += 1
+                name = '{}{}'.format(definition['name'], suffix)
+            names.add(name)
+            definitions.append(dict(definition, name=name))
+        return sorted(definitions, key=lambda definition: definition['name'])
+
+    @staticmethod
+    def parse(fileName):
+        '''Return the definition of the pipeline fileName.'''
+        pipeline = PDALtoolsPipeline.load(fileName)
+        readers = pipeline.readers()
+        writers = pipeline.writers()
+        if not writers:
+            raise ValueError('Pipeline without writers')
+
+        # untagged stages are overridden by type => only if unique
+        types = [stage.get('type') for stage in readers + writers]
+
+        def overridable(stages, prefix):
+            result = []
+            for index, stage in enumerate(stages, 1):
+                if not stage.get('tag') and (not stage.get('type') or types.count(stage['type']) > 1):
+                    continue
+                name = stage.get('tag') or (str(index) if len(stages) > 1 else '')
+                name = re.sub(r'[^A-Z0-9]+', '_', name.upper()).strip('_')
+                result.append((stage, {
+                    'parameter': '{}_{}'.format(prefix, name) if name and name != prefix else prefix,
+                    'override': pipeline.overrideName(stage),
+                    'type': stage.get('type') or '',
+                    'filename': stage.get('filename') or '',
+                }))
+            return result
+
+        inputs = [parameter for _, parameter in overridable(readers, 'INPUT')]
+        outputs = []
+        for writer, parameter in overridable(writers, 'OUTPUT'):
+            driver = parameter['type'].partition('.')[2]
+            parameter['kind'] = {'gdal': 'raster', 'ogr': 'vector'}.get(driver, 'file')
+            parameter['extension'] = PDALtoolsUtils.splitExtension(parameter['filename'])[1][1:] or driver
+            parameter['bounds'] = 'bounds' in writer
+            outputs.append(parameter)
+        if not outputs:
+            raise ValueError('Pipeline without writers that can be overridden')
+
+        baseName = os.path.splitext(os.path.basename(fileName))[0]
+        return {
+            'fileName': fileName,
+            'name': 'pipeline' + re.sub(r'[^a-z0-9]', '', baseName.lower()),
+            'displayName': baseName.replace('_', ' '),
+            'group': os.path.basename(os.path.dirname(fileName)),
+            'inputs': inputs,
+            'outputs': outputs,
+        }
+
+    def _readIndex(self):
+        try:
+            with open(self.indexFileName, 'r') as f:
+                index = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        if index.get('version') != self.INDEX_VERSION:
+            return {}
+        return index.get('pipelines', {})
+
+    def _writeIndex(self, entries):
+        try:
+            os.makedirs(os.path.dirname(self.indexFileName), exist_ok=True)
+            # write and rename => concurrent QGIS instances read a complete index
+            tempFileName = '{}.{}.tmp'.format(self.indexFileName, os.getpid())
+            with open(tempFileName, 'w') as f:
+                json.dump({'version': self.INDEX_VERSION, 'pipelines': entries}, f)
+            os.replace(tempFileName, self.indexFileName)
+        except OSError as ex:
+            QgsMessageLog.logMessage('Cannot write pipelines index {}: {}'.format(self.indexFileName, str(ex)), 'PDALTools', Qgis.Warning)
@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+"""
+***************************************************************************
+    pdal_tools_common.py
+    -------------------------
+    begin                : October 2026
+    copyright            : (C) 2026 by Luigi Pirelli
+    email                : luipir at gmail dot com
+    dev for              : http://cartolab.udc.es/cartoweb/
+    Project              : http://cartolab.udc.es/geomove/
+***************************************************************************
+*                                                                         *
+*   This program is free software; you can redistribute it and/or modify  *
+*   it under the terms of the GNU General Public License as published by  *
+*   the Free Software Foundation; either version 2 of the License, or     *
+*   (at your option) any later version.                                   *
+*                                                                         *
+***************************************************************************
+
+Pipeline helpers not depending on QGIS, shared by the plugin and by the
+headless pdal workers daemon (pdal_tools_daemon.py).
+"""
+
+__author__ = 'Luigi Pirelli'
+__date__ = 'October 2026'
+__copyright__ = '(C) 2026, Luigi Pirelli'
+
+import re
+import json
+import logging
+
+# json strings are matched first to skip comment and comma like
+# chars inside them
+JSONC_COMMENTS = re.compile(r'("(?:\\.|[^"\\])*")|//[^\n]*|/\*.*?\*/', re.DOTALL)
+JSONC_TRAILING_COMMAS = re.compile(r'("(?:\\.|[^"\\])*")|,(\s*[\]}])')
+
+
+def parseJsonc(text):
+    '''Parse json text with // and /* */ comments and trailing commas.'''
+    text = JSONC_COMMENTS.sub(lambda m: m.group(1) or ' ', text)
+    text = JSONC_TRAILING_COMMAS.sub(lambda m: m.group(1) or m.group(2), text)
+    return json.loads(text)
+
+
+def applyStageOverrides(stages, overrides):
+    '''Apply --<stage>.<option>=<value> overrides, as (stage, option, value)
+    tuples, to a list of stages as pdal command line does. Overrides in the
+    form stage.<tag> reference the stage by tag, otherwise by driver type.
+    Raises ValueError for overrides not referencing any stage.'''
+    for stageName, option, value in overrides:
+        if stageName.startswith('stage.'):
+            tag = stageName[len('stage.'):]
+            matching = [stage for stage in stages if stage.get('tag') == tag]
+        else:
+            matching = [stage for stage in stages if stage.get('type') == stageName]
+        if not matching:
+            raise ValueError("Argument references invalid/unused stage: '{}'".format(stageName))
+
+        for stage in matching:
+            stage[option] = value
+
+    return stages
+
+
+def setPipelineLogLevel(pdalModule, pipeline, verbosity):
+    '''Set the log level of a python-pdal pipeline as the --verbose=<verbosity>
+    option of pdal command line (pdal default is 0, errors only).'''
+    if not hasattr(type(pipeline), 'loglevel'):
+        return
+    # python-pdal 3.x accepts python logging levels mapped to pdal
+    # error, warning, info and debug. 2.x accepts pdal levels (0-8)
+    if hasattr(getattr(pdalModule, 'pipeline', None), 'LogLevelToPDAL'):
+        verbosity = {0: logging.ERROR, 1: logging.WARNING, 2: logging.INFO}.get(verbosity, logging.DEBUG)
+    pipeline.loglevel = verbosity
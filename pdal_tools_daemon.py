@@ -0,0 +1,343 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+***************************************************************************
+    pdal_tools_daemon.py
+    -------------------------
+    begin                : October 2026
+    copyright            : (C) 2026 by Luigi Pirelli
+    email                : luipir at gmail dot com
+    dev for              : http://cartolab.udc.es/cartoweb/
+    Project              : http://cartolab.udc.es/geomove/
+***************************************************************************
+*                                                                         *
+*   This program is free software; you can redistribute it and/or modify  *
+*   it under the terms of the GNU General Public License as published by  *
+*   the Free Software Foundation; either version 2 of the License, or     *
+*   (at your option) any later version.                                   *
+*                                                                         *
+***************************************************************************
+
+Pool of long lived python-pdal workers accepting pipelines on a unix
+domain socket. It does not depend on QGIS and can be run headless:
+
+    python3 pdal_tools_daemon.py serve --socket /tmp/pdaltools.sock --workers 4
+    python3 pdal_tools_daemon.py submit --socket /tmp/pdaltools.sock pipeline.json \\
+        --stage.input.filename=in.laz --writers.las.filename=out.laz
+"""
+
+__author__ = 'Luigi Pirelli'
+__date__ = 'October 2026'
+__copyright__ = '(C) 2026, Luigi Pirelli'
+
+import os
+import sys
+import json
+import time
+import uuid
+import errno
+import signal
+import socket
+import argparse
+import tempfile
+
+# run as a script outside of the plugin package
+try:
+    from .pdal_tools_common import parseJsonc, applyStageOverrides, setPipelineLogLevel
+except ImportError:
+    from pdal_tools_common import parseJsonc, applyStageOverrides, setPipelineLogLevel
+
+# workers need python-pdal, clients do not. See importPdal
+pdal = None
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+
+def parseOverrides(args):
+    '''Return (stage, option, value) overrides from --<stage>.<option>=<value> args.'''
+    overrides = []
+    for arg in args:
+        key, separator, value = arg.partition('=')
+        if not arg.startswith('--') or not separator or key.count('.') < 2:
+            raise ValueError('Invalid stage option: {}'.format(arg))
+        stage, _, option = key[2:].rpartition('.')
+        overrides.append((stage, option, value))
+    return overrides
+
+
+def importPdal():
+    '''Import python-pdal. Returns None if not installed.'''
+    global pdal
+    if pdal is None:
+        try:
+            import pdal as pdalModule
+            pdal = pdalModule
+        except ImportError:
+            pass
+    return pdal
+
+
+def currentMemory():
+    '''Return resident memory of the current process in bytes.'''
+    try:
+        with open('/proc/self/statm', 'r') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        pass
+    if resource is None:
+        return 0
+    # peak memory is the best approximation. KB on linux, bytes on mac
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def runJob(request, logFolder):
+    '''Execute a job request with python-pdal. Request keys:
+    pipeline: pipeline json (object, stage list or text)
+    overrides: list of (stage, option, value)
+    stream: True to execute in stream mode if supported
+    validate: True to only validate the pipeline
+    metadata: True to return the pipeline metadata
+    loglevel: pdal log level as --verbose option (default 0, errors only).
+    The log is written in a file of logFolder that has to be removed by
+    the client.
+    Returns the response without status.'''
+    if importPdal() is None:
+        raise RuntimeError('python-pdal is not available in the worker')
+
+    pipeline = request['pipeline']
+    if isinstance(pipeline, str):
+        pipeline = parseJsonc(pipeline)
+    if isinstance(pipeline, list):
+        pipeline = {'pipeline': pipeline}
+    stages = [{'filename': stage} if isinstance(stage, str) else stage for stage in pipeline['pipeline']]
+    stages = applyStageOverrides(stages, request.get('overrides', []))
+
+    start = time.time()
+    pipeline = pdal.Pipeline(json.dumps({'pipeline': stages}))
+    setPipelineLogLevel(pdal, pipeline, int(request.get('loglevel', 0)))
+    if request.get('validate'):
+        pipeline.validate()
+        return {'count': 0, 'wall_time': time.time() - start}
+
+    if request.get('stream') and hasattr(pipeline, 'execute_streaming'):
+        count = pipeline.execute_streaming()
+    else:
+        count = pipeline.execute()
+    response = {'count': count, 'wall_time': time.time() - start}
+
+    log = getattr(pipeline, 'log', '') or ''
+    if log:
+        response['log'] = os.path.join(logFolder, 'pdaltools_{}.log'.format(uuid.uuid4().hex))
+        with open(response['log'], 'w') as f:
+            f.write(log)
+
+    if request.get('metadata'):
+        # python-pdal 2.x returns a json string, 3.x returns a dict
+        metadata = pipeline.metadata
+        response['metadata'] = json.loads(metadata) if isinstance(metadata, str) else metadata
+
+    return response
+
+
+class PDALtoolsDaemon:
+    '''Pre-forked pool of workers listening on the same unix socket.
+    python-pdal is imported by the master before forking then every
+    worker starts warm. Each connection is a job: the request is a json
+    line, the worker answers with a {"status": "started", "pid": ...}
+    line and then with the result line. A worker is replaced after
+    maxJobs jobs or when its memory is greater than maxMemory bytes,
+    or if it dies (e.g. killed to cancel its job).
+    Unix only.'''
+
+    def __init__(self, socketPath, workers=None, maxJobs=100, maxMemory=0, logFolder=None):
+        self.socketPath = socketPath
+        self.workers = workers or os.cpu_count() or 1
+        self.maxJobs = maxJobs
+        self.maxMemory = maxMemory
+        self.logFolder = logFolder or tempfile.gettempdir()
+        self._socket = None
+        self._children = set()
+        self._stopping = False
+
+    def serve(self):
+        '''Run the pool until SIGTERM or SIGINT.'''
+        # imported before forking => workers start warm
+        importPdal()
+        if os.path.exists(self.socketPath):
+            os.remove(self.socketPath)
+        self._socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._socket.bind(self.socketPath)
+        # only the current user can submit jobs
+        os.chmod(self.socketPath, 0o600)
+        self._socket.listen(64)
+
+        signal.signal(signal.SIGTERM, self._stop)
+        signal.signal(signal.SIGINT, self._stop)
+        try:
+            for _ in range(self.workers):
+                self._spawn()
+            while self._children:
+                try:
+                    pid, _ = os.wait()
+                except OSError as ex:
+                    if ex.errno == errno.ECHILD:
+                        break
+                    raise
+                self._children.discard(pid)
+                if not self._stopping:
+                    self._spawn()
+        finally:
+            self._socket.close()
+            if os.path.exists(self.socketPath):
+                os.remove(self.socketPath)
+
+    def _stop(self, signum, frame):
+        self._stopping = True
+        for pid in list(self._children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    def _spawn(self):
+        pid = os.fork()
+        if pid:
+            self._children.add(pid)
+            return
+
+        exitCode = 0
+        try:
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            signal.signal(signal.SIGINT, signal.SIG_IGN)
+            self._work()
+        except BaseException:
+            exitCode = 1
+        finally:
+            os._exit(exitCode)
+
+    def _work(self):
+        for _ in range(self.maxJobs):
+            conn, _ = self._socket.accept()
+            with conn:
+                self._handle(conn)
+            if self.maxMemory and currentMemory() > self.maxMemory:
+                break
+
+    def _handle(self, conn):
+        stream = conn.makefile('rwb')
+        try:
+            request = json.loads(stream.readline().decode('utf-8'))
+        except ValueError as ex:
+            self._send(stream, {'status': 'error', 'error': 'Invalid request: {}'.format(ex)})
+            return
+
+        self._send(stream, {'status': 'started', 'pid': os.getpid()})
+        try:
+            response = runJob(request, self.logFolder)
+            response['status'] = 'ok'
+        except Exception as ex:
+            response = {'status': 'error', 'error': str(ex)}
+        response['pid'] = os.getpid()
+        self._send(stream, response)
+
+    @staticmethod
+    def _send(stream, message):
+        try:
+            stream.write(json.dumps(message).encode('utf-8') + b'\n')
+            stream.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            # client gone
+            pass
+
+
+class PDALtoolsDaemonClient:
+    '''Submit jobs to a PDALtoolsDaemon.'''
+
+    def __init__(self, socketPath):
+        self.socketPath = socketPath
+
+    def submit(self, request, onStarted=None):
+        '''Send request and wait the response. onStarted(pid) is called
+        when a worker starts the job, e.g. to kill it to cancel the job.
+        Raises ConnectionError if the worker dies before answering.'''
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as conn:
+            conn.connect(self.socketPath)
+            stream = conn.makefile('rwb')
+            stream.write(json.dumps(request).encode('utf-8') + b'\n')
+            stream.flush()
+
+            for line in stream:
+                response = json.loads(line.decode('utf-8'))
+                if response.get('status') != 'started':
+                    return response
+                if onStarted:
+                    onStarted(response['pid'])
+
+        raise ConnectionError('pdal worker ended before completing the job')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Pool of python-pdal workers listening on a unix socket')
+    commands = parser.add_subparsers(dest='command')
+    commands.required = True
+
+    serve = commands.add_parser('serve', help='start the worker pool')
+    serve.add_argument('--socket', required=True, help='unix socket path')
+    serve.add_argument('--workers', type=int, default=None, help='number of workers (default cpu count)')
+    serve.add_argument('--max-jobs', type=int, default=100, help='jobs run by a worker before being replaced')
+    serve.add_argument('--max-memory', type=int, default=0, help='memory (MB) over which a worker is replaced (0 = unlimited)')
+    serve.add_argument('--log-folder', default=None, help='folder of pdal logs (default temp folder)')
+
+    submit = commands.add_parser('submit', help='run a pipeline in the pool',
+                                 epilog='stage options can be overridden as --<stage type or stage.tag>.<option>=<value>')
+    submit.add_argument('--socket', required=True, help='unix socket path')
+    submit.add_argument('--stream', action='store_true', help='execute in stream mode')
+    submit.add_argument('--validate', action='store_true', help='only validate the pipeline')
+    submit.add_argument('--metadata', action='store_true', help='return pipeline metadata')
+    submit.add_argument('--verbose', type=int, default=0, help='pdal log level (0-8)')
+    submit.add_argument('pipeline', help='pipeline file or json')
+
+    args, unknown = parser.parse_known_args(argv)
+    if args.command == 'serve':
+        if unknown:
+            parser.error('unrecognized arguments: {}'.format(' '.join(unknown)))
+        PDALtoolsDaemon(args.socket, args.workers, args.max_jobs,
+                        args.max_memory * 1024 * 1024, args.log_folder).serve()
+        return 0
+
+    try:
+        overrides = parseOverrides(unknown)
+    except ValueError as ex:
+        parser.error(str(ex))
+    pipeline = args.pipeline
+    if not pipeline.lstrip().startswith(('{', '[')):
+        with open(pipeline, 'r') as f:
+            pipeline = f.read()
+    try:
+        pipeline = parseJsonc(pipeline)
+    except ValueError as ex:
+        parser.error('Invalid pipeline: {}'.format(ex))
+
+    response = PDALtoolsDaemonClient(args.socket).submit({
+        'pipeline': pipeline,
+        'overrides': overrides,
+        'stream': args.stream,
+        'validate': args.validate,
+        'metadata': args.metadata,
+        'loglevel': args.verbose,
+    })
+    if response.get('log'):
+        with open(response['log'], 'r', errors='replace') as f:
+            log = f.read()
+        os.remove(response['log'])
+        response['log'] = log
+    print(json.dumps(response, indent=2))
+    return 0 if response.get('status') == 'ok' else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,209 @@
+# -*- coding: utf-8 -*-
+"""
+***************************************************************************
+    pdal_tools_profiler.py
+    -------------------------
+    begin                : October 2026
+    copyright            : (C) 2026 by Luigi Pirelli
+    email                : luipir at gmail dot com
+    dev for              : http://cartolab.udc.es/cartoweb/
+    Project              : http://cartolab.udc.es/geomove/
+***************************************************************************
+*                                                                         *
+*   This program is free software; you can redistribute it and/or modify  *
+*   it under the terms of the GNU General Public License as published by  *
+*   the Free Software Foundation; either version 2 of the License, or     *
+*   (at your option) any later version.                                   *
+*                                                                         *
+***************************************************************************
+"""
+
+__author__ = 'Luigi Pirelli'
+__date__ = 'October 2026'
+__copyright__ = '(C) 2026, Luigi Pirelli'
+
+import re
+import json
+import time
+import threading
+from contextlib import contextmanager
+
+
+class PDALtoolsProfiler:
+    '''Collect timings of a pdal execution:
+    - plugin side spans (e.g. validation, metadata lookup, process spawn)
+    - wall time of each pipeline execution, for every execution path
+    - per stage wall time get from the elapsed time that pdal writes in
+      its log lines with --log-timing: pdal runs the stages of a pipeline
+      in sequence, then a stage is credited with the time from its first
+      log line to the first log line of the next stage (or the end of
+      the pdal process for the last one)
+    - per stage point counts get from the pdal --metadata output file.
+    Stage wall time is available only for pipelines run as pdal
+    subprocess in standard mode: python-pdal (in-process and daemon
+    executions) has no log timing and in stream mode all stages process
+    the same chunk of points at the same time. Otherwise it's reported
+    as null, with the reason in the stage_timing field of the report,
+    and only the pipeline wall time is available.
+    The profiler can be shared by concurrent threads.'''
+
+    # e.g. "(readers.las Debug) message" or "(pdal pipeline Debug: 3.125) message"
+    # where 3.125 is the elapsed time written by pdal with --log-timing
+    LOG_LINE = re.compile(r'^\((?P<leader>[^()]*?) (?P<level>Error|Warning|Info|Debug\d*)(?::\s*(?P<elapsed>\d+(?:\.\d+)?))?\)\s?(?P<message>.*)$')
+    STAGE_NAME = re.compile(r'(?:readers|filters|writers)\.\w+')
+
+    TIMING_AVAILABLE = 'pdal log timing, summed over pdal processes'
+    TIMING_UNAVAILABLE = 'not available: only pipelines run as pdal subprocess in standard mode are timed'
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._start = time.time()
+        # run => [stage of the current log block, elapsed at its start,
+        # last elapsed of the run]
+        self._runs = {}
+        self.spans = []
+        self.stages = {}
+        self.pipelineTime = 0
+        self.pipelineRuns = 0
+        self.untimedRuns = 0
+
+    @staticmethod
+    def isPipelineRun(commandline):
+        '''True if commandline executes a pipeline (not only validates it).'''
+        return commandline[:2] == ['pdal', 'pipeline'] and '--validate' not in commandline
+
+    @staticmethod
+    def logTimingCommand(commandline):
+        '''Return commandline with --log-timing if stages of the pdal
+        pipeline can be timed: not in stream mode. None otherwise.'''
+        if not PDALtoolsProfiler.isPipelineRun(commandline) or '--stream' in commandline:
+            return None
+        return commandline[:2] + ['--log-timing'] + commandline[2:]
+
+    @contextmanager
+    def span(self, name, **attributes):
+        '''Context manager recording the wall time of a plugin side operation.'''
+        start = time.time()
+        try:
+            yield
+        finally:
+            span = {
+                'name': name,
+                'start': start - self._start,
+                'duration': time.time() - start,
+            }
+            span.update(attributes)
+            with self._lock:
+                self.spans.append(span)
+
+    def _stage(self, stageName):
+        return self.stages.setdefault(stageName, {'log_lines': 0})
+
+    def _credit(self, stageName, seconds):
+        stage = self._stage(stageName)
+        stage['_time'] = stage.get('_time', 0) + max(seconds, 0)
+
+    def pipelineRun(self, wallTime, run=None):
+        '''Record a completed pipeline execution lasting wallTime seconds.
+        run is the one passed to parseLog for its timed log, None if its
+        stages cannot be timed.'''
+        with self._lock:
+            self.pipelineTime += wallTime or 0
+            self.pipelineRuns += 1
+            if run is None:
+                self.untimedRuns += 1
+                return
+            block = self._runs.pop(run, None)
+            if block:
+                # the last stage runs until the end of the pdal process
+                stageName, start, last = block
+                self._credit(stageName, max(wallTime or 0, last) - start)
+
+    def parseLog(self, text, run=None):
+        '''Parse pdal log lines updating stage log counts and timings.
+        run identifies the pdal process writing the log (pdal elapsed time
+        restarts for each process). If None, the execution is not timed.
+        text can be any chunk of the log, lines must not be split.'''
+        with self._lock:
+            for line in text.splitlines():
+                match = self.LOG_LINE.match(line)
+                if not match:
+                    # e.g. continuation lines of multi-line messages
+                    continue
+                stageName = self.STAGE_NAME.search(match.group('leader'))
+                stageName = stageName.group(0) if stageName else match.group('leader')
+
+                self._stage(stageName)['log_lines'] += 1
+                if run is None or match.group('elapsed') is None:
+                    continue
+                elapsed = float(match.group('elapsed'))
+                block = self._runs.get(run)
+                if block is None:
+                    self._runs[run] = [stageName, elapsed, elapsed]
+                    continue
+                block[2] = max(block[2], elapsed)
+                if block[0] != stageName:
+                    # next stage started: the previous one is ended
+                    self._credit(block[0], elapsed - block[1])
+                    block[0], block[1] = stageName, elapsed
+
+    def parseMetadataFile(self, metadataFileName, accumulate=False):
+        '''Get point counts of each stage from a pdal --metadata file.
+        If accumulate, counts are added to the ones already parsed (e.g.
+        from the metadata files of the tiles of the same pipeline).'''
+        try:
+            with open(metadataFileName, 'r') as f:
+                metadata = json.load(f)
+        except (OSError, ValueError):
+            return
+
+        stagesMetadata = metadata.get('stages', metadata.get('metadata', metadata))
+        with self._lock:
+            for stageName, stageMetadata in stagesMetadata.items():
+                # multiple stages of the same type are listed together
+                if isinstance(stageMetadata, list):
+                    stageMetadata = stageMetadata[0] if stageMetadata else {}
+                if not isinstance(stageMetadata, dict):
+                    continue
+                points = stageMetadata.get('count', stageMetadata.get('num_points'))
+                if points is None:
+                    continue
+                stage = self._stage(stageName)
+                if accumulate:
+                    points += stage.get('points', 0)
+                stage['points'] = points
+
+    def report(self):
+        '''Return the profile as a dictionary serializable as json.'''
+        with self._lock:
+            totals = {}
+            for span in self.spans:
+                totals[span['name']] = totals.get(span['name'], 0) + span['duration']
+
+            # a stage not timed in some runs would have a partial time
+            timed = not self.untimedRuns
+            stages = {}
+            for stageName, stage in self.stages.items():
+                stage = dict(stage)
+                seconds = stage.pop('_time', None)
+                stage['wall_time'] = None
+                stage['points_per_second'] = None
+                if timed and seconds is not None:
+                    stage['wall_time'] = seconds
+                    if stage.get('points') and seconds > 0:
+                        stage['points_per_second'] = stage['points'] / seconds
+                stages[stageName] = stage
+
+            return {
+                'wall_time': time.time() - self._start,
+                'pipeline_time': self.pipelineTime,
+                'pipeline_runs': self.pipelineRuns,
+                'stage_timing': self.TIMING_AVAILABLE if timed else self.TIMING_UNAVAILABLE,
+                'spans': list(self.spans),
+                'totals': totals,
+                'stages': stages,
+            }
+
+    def writeReport(self, reportFileName):
+        with open(reportFileName, 'w') as f:
+            json.dump(self.report(), f, indent=2)
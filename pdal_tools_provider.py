@@ -33,8 +33,10 @@ __revision__ = '$Format:%H$'
 
 import os
 import glob
+import json
 import shutil
 from PyQt5.QtGui import QIcon
+from PyQt5.QtWidgets import QDockWidget
 from qgis.core import (
     Qgis,
     QgsProcessingProvider,
@@ -43,89 +45,315 @@ from qgis.core import (
     QgsProcessingModelAlgorithm
 )
 from qgis.utils import iface
-from processing.modeler.ModelerUtils import ModelerUtils
 from processing.core.ProcessingConfig import (
     ProcessingConfig,
     Setting
 )
 from processing.tools.system import isWindows
-from .algorithms.pdal_pipeline_executor import PdalPipelineExecutor
+from .pdal_tools_utils import PDALtoolsUtils
 
 
 class PDALToolsProvider(QgsProcessingProvider):
 
+    # record of the models installed by the plugin in the models folder
+    INSTALLED_MODELS = 'pdaltools_installed_models.json'
+
     def __init__(self):
         QgsProcessingProvider.__init__(self)
 
         self.modelsPath = os.path.join(os.path.dirname(__file__), 'models')
         self.pipelinesPath = os.path.join(os.path.dirname(__file__), 'pipelines')
         self.messageTag = type(self).__name__ # e.g. string PDALToolsProvider
+        # index of the pipelines exposed as algorithms. See loadAlgorithms
+        self.pipelineCatalog = None
 
-        # Load algorithms
-        self.alglist = [PdalPipelineExecutor()]
+        # models are installed on first use of the toolbox. See watchToolbox
+        self.modelsLoaded = False
+        self.toolbox = None
+        self.initializationPending = False
+        # QGIS is exiting: installed models are kept. See unload
+        self.quitting = False
 
     def load(self):
         ProcessingConfig.settingIcons[self.name()] = self.icon()
-        ProcessingConfig.addSetting(Setting(self.name(), 'ACTIVATE_PDALTOOLS',
-                                            self.tr('Activate'), True))
-        ProcessingConfig.readSettings()
-        self.refreshAlgorithms()
-
-        if QgsApplication.processingRegistry().providerById('model'):
+        settings = [
+            Setting(self.name(), 'ACTIVATE_PDALTOOLS',
+                    self.tr('Activate'), True),
+            Setting(self.name(), PDALtoolsUtils.PDALTOOLS_USE_PYTHON_PDAL,
+                    self.tr('Run pipelines in-process with python-pdal (if installed)'), True),
+            Setting(self.name(), PDALtoolsUtils.PDALTOOLS_METADATA_CACHE,
+                    self.tr('Cache point cloud metadata on disk'), True),
+            Setting(self.name(), PDALtoolsUtils.PDALTOOLS_METADATA_CACHE_SIZE,
+                    self.tr('Max number of files in metadata cache'), 100000,
+                    valuetype=Setting.INT),
+            Setting(self.name(), PDALtoolsUtils.PDALTOOLS_SKIP_VALIDATION,
+                    self.tr('Skip pipeline validation (errors are reported by the execution)'), False),
+            Setting(self.name(), PDALtoolsUtils.PDALTOOLS_MAX_MEMORY,
+                    self.tr('Max memory of each pdal process in MB (0 = unlimited, unix only)'), 0,
+                    valuetype=Setting.INT),
+            Setting(self.name(), PDALtoolsUtils.PDALTOOLS_MAX_CPU_TIME,
+                    self.tr('Max cpu time of each pdal process in seconds (0 = unlimited, unix only)'), 0,
+                    valuetype=Setting.INT),
+            Setting(self.name(), PDALtoolsUtils.PDALTOOLS_LOG_TO_CONSOLE,
+                    self.tr('Show pdal output in processing console'), True),
+            Setting(self.name(), PDALtoolsUtils.PDALTOOLS_LOG_TO_MESSAGE_LOG,
+                    self.tr('Show pdal output in QGIS message log'), True),
+            Setting(self.name(), PDALtoolsUtils.PDALTOOLS_DAEMON_SOCKET,
+                    self.tr('Socket of pdal workers daemon (empty = not used, see pdal_tools_daemon.py)'), ''),
+            Setting(self.name(), PDALtoolsUtils.PDALTOOLS_PIPELINE_FOLDERS,
+                    self.tr('Pipeline folders exposed as algorithms'), '',
+                    valuetype=Setting.MULTIPLE_FOLDERS),
+        ]
+        # read only the plugin settings instead of all processing ones
+        for setting in settings:
+            ProcessingConfig.addSetting(setting)
+            setting.read()
+
+        if iface is None:
+            # headless (e.g. qgis_process): no toolbox to wait for, then
+            # algorithms and models have to be available immediately
+            self.refreshAlgorithms()
             self.loadModels()
+            return True
+        QgsApplication.instance().aboutToQuit.connect(self.aboutToQuit)
+        if QgsApplication.processingRegistry().providerById('model'):
+            self.initializationCompleted()
         else:
-            # lazy load of models waiting QGIS initialization. This would avoid
-            # to load modelas when model provider is still not available in processing
-            iface.initializationCompleted.connect(self.loadModels)
+            # wait QGIS initialization: algorithm modules and pipeline
+            # catalog are loaded out of QGIS startup time. This would
+            # also avoid to load models when model provider is still not
+            # available in processing
+            self.initializationPending = True
+            iface.initializationCompleted.connect(self.initializationCompleted)
 
         return True
 
+    def initializationCompleted(self):
+        if self.initializationPending:
+            iface.initializationCompleted.disconnect(self.initializationCompleted)
+            self.initializationPending = False
+        self.refreshAlgorithms()
+        self.watchToolbox()
+
+    def watchToolbox(self):
+        '''Install models when the processing toolbox is shown the first
+        time instead of at QGIS startup.'''
+        self.toolbox = iface.mainWindow().findChild(QDockWidget, 'ProcessingToolbox') if iface.mainWindow() else None
+        if self.toolbox is None or self.toolbox.isVisible():
+            self.loadModels()
+            return
+        self.toolbox.visibilityChanged.connect(self.toolboxVisibilityChanged)
+
+    def toolboxVisibilityChanged(self, visible):
+        if not visible:
+            return
+        self.toolbox.visibilityChanged.disconnect(self.toolboxVisibilityChanged)
+        self.loadModels()
+
+    def aboutToQuit(self):
+        self.quitting = True
+
     def unload(self):
-        # remove all models
-        modelsFiles = glob.glob(os.path.join(self.modelsPath, '*.model3'))
-        for modelFileName in modelsFiles:
-            installedModel = os.path.join(ModelerUtils.modelsFolders()[0], os.path.basename(modelFileName))
-            try:
-                if os.path.exists(installedModel):
-                    os.remove(installedModel)
-            except Exception as ex:
-                QgsMessageLog.logMessage(self.tr('Failed to uninstall model: {} - {}'.format(installedModel, str(ex))), self.messageTag, Qgis.Warning)
-                continue
-        QgsApplication.processingRegistry().providerById('model').refreshAlgorithms()
+        if iface is not None:
+            QgsApplication.instance().aboutToQuit.disconnect(self.aboutToQuit)
+        if self.initializationPending:
+            iface.initializationCompleted.disconnect(self.initializationCompleted)
+            self.initializationPending = False
+        if self.toolbox is not None and not self.modelsLoaded:
+            self.toolbox.visibilityChanged.disconnect(self.toolboxVisibilityChanged)
+        self.toolbox = None
+
+        # models are removed only when the plugin is disabled or
+        # uninstalled. At QGIS exit (and headless) they are left installed
+        # then next start skips them if not changed
+        if iface is not None and not self.quitting and iface.mainWindow() and iface.mainWindow().isVisible():
+            self.uninstallModels()
+        self.modelsLoaded = False
+        self.quitting = False
 
         ProcessingConfig.removeSetting('ACTIVATE_PDALTOOLS')
+        ProcessingConfig.removeSetting(PDALtoolsUtils.PDALTOOLS_USE_PYTHON_PDAL)
+        ProcessingConfig.removeSetting(PDALtoolsUtils.PDALTOOLS_METADATA_CACHE)
+        ProcessingConfig.removeSetting(PDALtoolsUtils.PDALTOOLS_METADATA_CACHE_SIZE)
+        ProcessingConfig.removeSetting(PDALtoolsUtils.PDALTOOLS_SKIP_VALIDATION)
+        ProcessingConfig.removeSetting(PDALtoolsUtils.PDALTOOLS_MAX_MEMORY)
+        ProcessingConfig.removeSetting(PDALtoolsUtils.PDALTOOLS_MAX_CPU_TIME)
+        ProcessingConfig.removeSetting(PDALtoolsUtils.PDALTOOLS_LOG_TO_CONSOLE)
+        ProcessingConfig.removeSetting(PDALtoolsUtils.PDALTOOLS_LOG_TO_MESSAGE_LOG)
+        ProcessingConfig.removeSetting(PDALtoolsUtils.PDALTOOLS_DAEMON_SOCKET)
+        ProcessingConfig.removeSetting(PDALtoolsUtils.PDALTOOLS_PIPELINE_FOLDERS)
 
     def loadAlgorithms(self):
         """
         Loads all algorithms belonging to this provider.
         """
-        for alg in self.alglist:
+        # algorithm modules are imported only when the provider is loaded
+        from .algorithms.pdal_pipeline_executor import PdalPipelineExecutor
+        from .algorithms.pdal_batch_pipeline_executor import PdalBatchPipelineExecutor
+
+        from .algorithms.pdal_tile_index import PdalTileIndex
+        from .algorithms.pdal_catalog_pipeline import PdalCatalogPipeline
+        from .pdal_tools_catalog import PDALtoolsPipelineCatalog
+
+        for alg in [PdalPipelineExecutor(),
+                    PdalBatchPipelineExecutor(),
+                    PdalTileIndex()]:
             self.addAlgorithm( alg )
 
+        # every pipeline of plugin and user folders is an algorithm. Their
+        # definitions come from an index then pipelines are parsed only
+        # if changed
+        if self.pipelineCatalog is None:
+            self.pipelineCatalog = PDALtoolsPipelineCatalog()
+        folders = [self.pipelinesPath] + PDALtoolsUtils.pipelineFolders()
+        for definition in self.pipelineCatalog.definitions(folders):
+            self.addAlgorithm( PdalCatalogPipeline(definition) )
+
     def loadModels(self):
-        '''Register models present in models folder of the plugin.'''
+        '''Register models present in models folder of the plugin. Models
+        already installed and not changed since the previous installation
+        are skipped, then the model provider is refreshed only if
+        something changed.'''
+        if self.modelsLoaded:
+            return
+        self.modelsLoaded = True
+        # modeler is imported only when models are loaded
+        from processing.modeler.ModelerUtils import ModelerUtils
+
+        installed = self.readInstalledModels()
         modelsFiles = glob.glob(os.path.join(self.modelsPath, '*.model3'))
+        changed = False
 
         for modelFileName in modelsFiles:
-            alg = QgsProcessingModelAlgorithm()
-            if not alg.fromFile(modelFileName):
+            name = os.path.basename(modelFileName)
+            destFilename = os.path.join(ModelerUtils.modelsFolders()[0], name)
+            record = installed.get(name)
+            validated = False
+            try:
+                fingerprint = PDALtoolsUtils.fileFingerprint(modelFileName)
+                if record and record['source'] == fingerprint:
+                    if record.get('invalid'):
+                        # already reported
+                        continue
+                    # uninstalled by a previous unload
+                    validated = 'installed' not in record
+                if not validated and self.isModelInstalled(modelFileName, destFilename, record):
+                    if record['source'] == fingerprint:
+                        continue
+                    # touched but same content (e.g. plugin reinstalled)
+                    fingerprint = PDALtoolsUtils.fileFingerprint(modelFileName, hashContent=True)
+                    if record.get('sha256') == fingerprint['sha256']:
+                        record['source'] = {'size': fingerprint['size'], 'mtime': fingerprint['mtime']}
+                        continue
+            except OSError as ex:
+                QgsMessageLog.logMessage(self.tr('Failed to check model: {} - {}'.format(modelFileName, str(ex))), self.messageTag, Qgis.Warning)
+                continue
+
+            # only new or changed models are validated
+            if not validated and not QgsProcessingModelAlgorithm().fromFile(modelFileName):
                 QgsMessageLog.logMessage(self.tr('Not well formed model: {}'.format(modelFileName)), self.messageTag, Qgis.Warning)
+                installed[name] = {
+                    'source': {'size': fingerprint['size'], 'mtime': fingerprint['mtime']},
+                    'target': modelFileName,
+                    'invalid': True,
+                }
                 continue
 
-            destFilename = os.path.join(ModelerUtils.modelsFolders()[0], os.path.basename(modelFileName))
             try:
-                if os.path.exists(destFilename):
+                if os.path.lexists(destFilename):
                     os.remove(destFilename)
 
                 if isWindows():
                     shutil.copyfile(modelFileName, destFilename)
                 else:
                     os.symlink(modelFileName, destFilename)
+
+                if validated:
+                    fingerprint['sha256'] = record['sha256']
+                elif 'sha256' not in fingerprint:
+                    fingerprint = PDALtoolsUtils.fileFingerprint(modelFileName, hashContent=True)
+                installed[name] = {
+                    'source': {'size': fingerprint['size'], 'mtime': fingerprint['mtime']},
+                    'sha256': fingerprint['sha256'],
+                    'target': modelFileName,
+                    'installed': PDALtoolsUtils.fileFingerprint(destFilename),
+                }
+                changed = True
             except Exception as ex:
                 QgsMessageLog.logMessage(self.tr('Failed to install model: {} - {}'.format(modelFileName, str(ex))), self.messageTag, Qgis.Warning)
                 continue
 
-        QgsApplication.processingRegistry().providerById('model').refreshAlgorithms()
+        # models removed from the plugin since the previous installation
+        names = set(os.path.basename(modelFileName) for modelFileName in modelsFiles)
+        for name in list(installed):
+            if name not in names:
+                changed = self.removeInstalledModel(name, installed.pop(name)) or changed
+
+        self.writeInstalledModels(installed)
+        modelProvider = QgsApplication.processingRegistry().providerById('model')
+        if changed and modelProvider:
+            modelProvider.refreshAlgorithms()
+
+    def uninstallModels(self):
+        '''Remove models installed by loadModels. Records are kept without
+        the installation to avoid validating not changed models again.'''
+        installed = self.readInstalledModels()
+        changed = False
+        for name, record in installed.items():
+            changed = self.removeInstalledModel(name, record) or changed
+            record.pop('installed', None)
+        self.writeInstalledModels(installed)
+
+        modelProvider = QgsApplication.processingRegistry().providerById('model')
+        if changed and modelProvider:
+            modelProvider.refreshAlgorithms()
+
+    def removeInstalledModel(self, name, record):
+        '''Remove an installed model if it's still the one installed by
+        the plugin. Returns True if removed.'''
+        from processing.modeler.ModelerUtils import ModelerUtils
+        destFilename = os.path.join(ModelerUtils.modelsFolders()[0], name)
+        try:
+            if not self.isModelInstalled(record['target'], destFilename, record):
+                # replaced by the user
+                return False
+            os.remove(destFilename)
+            return True
+        except Exception as ex:
+            QgsMessageLog.logMessage(self.tr('Failed to uninstall model: {} - {}'.format(destFilename, str(ex))), self.messageTag, Qgis.Warning)
+            return False
+
+    @staticmethod
+    def isModelInstalled(modelFileName, destFilename, record):
+        '''True if destFilename is the installation of modelFileName
+        recorded in record: a symlink to modelFileName or a not modified
+        copy.'''
+        if not record or record.get('target') != modelFileName:
+            return False
+        if os.path.islink(destFilename):
+            return os.readlink(destFilename) == modelFileName
+        if not os.path.isfile(destFilename):
+            return False
+        return PDALtoolsUtils.fileFingerprint(destFilename) == record.get('installed')
+
+    def installedModelsFileName(self):
+        from processing.modeler.ModelerUtils import ModelerUtils
+        return os.path.join(ModelerUtils.modelsFolders()[0], self.INSTALLED_MODELS)
+
+    def readInstalledModels(self):
+        '''Return models installed by the plugin as name => record.'''
+        try:
+            with open(self.installedModelsFileName(), 'r') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def writeInstalledModels(self, installed):
+        try:
+            with open(self.installedModelsFileName(), 'w') as f:
+                json.dump(installed, f, indent=2)
+        except OSError as ex:
+            QgsMessageLog.logMessage(self.tr('Failed to write installed models: {}'.format(str(ex))), self.messageTag, Qgis.Warning)
 
     def id(self):
         """
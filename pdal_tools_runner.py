@@ -0,0 +1,195 @@
+# -*- coding: utf-8 -*-
+"""
+***************************************************************************
+    pdal_tools_runner.py
+    -------------------------
+    begin                : October 2026
+    copyright            : (C) 2026 by Luigi Pirelli
+    email                : luipir at gmail dot com
+    dev for              : http://cartolab.udc.es/cartoweb/
+    Project              : http://cartolab.udc.es/geomove/
+***************************************************************************
+*                                                                         *
+*   This program is free software; you can redistribute it and/or modify  *
+*   it under the terms of the GNU General Public License as published by  *
+*   the Free Software Foundation; either version 2 of the License, or     *
+*   (at your option) any later version.                                   *
+*                                                                         *
+***************************************************************************
+"""
+
+__author__ = 'Luigi Pirelli'
+__date__ = 'October 2026'
+__copyright__ = '(C) 2026, Luigi Pirelli'
+
+import os
+import time
+import signal
+import threading
+import subprocess
+from processing.tools.system import isWindows, isMac
+
+from .pdal_tools_utils import (
+    PDALtoolsUtils,
+    ProcessOutputReader
+)
+
+
+class PDALtoolsRunner:
+    '''Supervise a pdal process: start it, forward its output and wait
+    its end collecting resource usage.
+    The runner does not depend on the Qt event loop nor on the QGIS task
+    manager, then it can be used by any thread, e.g. by algorithms run in
+    background or by concurrent batch jobs. kill can be called by any
+    thread (e.g. by the feedback canceled signal).'''
+
+    def __init__(self, commandline, outputFileName=None, limits=None, onOutput=None):
+        '''
+        commandline: pdal command as list of arguments.
+        outputFileName: if set stdout is written there and only stderr is
+                        forwarded to onOutput.
+        limits: list of (resource, limit) as returned by PDALtoolsUtils.resourceLimits.
+        onOutput: callable receiving the output as chunks of complete lines.
+        '''
+        # inline pipelines are sent to pdal through stdin
+        self.commandline, self.stdin = PDALtoolsUtils.stdinCommand(commandline)
+        self.outputFileName = outputFileName
+        self.limits = limits or []
+        self.onOutput = onOutput
+        self.proc = None
+        self.usage = {}
+        self._lock = threading.Lock()
+        self._killed = False
+
+    @property
+    def returncode(self):
+        return self.proc.returncode if self.proc else None
+
+    @property
+    def killed(self):
+        return self._killed
+
+    def start(self):
+        # !Note! subprocess call is similar as in Grass7Utils.executeGrass
+        # For MS-Windows, we need to hide the console window.
+        si = None
+        if isWindows():
+            si = subprocess.STARTUPINFO()
+            si.dwFlags |= subprocess.STARTF_USESHOWWINDOW
+            si.wShowWindow = subprocess.SW_HIDE
+
+        # preexec_fn is not safe if there are concurrent threads, then
+        # where possible limits are set by a shell before exec of pdal.
+        # On macOS commands are run with shell=True
+        preexec_fn = None
+        commandline = self.commandline
+        if self.limits and isMac():
+            preexec_fn = lambda: PDALtoolsUtils.setResourceLimits(self.limits)
+        elif self.limits:
+            commandline = PDALtoolsUtils.limitedCommand(commandline, self.limits)
+
+        stdout = subprocess.PIPE
+        if self.outputFileName:
+            stdout = open(self.outputFileName, 'wb')
+
+        self._start = time.time()
+        try:
+            with self._lock:
+                self.proc = subprocess.Popen(commandline,
+                                             shell=True if isMac() else False,
+                                             stdout=stdout,
+                                             stdin=subprocess.PIPE if self.stdin else subprocess.DEVNULL,
+                                             stderr=subprocess.PIPE if self.outputFileName else subprocess.STDOUT,
+                                             startupinfo=si,
+                                             preexec_fn=preexec_fn,
+                                             # own process group to kill also children
+                                             start_new_session=not isWindows())
+        finally:
+            if self.outputFileName:
+                # file is inherited by the process
+                stdout.close()
+
+        if self.stdin:
+            # pdal reads the whole pipeline before starting
+            try:
+                self.proc.stdin.write(self.stdin.encode('utf-8'))
+            except BrokenPipeError:
+                # pdal ended: error is reported by its output
+                pass
+            finally:
+                try:
+                    self.proc.stdin.close()
+                except BrokenPipeError:
+                    pass
+
+        # killed before the start
+        if self._killed:
+            self.kill()
+
+    def kill(self):
+        '''Kill the process and its children. Safe to be called by any thread
+        also before the start or after the end of the process.'''
+        with self._lock:
+            self._killed = True
+            if self.proc is None or self.proc.returncode is not None:
+                return
+            try:
+                if isWindows():
+                    self.proc.kill()
+                else:
+                    os.killpg(self.proc.pid, signal.SIGKILL)
+            except (ProcessLookupError, PermissionError):
+                # already terminated
+                pass
+
+    def wait(self):
+        '''Forward the output of the process until its end. Returns the
+        return code of the process.'''
+        stream = self.proc.stderr if self.outputFileName else self.proc.stdout
+        try:
+            # reader blocks until new output and returns all available
+            # lines at once. Killing the process closes the pipe waking
+            # up the reader
+            for out in ProcessOutputReader(stream):
+                if self.onOutput:
+                    self.onOutput(out)
+        finally:
+            stream.close()
+            # pipe is closed => process is ended
+            self.usage = PDALtoolsUtils.waitProcess(self.proc)
+            self.usage['wall_time'] = time.time() - self._start
+        return self.proc.returncode
+
+    def run(self):
+        self.start()
+        return self.wait()
+
+
+class PDALtoolsRunnerGroup:
+    '''Runners of processes running concurrently (e.g. the tiles of a
+    pipeline) that have to be killed all together, e.g. on the first
+    failure. Runners added after kill are killed immediately.'''
+
+    def __init__(self):
+        self._runners = set()
+        self._lock = threading.Lock()
+        self._killed = False
+
+    def add(self, runner):
+        with self._lock:
+            self._runners.add(runner)
+            killed = self._killed
+        if killed:
+            runner.kill()
+
+    def remove(self, runner):
+        with self._lock:
+            self._runners.discard(runner)
+
+    def kill(self):
+        '''Kill all the running processes. Safe to be called by any thread.'''
+        with self._lock:
+            self._killed = True
+            runners = list(self._runners)
+        for runner in runners:
+            runner.kill()
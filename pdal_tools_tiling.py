@@ -0,0 +1,202 @@
+# -*- coding: utf-8 -*-
+"""
+***************************************************************************
+    pdal_tools_tiling.py
+    -------------------------
+    begin                : October 2026
+    copyright            : (C) 2026 by Luigi Pirelli
+    email                : luipir at gmail dot com
+    dev for              : http://cartolab.udc.es/cartoweb/
+    Project              : http://cartolab.udc.es/geomove/
+***************************************************************************
+*                                                                         *
+*   This program is free software; you can redistribute it and/or modify  *
+*   it under the terms of the GNU General Public License as published by  *
+*   the Free Software Foundation; either version 2 of the License, or     *
+*   (at your option) any later version.                                   *
+*                                                                         *
+***************************************************************************
+"""
+
+__author__ = 'Luigi Pirelli'
+__date__ = 'October 2026'
+__copyright__ = '(C) 2026, Luigi Pirelli'
+
+import math
+import copy
+from qgis.core import QgsProcessingException
+
+
+class PDALtoolsTile:
+    '''A tile of the grid. core is the (minx, miny, maxx, maxy) area of
+    the tile in the final result, buffered is the area read to compute it.
+    isLastColumn/isLastRow are True for tiles on the max x/y border.'''
+
+    def __init__(self, column, row, core, buffered, isLastColumn, isLastRow):
+        self.column = column
+        self.row = row
+        self.core = core
+        self.buffered = buffered
+        self.isLastColumn = isLastColumn
+        self.isLastRow = isLastRow
+
+    def name(self):
+        return 'tile_{}_{}'.format(self.column, self.row)
+
+
+class PDALtoolsTiling:
+    '''Split a pipeline in a set of pipelines working on tiles of the
+    input extent. Each tile reads points in its buffered area and
+    writes only the points (or cells) of its core area so that merging
+    all tile results gives the same result of a single pass.
+    Readers able to read only an area (e.g. COPC and EPT) get the
+    buffered area as bounds. Other files are split in tiles by a single
+    streamed "pdal tile" pass (see splitCommand) before running the tile
+    pipelines, then no tile reads the whole input.'''
+
+    # readers supporting bounds option reading only the needed data
+    BOUNDED_READERS = ['readers.copc', 'readers.ept']
+
+    @staticmethod
+    def tileLength(tileSize, resolution=None):
+        '''Return tileSize rounded to a multiple of resolution, if set.'''
+        if tileSize <= 0:
+            raise QgsProcessingException('Tile size must be greater than 0')
+        if resolution:
+            return math.ceil(tileSize / resolution) * resolution
+        return tileSize
+
+    @staticmethod
+    def tiles(bounds, tileSize, tileBuffer=0, resolution=None):
+        '''Return the list of PDALtoolsTile covering bounds (minx, miny, maxx, maxy).
+        If resolution is set (raster outputs) tile size is rounded to a multiple
+        of resolution and core areas are aligned to the same grid that pdal
+        would use in a single pass (origin in minx, miny).'''
+        minx, miny, maxx, maxy = bounds
+        tileSize = PDALtoolsTiling.tileLength(tileSize, resolution)
+
+        columns = max(1, math.ceil((maxx - minx) / tileSize))
+        rows = max(1, math.ceil((maxy - miny) / tileSize))
+
+        tiles = []
+        for column in range(columns):
+            for row in range(rows):
+                isLastColumn = column == columns - 1
+                isLastRow = row == rows - 1
+                x0 = minx + column * tileSize
+                y0 = miny + row * tileSize
+                # buffer is computed from the tile area, not from the core
+                # one that for rasters ends a cell before
+                bx1 = maxx if isLastColumn else x0 + tileSize
+                by1 = maxy if isLastRow else y0 + tileSize
+                x1 = bx1
+                y1 = by1
+                if resolution:
+                    # gdal writer grid is (max - min) / resolution + 1 cells
+                    if not isLastColumn:
+                        x1 -= resolution
+                    if not isLastRow:
+                        y1 -= resolution
+
+                core = (x0, y0, x1, y1)
+                buffered = (x0 - tileBuffer, y0 - tileBuffer, bx1 + tileBuffer, by1 + tileBuffer)
+                tiles.append(PDALtoolsTile(column, row, core, buffered, isLastColumn, isLastRow))
+        return tiles
+
+    @staticmethod
+    def boundsString(bounds):
+        '''Return bounds in pdal format ([minx, maxx], [miny, maxy]).'''
+        minx, miny, maxx, maxy = bounds
+        return '([{}, {}], [{}, {}])'.format(minx, maxx, miny, maxy)
+
+    @staticmethod
+    def splitReaders(stages):
+        '''Return indexes of the readers of stages that have to be split
+        by "pdal tile" before the tiled execution.'''
+        return [index for index, stage in enumerate(stages)
+                if stage.get('type', '').startswith('readers.')
+                and stage['type'] not in PDALtoolsTiling.BOUNDED_READERS]
+
+    @staticmethod
+    def splitCommand(fileName, outputTemplate, bounds, tileSize, tileBuffer=0, resolution=None):
+        '''Return the "pdal tile" commandline splitting fileName in the
+        same grid of tiles. outputTemplate must contain # replaced by pdal
+        with column_row of the tile. pdal tile is streamed: memory does
+        not depend on the size of the input.'''
+        return ['pdal', 'tile',
+                '--length={}'.format(PDALtoolsTiling.tileLength(tileSize, resolution)),
+                '--buffer={}'.format(tileBuffer),
+                '--origin_x={}'.format(bounds[0]),
+                '--origin_y={}'.format(bounds[1]),
+                fileName, outputTemplate]
+
+    @staticmethod
+    def splitFiles(tile, splitFileNames, tileBuffer=0):
+        '''Return the files of splitFileNames, a dictionary (column, row) =>
+        filename produced by "pdal tile", containing the buffered area of
+        tile. pdal tile assigns points exactly on the max border to the next
+        column or row: with a buffer they are also in the buffer of the tile
+        file, then the next files are added only without buffer (they would
+        duplicate them).'''
+        columns = [tile.column] + ([tile.column + 1] if tile.isLastColumn and not tileBuffer else [])
+        rows = [tile.row] + ([tile.row + 1] if tile.isLastRow and not tileBuffer else [])
+        return [splitFileNames[(column, row)] for column in columns for row in rows
+                if (column, row) in splitFileNames]
+
+    @staticmethod
+    def tileStages(stages, tile, tileOutputFileName, splitInputs=None):
+        '''Return a copy of stages reading only the buffered area of tile and
+        writing only its core area to tileOutputFileName.
+        splitInputs is a dictionary reader index => list of files of the tile
+        produced by "pdal tile" replacing the reader (see splitReaders).
+        Readers not split read their buffered area if they support bounds.
+        Stages must be normalized with PDALtoolsUtils.pipelineStages.'''
+        if any('inputs' in stage for stage in stages):
+            raise QgsProcessingException('Tiled execution is not supported for pipelines with explicit stage inputs')
+
+        splitInputs = splitInputs or {}
+        readers = [index for index, stage in enumerate(stages) if stage.get('type', '').startswith('readers.')]
+        writers = [index for index, stage in enumerate(stages) if stage.get('type', '').startswith('writers.')]
+        if not readers or len(writers) != 1:
+            raise QgsProcessingException('Tiled execution needs pipelines with typed readers and only one writer')
+
+        minx, miny, maxx, maxy = tile.core
+        # half open intervals to avoid duplicating points on tile borders
+        coreRange = 'X[{}:{}{},Y[{}:{}{}'.format(
+            minx, maxx, ']' if tile.isLastColumn else ')',
+            miny, maxy, ']' if tile.isLastRow else ')')
+
+        tileStages = []
+        for index, stage in enumerate(copy.deepcopy(stages)):
+            if index in splitInputs:
+                # split files are LAS: options of a LAS reader are preserved
+                options = {}
+                if stage['type'] == 'readers.las':
+                    options = {option: value for option, value in stage.items() if option not in ('filename', 'tag')}
+                # consecutive readers all feed the next stage
+                tileStages.extend(dict(options, type='readers.las', filename=fileName) for fileName in splitInputs[index])
+            else:
+                if index in readers and stage['type'] in PDALtoolsTiling.BOUNDED_READERS:
+                    stage['bounds'] = PDALtoolsTiling.boundsString(tile.buffered)
+                if index == writers[0]:
+                    stage['filename'] = tileOutputFileName
+                    if stage['type'] == 'writers.gdal':
+                        # gdal grid is clipped by bounds. Buffer points are used
+                        # only to compute cells of the core area
+                        stage['bounds'] = PDALtoolsTiling.boundsString(tile.core)
+                    else:
+                        # clip buffer before writing
+                        tileStages.append({'type': 'filters.range', 'limits': coreRange})
+                tileStages.append(stage)
+            if index == readers[-1]:
+                # points outside the buffered area (e.g. of split files
+                # with a wider buffer) are dropped
+                tileStages.append({
+                    'type': 'filters.crop',
+                    'bounds': PDALtoolsTiling.boundsString(tile.buffered)
+                })
+
+        if not any(stage.get('type', '').startswith('readers.') for stage in tileStages):
+            # no points of the split inputs in this tile
+            return None
+        return tileStages
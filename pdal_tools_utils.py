@@ -23,162 +23,1029 @@ __date__ = 'August 2018'
 __copyright__ = '(C) 2018, Luigi Pirelli'
 
 import os
-import gdal
+import sys
+import copy
+import gzip
+import json
+import codecs
+import struct
+import time
+import uuid
+import hashlib
+import tempfile
+import threading
+from collections import deque
 from qgis.core import (
-    QgsProcessingException,
-    QgsApplication,
-    QgsMessageLog,
-    Qgis,
-    QgsApplication,
-    QgsTask
+    QgsProcessingException
 )
-# modules to manage no-blocking stream reading
-from threading import Thread
-from queue import Queue, Empty
+from processing.core.ProcessingConfig import ProcessingConfig
+# qgis free helpers are also imported by the standalone daemon script
+try:
+    from .pdal_tools_common import parseJsonc, applyStageOverrides
+except ImportError:
+    from pdal_tools_common import parseJsonc, applyStageOverrides
+# resource limits and usage are available only in unix envs
+try:
+    import resource
+except ImportError:
+    resource = None
 
 
 class PDALtoolsUtils:
 
+    PDALTOOLS_USE_PYTHON_PDAL = 'PDALTOOLS_USE_PYTHON_PDAL'
+    PDALTOOLS_METADATA_CACHE = 'PDALTOOLS_METADATA_CACHE'
+    PDALTOOLS_METADATA_CACHE_SIZE = 'PDALTOOLS_METADATA_CACHE_SIZE'
+    PDALTOOLS_SKIP_VALIDATION = 'PDALTOOLS_SKIP_VALIDATION'
+    PDALTOOLS_MAX_MEMORY = 'PDALTOOLS_MAX_MEMORY'
+    PDALTOOLS_MAX_CPU_TIME = 'PDALTOOLS_MAX_CPU_TIME'
+    PDALTOOLS_LOG_TO_CONSOLE = 'PDALTOOLS_LOG_TO_CONSOLE'
+    PDALTOOLS_LOG_TO_MESSAGE_LOG = 'PDALTOOLS_LOG_TO_MESSAGE_LOG'
+    PDALTOOLS_DAEMON_SOCKET = 'PDALTOOLS_DAEMON_SOCKET'
+    PDALTOOLS_PIPELINE_FOLDERS = 'PDALTOOLS_PIPELINE_FOLDERS'
+
+    # extensions managed by PDAL point cloud writers
+    PDAL_WRITERS_EXTENSIONS = {
+        'las': 'las',
+        'laz': 'las',
+        'copc': 'copc',
+        'copc.laz': 'copc',
+        'bpf': 'bpf',
+        'e57': 'e57',
+        'pcd': 'pcd',
+        'ply': 'ply',
+        'sbet': 'sbet',
+        'csv': 'text',
+        'txt': 'text',
+        'xyz': 'text',
+        'tiledb': 'tiledb',
+        'npy': 'numpy',
+        'drc': 'draco',
+        'fbx': 'fbx',
+        'glb': 'gltf',
+    }
+
+    # drivers of PDAL_WRITERS_EXTENSIONS without a reader
+    WRITER_ONLY_DRIVERS = ['fbx', 'gltf']
+
+    # extensions made of more parts, e.g. x.copc.laz is not a LAS file
+    # for the writer (os.path.splitext would return .laz). See splitExtension
+    COMPOUND_EXTENSIONS = ['copc.laz']
+
+    # options of writers.las not accepted by writers.copc. See
+    # PDALtoolsPipeline.withStageTypes
+    LAS_ONLY_OPTIONS = ['compression', 'major_version', 'minor_version', 'dataformat_id']
+
+    # pdal version get on first use. See pdalVersion
+    _pdalVersion = None
+
+    # streamable flag of pdal stages get on first use. See driversStreamability
+    _driversStreamability = None
+
+    # keys of pipelines already validated. See validationKey
+    _validated = set()
+    _validatedLock = threading.Lock()
+
+    # extension => writer map built on first use. See driverMap
+    _driverMap = None
+    _driverMapLock = threading.Lock()
+
+    @staticmethod
+    def usePythonPdal():
+        '''True if user asked to run pipelines in-process with python-pdal.'''
+        return bool(ProcessingConfig.getSetting(PDALtoolsUtils.PDALTOOLS_USE_PYTHON_PDAL))
+
+    @staticmethod
+    def useMetadataCache():
+        '''True if PCL metadata have to be cached on disk.'''
+        return bool(ProcessingConfig.getSetting(PDALtoolsUtils.PDALTOOLS_METADATA_CACHE))
+
+    @staticmethod
+    def metadataCacheSize():
+        '''Max number of files kept in metadata cache.'''
+        try:
+            return int(ProcessingConfig.getSetting(PDALtoolsUtils.PDALTOOLS_METADATA_CACHE_SIZE))
+        except (TypeError, ValueError):
+            return 100000
+
+    @staticmethod
+    def skipValidation():
+        '''True if pipeline have not to be validated before its execution.'''
+        return bool(ProcessingConfig.getSetting(PDALtoolsUtils.PDALTOOLS_SKIP_VALIDATION))
+
+    @staticmethod
+    def logToConsole():
+        '''True if pdal output have to be forwarded to the processing console.'''
+        return bool(ProcessingConfig.getSetting(PDALtoolsUtils.PDALTOOLS_LOG_TO_CONSOLE))
+
+    @staticmethod
+    def logToMessageLog():
+        '''True if pdal output have to be forwarded to the QGIS message log.'''
+        return bool(ProcessingConfig.getSetting(PDALtoolsUtils.PDALTOOLS_LOG_TO_MESSAGE_LOG))
+
+    @staticmethod
+    def pipelineFolders():
+        '''Return the user folders of pipelines exposed as algorithms.'''
+        folders = ProcessingConfig.getSetting(PDALtoolsUtils.PDALTOOLS_PIPELINE_FOLDERS) or ''
+        return [folder for folder in folders.split(';') if folder and os.path.isdir(folder)]
+
+    @staticmethod
+    def daemonSocket():
+        '''Return the socket of the pdal workers daemon to submit pipelines
+        to, None if not set or not running.'''
+        socketPath = ProcessingConfig.getSetting(PDALtoolsUtils.PDALTOOLS_DAEMON_SOCKET)
+        if socketPath and os.path.exists(socketPath):
+            return socketPath
+        return None
+
+    @staticmethod
+    def resourceLimits():
+        '''Return the list of (resource, limit) to set to pdal processes
+        basing on max memory (MB) and max cpu time (seconds) settings.'''
+        if resource is None:
+            return []
+
+        limits = []
+        for setting, limitedResource, factor in [
+                (PDALtoolsUtils.PDALTOOLS_MAX_MEMORY, resource.RLIMIT_AS, 1024 * 1024),
+                (PDALtoolsUtils.PDALTOOLS_MAX_CPU_TIME, resource.RLIMIT_CPU, 1)]:
+            try:
+                value = int(ProcessingConfig.getSetting(setting) or 0)
+            except (TypeError, ValueError):
+                value = 0
+            if value > 0:
+                limits.append((limitedResource, value * factor))
+        return limits
+
+    @staticmethod
+    def setResourceLimits(limits):
+        '''Apply limits to the current process (e.g. as subprocess preexec_fn).'''
+        for limitedResource, value in limits:
+            resource.setrlimit(limitedResource, (value, value))
+
+    @staticmethod
+    def limitedCommand(commandline, limits):
+        '''Return commandline run by a shell setting limits before exec
+        of the command. Limits are then in place before the command starts
+        without using preexec_fn, that is not safe with concurrent threads.'''
+        options = {resource.RLIMIT_AS: ('-v', 1024), resource.RLIMIT_CPU: ('-t', 1)}
+        script = ''.join('ulimit {} {} && '.format(options[limitedResource][0], value // options[limitedResource][1])
+                         for limitedResource, value in limits)
+        return ['sh', '-c', script + 'exec "$@"', commandline[0]] + list(commandline)
+
+    @staticmethod
+    def waitProcess(proc):
+        '''Wait termination of a subprocess.Popen process.
+        Returns the resource usage of the process (and its waited children)
+        as dictionary with peak_rss (bytes), user_time and system_time
+        (seconds) or an empty dictionary if not available.'''
+        if not hasattr(os, 'wait4'):
+            proc.wait()
+            return {}
+
+        _, status, usage = os.wait4(proc.pid, 0)
+        # same returncode of Popen: negative signal if killed
+        if os.WIFSIGNALED(status):
+            proc.returncode = -os.WTERMSIG(status)
+        else:
+            proc.returncode = os.WEXITSTATUS(status)
+
+        # ru_maxrss is in KB on linux and in bytes on macOS
+        peakRss = usage.ru_maxrss if sys.platform == 'darwin' else usage.ru_maxrss * 1024
+        return {
+            'peak_rss': peakRss,
+            'user_time': usage.ru_utime,
+            'system_time': usage.ru_stime,
+        }
+
+    @staticmethod
+    def pdalVersion():
+        '''Return version string of installed pdal. pdal is run only
+        the first time.'''
+        if PDALtoolsUtils._pdalVersion is None:
+            # imported here to keep plugin load light
+            import subprocess
+            try:
+                proc = subprocess.run(['pdal', '--version'],
+                                      stdout=subprocess.PIPE,
+                                      stderr=subprocess.STDOUT,
+                                      stdin=subprocess.DEVNULL,
+                                      universal_newlines=True)
+                PDALtoolsUtils._pdalVersion = proc.stdout.strip()
+            except OSError:
+                PDALtoolsUtils._pdalVersion = ''
+        return PDALtoolsUtils._pdalVersion
+
+    @staticmethod
+    def validationKey(commandline):
+        '''Return a key identifying the validation result of a "pdal pipeline"
+        commandline. The key depends on the pipeline content, the names of
+        overridden stage options and pdal version. Override values (e.g.
+        filenames of each batch row) are not considered.'''
+        _, pipelineFileName, overrides = PDALtoolsUtils.parsePipelineCommand(commandline)
+
+        key = hashlib.sha256()
+        key.update(PDALtoolsUtils.pipelineHash(pipelineFileName).encode('utf-8'))
+        for stage, option in sorted(set((stage, option) for stage, option, _ in overrides)):
+            key.update('\n{}.{}'.format(stage, option).encode('utf-8'))
+        key.update('\n{}'.format(PDALtoolsUtils.pdalVersion()).encode('utf-8'))
+        return key.hexdigest()
+
+    @staticmethod
+    def isValidated(validationKey):
+        with PDALtoolsUtils._validatedLock:
+            return validationKey in PDALtoolsUtils._validated
+
+    @staticmethod
+    def setValidated(validationKey):
+        with PDALtoolsUtils._validatedLock:
+            PDALtoolsUtils._validated.add(validationKey)
+
+    @staticmethod
+    def readPipeline(pipelineFileName):
+        '''Load a json pipeline file allowing comments and trailing commas
+        that are not part of json standard.
+        Returns the parsed json.'''
+        return copy.deepcopy(PDALtoolsPipeline.load(pipelineFileName).jsondata)
+
+    @staticmethod
+    def parseJsonc(text):
+        '''Parse json text with // and /* */ comments and trailing commas.'''
+        return parseJsonc(text)
+
+    @staticmethod
+    def pipelineHash(pipeline):
+        '''Return sha256 of a pipeline file or of an inline pipeline.'''
+        if PDALtoolsPipeline.isInline(pipeline):
+            return hashlib.sha256(pipeline.encode('utf-8')).hexdigest()
+        return PDALtoolsUtils.fileFingerprint(pipeline, hashContent=True)['sha256']
+
+    @staticmethod
+    def stdinCommand(commandline):
+        '''Return a tuple (commandline, stdin) where an inline pipeline set
+        as -i argument is replaced with --stdin and returned as stdin text.
+        stdin is None for pipeline files.'''
+        if '-i' not in commandline:
+            return commandline, None
+        index = commandline.index('-i')
+        if index + 1 >= len(commandline) or not PDALtoolsPipeline.isInline(commandline[index + 1]):
+            return commandline, None
+        return commandline[:index] + ['--stdin'] + commandline[index + 2:], commandline[index + 1]
+
+    @staticmethod
+    def commandStages(commandline):
+        '''Return the stages run by a "pdal pipeline" commandline after
+        applying its stage overrides.'''
+        _, pipelineFileName, overrides = PDALtoolsUtils.parsePipelineCommand(commandline)
+        return PDALtoolsPipeline.load(pipelineFileName).stages(overrides)
+
+    @staticmethod
+    def pipelineStages(jsondata):
+        '''Return pipeline stages as a list of dictionaries. Stages
+        specified only as filename are converted to {"filename": ...}
+        adding the type inferred in the same way PDAL does: a filename
+        is a writer only if it's the last of more than one stage.'''
+        if isinstance(jsondata, dict):
+            jsondata = jsondata.get('pipeline', [])
+
+        stages = []
+        for index, stage in enumerate(jsondata):
+            if isinstance(stage, str):
+                stage = {'filename': stage}
+            if 'type' not in stage and stage.get('filename'):
+                isWriter = (index == len(jsondata) - 1) and (len(jsondata) > 1)
+                try:
+                    # unknown extensions are left to pdal inference
+                    # instead of guessing a driver
+                    driver = PDALtoolsUtils.getDriverType(stage['filename'], default=None)
+                except QgsProcessingException:
+                    # let pdal infer it
+                    driver = None
+                if driver and not isWriter and driver in PDALtoolsUtils.WRITER_ONLY_DRIVERS:
+                    driver = None
+                if driver:
+                    stage['type'] = '{}.{}'.format('writers' if isWriter else 'readers', driver)
+            stages.append(stage)
+        return stages
+
+    @staticmethod
+    def parsePipelineCommand(commandline):
+        '''Split a "pdal pipeline" commandline in its components.
+        Returns a tuple (options, pipelineFileName, overrides) where options
+        is the list of pdal options (e.g. --validate), and overrides is a list of
+        (stage, option, value) tuples, e.g. ('readers.las', 'filename', 'a.las')
+        or ('stage.input1', 'filename', 'a.las').'''
+        options = []
+        pipelineFileName = None
+        overrides = []
+
+        args = iter(commandline[2:])
+        for arg in args:
+            if arg in ['-i', '--input']:
+                pipelineFileName = next(args, None)
+                continue
+            if arg == '--metadata':
+                options.append('--metadata={}'.format(next(args, '')))
+                continue
+
+            key, _, value = arg.partition('=')
+            if key.count('.') >= 2:
+                stage, _, option = key.lstrip('-').rpartition('.')
+                overrides.append((stage, option, value))
+            else:
+                options.append(arg)
+
+        return options, pipelineFileName, overrides
+
+    @staticmethod
+    def replaceOptions(commandline, options):
+        '''Return a "pdal pipeline" commandline with options (e.g. --validate)
+        in place of the current ones. The pipeline, file or inline json, is
+        always the -i argument, see stdinCommand.'''
+        index = commandline.index('-i')
+        return commandline[:2] + options + commandline[index:]
+
+    @staticmethod
+    def driversStreamability():
+        '''Return the map stage name => True if streamable as reported
+        by "pdal --drivers". pdal is run only the first time.'''
+        if PDALtoolsUtils._driversStreamability is None:
+            import subprocess
+            streamability = {}
+            try:
+                proc = subprocess.run(['pdal', '--drivers', '--showjson'],
+                                      stdout=subprocess.PIPE,
+                                      stderr=subprocess.DEVNULL,
+                                      stdin=subprocess.DEVNULL,
+                                      universal_newlines=True)
+                for driver in json.loads(proc.stdout):
+                    # old pdal versions does not report streamability
+                    if 'streamable' in driver:
+                        streamability[driver['name']] = bool(driver['streamable'])
+            except (OSError, ValueError, TypeError, KeyError):
+                pass
+            PDALtoolsUtils._driversStreamability = streamability
+        return PDALtoolsUtils._driversStreamability
+
+    @staticmethod
+    def executionMode(commandline):
+        '''Choose the execution mode with the lowest memory usage for a
+        "pdal pipeline" commandline.
+        Returns a tuple (options, mode, reason) where options is the list of
+        pdal options to set the mode (--stream or --nostream), mode is
+        "stream", "standard" or "default" if stage capabilities are unknown
+        and the choice is left to pdal.'''
+        stages = PDALtoolsUtils.commandStages(commandline)
+
+        streamability = PDALtoolsUtils.driversStreamability()
+        unknown = None
+        for stage in stages:
+            stageType = stage.get('type')
+            if stageType not in streamability:
+                unknown = unknown or stageType or stage.get('filename')
+                continue
+            if not streamability[stageType]:
+                return ['--nostream'], 'standard', 'Stage {} is not streamable'.format(stageType)
+
+        if unknown:
+            return [], 'default', 'Cannot state if stage {} is streamable'.format(unknown)
+        return ['--stream'], 'stream', 'All stages are streamable'
+
+    @staticmethod
+    def applyStageOverrides(stages, overrides):
+        '''Apply --<stage>.<option>=<value> overrides to a list of stages
+        as pdal command line does. Overrides in the form stage.<tag>
+        reference the stage by tag, otherwise by driver type.'''
+        try:
+            return applyStageOverrides(stages, overrides)
+        except ValueError as ex:
+            raise QgsProcessingException(str(ex))
+
+    @staticmethod
+    def driverMap():
+        '''Return the extension => writer map. The map is built only once
+        per process from installed GDAL raster drivers and well known PDAL
+        writers. PDAL writers take precedence on GDAL for extensions
+        managed by both (e.g. xyz).'''
+        if PDALtoolsUtils._driverMap is not None:
+            return PDALtoolsUtils._driverMap
+
+        with PDALtoolsUtils._driverMapLock:
+            if PDALtoolsUtils._driverMap is None:
+                # gdal is slow to import and not needed to load the plugin
+                import gdal
+                driverMap = {}
+                for i in range(gdal.GetDriverCount()):
+                    drv = gdal.GetDriver(i)
+                    if drv.GetMetadataItem(gdal.DCAP_RASTER):
+                        extensions = drv.GetMetadataItem(gdal.DMD_EXTENSIONS)
+                        if extensions:
+                            for extension in extensions.split():
+                                driverMap[extension.lower()] = 'gdal'
+
+                driverMap.update(PDALtoolsUtils.PDAL_WRITERS_EXTENSIONS)
+                PDALtoolsUtils._driverMap = driverMap
+
+        return PDALtoolsUtils._driverMap
+
+    @staticmethod
+    def pipelineInputs(commandline):
+        '''Return filenames read by a "pdal pipeline" commandline: filename
+        of all readers after applying stage overrides.'''
+        stages = PDALtoolsUtils.commandStages(commandline)
+        return [stage['filename'] for stage in stages
+                if stage.get('filename') and stage.get('type', '').startswith('readers.')]
+
+    @staticmethod
+    def fileFingerprint(fileName, hashContent=False):
+        '''Return size, mtime and optionally sha256 of the content of fileName.'''
+        stat = os.stat(fileName)
+        fingerprint = {
+            'size': stat.st_size,
+            'mtime': stat.st_mtime_ns,
+        }
+        if hashContent:
+            contentHash = hashlib.sha256()
+            with open(fileName, 'rb') as f:
+                for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                    contentHash.update(chunk)
+            fingerprint['sha256'] = contentHash.hexdigest()
+        return fingerprint
+
+    @staticmethod
+    def buildManifest(commandline, hashContent=False):
+        '''Return the manifest describing how an output is generated by a
+        "pdal pipeline" commandline: input fingerprints, pipeline hash,
+        commandline and pdal version.'''
+        _, pipelineFileName, _ = PDALtoolsUtils.parsePipelineCommand(commandline)
+        inputs = {}
+        for fileName in PDALtoolsUtils.pipelineInputs(commandline):
+            if os.path.isfile(fileName):
+                inputs[os.path.abspath(fileName)] = PDALtoolsUtils.fileFingerprint(fileName, hashContent)
+
+        return {
+            'inputs': inputs,
+            'pipeline': PDALtoolsUtils.pipelineHash(pipelineFileName),
+            # run options (e.g. verbosity) does not change the output
+            'commandline': PDALtoolsUtils.replaceOptions(commandline, []),
+            'pdal_version': PDALtoolsUtils.pdalVersion(),
+        }
+
+    @staticmethod
+    def manifestFileName(outputFileName):
+        return outputFileName + '.pdaltools.json'
+
+    @staticmethod
+    def isUpToDate(outputFileName, manifest):
+        '''True if outputFileName exists and has been generated as
+        described by manifest.'''
+        if not os.path.isfile(outputFileName):
+            return False
+        try:
+            with open(PDALtoolsUtils.manifestFileName(outputFileName), 'r') as f:
+                return json.load(f) == manifest
+        except (OSError, ValueError):
+            return False
+
+    @staticmethod
+    def writeManifest(outputFileName, manifest):
+        manifestFileName = PDALtoolsUtils.manifestFileName(outputFileName)
+        tempFileName = PDALtoolsUtils.temporaryFileName(manifestFileName)
+        with open(tempFileName, 'w') as f:
+            json.dump(manifest, f, indent=2)
+        os.replace(tempFileName, manifestFileName)
+
+    @staticmethod
+    def removeManifest(outputFileName):
+        manifestFileName = PDALtoolsUtils.manifestFileName(outputFileName)
+        if os.path.exists(manifestFileName):
+            os.remove(manifestFileName)
+
+    @staticmethod
+    def temporaryFileName(fileName):
+        '''Return a temporary file name in the same folder of fileName,
+        and with the same extension, that can be atomically renamed to
+        fileName.'''
+        folder, baseName = os.path.split(fileName)
+        return os.path.join(folder, '.pdaltools-{}-{}'.format(uuid.uuid4().hex[:12], baseName))
+
+    @staticmethod
+    def temporaryFolder(fileName):
+        '''Create a temporary folder in the same folder of fileName where a
+        writer can create fileName and its sidecar files (e.g. .shx and .dbf
+        of a shapefile), then all of them can be renamed beside fileName.'''
+        return tempfile.mkdtemp(prefix='.pdaltools-', dir=os.path.dirname(os.path.abspath(fileName)))
+
+    @staticmethod
+    def replaceOutput(commandline, outputFileName, newOutputFileName):
+        '''Return commandline with writers filename override set to
+        newOutputFileName in place of outputFileName. Overrides of readers
+        with the same filename are not changed.'''
+        _, pipelineFileName, _ = PDALtoolsUtils.parsePipelineCommand(commandline)
+        stages = PDALtoolsPipeline.load(pipelineFileName).stages()
+        # untyped stages are writers only if last, as pdal infers them
+        writerTags = [stage['tag'] for index, stage in enumerate(stages) if stage.get('tag') and (
+            PDALtoolsPipeline.kind(stage) == 'writers' or
+            (PDALtoolsPipeline.kind(stage) is None and index == len(stages) - 1 and index > 0))]
+
+        result = []
+        for arg in commandline:
+            key, _, value = arg.partition('=')
+            stageName, _, option = key.lstrip('-').rpartition('.')
+            isWriter = stageName.startswith('writers.') or \
+                (stageName.startswith('stage.') and stageName[len('stage.'):] in writerTags)
+            if arg.startswith('--') and option == 'filename' and value == outputFileName and isWriter:
+                arg = '{}={}'.format(key, newOutputFileName)
+            result.append(arg)
+        return result
+
     @staticmethod
-    def getDriverType(filename):
+    def splitExtension(filename):
+        '''Same as os.path.splitext but managing compound
+        extensions, e.g. ('cloud', '.copc.laz') for cloud.copc.laz.'''
+        lowerFilename = filename.lower()
+        for extension in PDALtoolsUtils.COMPOUND_EXTENSIONS:
+            extension = '.' + extension
+            root = filename[:-len(extension)]
+            if lowerFilename.endswith(extension) and os.path.basename(root):
+                return root, filename[-len(extension):]
+        return os.path.splitext(filename)
+
+    @staticmethod
+    def isEpt(filename):
+        '''True if filename is an Entwine Point Tile dataset: its
+        ept.json or an ept:// url.'''
+        return filename.startswith('ept://') or os.path.basename(filename).lower() == 'ept.json'
+
+    @staticmethod
+    def getDriverType(filename, default='las'):
         '''Get the writer or reader type basing on
-        extension of filename or if it can be opne
-        by gdal.'''
+        extension of filename. default is returned for
+        unknown extensions.'''
         if not filename:
             return None
 
-        if os.path.exists(filename):
-            dataset = gdal.Open(filename, gdal.GA_ReadOnly)
-            if dataset is not None:
-                # clsoe dataset
-                dataset = None
-                return 'gdal'
+        # EPT is a folder of files described by ept.json
+        if PDALtoolsUtils.isEpt(filename):
+            return 'ept'
 
         # try to get driver by extension
-        extension = os.path.splitext(filename)[1]
+        extension = PDALtoolsUtils.splitExtension(filename)[1]
         if not extension:
             raise QgsProcessingException("Cannot state file type by extension for {}".format(filename))
-        extension = extension[1:]
-
-        # check if managed by gdal
-        for i in range(gdal.GetDriverCount()):
-            drv = gdal.GetDriver(i)
-            if drv.GetMetadataItem(gdal.DCAP_RASTER):
-                extensions = drv.GetMetadataItem(gdal.DMD_EXTENSIONS)
-                if extensions:
-                    extensions = extensions.split()
-                    extensions = [extension.lower() for extension in extensions]
-                    if extension.lower() in extensions:
-                        return 'gdal'
-
-        if extension in ['las', 'laz']:
-            return 'las'
+        extension = extension[1:].lower()
 
         # I can't determine the driver to use
-        # then use the default "las"
-        return 'las'
-
-class _NonBlockingStreamReader:
-    '''Queue reader to avoid stdout/stderr reading block
-    snipped from:
-    http://eyalarubas.com/python-subproc-nonblock.html
-    tnx to: https://github.com/EyalAr
+        # then use the default (e.g. "las")
+        return PDALtoolsUtils.driverMap().get(extension, default)
+
+    @staticmethod
+    def isLasFile(filename):
+        '''True if filename has a LAS/LAZ extension.'''
+        return os.path.splitext(filename)[1].lower() in ['.las', '.laz']
+
+    @staticmethod
+    def readLasMetadata(pclFileName):
+        '''Same as readLasHeader but returns metadata wrapped as
+        returned by "pdal info --metadata". None if file is not a LAS.'''
+        metadata = PDALtoolsUtils.readLasHeader(pclFileName)
+        if not metadata:
+            return None
+        return {'filename': pclFileName, 'metadata': metadata}
+
+    @staticmethod
+    def readLasHeader(pclFileName):
+        '''Read public header and (E)VLRs of a LAS/LAZ 1.0-1.4 file without
+        the need of pdal. Only the first KB of the file are read.
+        Returns a dictionary with the same keys used in the "metadata"
+        returned by "pdal info --metadata" or None if file is not a LAS.'''
+        with open(pclFileName, 'rb') as f:
+            header = f.read(375)
+            if len(header) < 227 or header[:4] != b'LASF':
+                return None
+
+            majorVersion, minorVersion = struct.unpack_from('<BB', header, 24)
+            headerSize, pointOffset, vlrsCount, pointFormat, pointLength, count = \
+                struct.unpack_from('<HLLBHL', header, 94)
+            (scaleX, scaleY, scaleZ,
+             offsetX, offsetY, offsetZ,
+             maxX, minX, maxY, minY, maxZ, minZ) = struct.unpack_from('<12d', header, 131)
+
+            evlrsStart = 0
+            evlrsCount = 0
+            if (majorVersion, minorVersion) >= (1, 4) and len(header) >= 255:
+                evlrsStart, evlrsCount, count64 = struct.unpack_from('<QLQ', header, 235)
+                # legacy count is 0 for formats > 5 or more than 2^32 points
+                count = count64 or count
+
+            vlrs = []
+            f.seek(headerSize)
+            for i in range(vlrsCount):
+                vlrHeader = f.read(54)
+                if len(vlrHeader) < 54:
+                    break
+                _, userId, recordId, length, _ = struct.unpack('<H16sHH32s', vlrHeader)
+                vlrs.append((userId.rstrip(b'\0').decode('ascii', 'replace'), recordId, f.read(length)))
+
+            if evlrsCount:
+                f.seek(evlrsStart)
+                for i in range(evlrsCount):
+                    evlrHeader = f.read(60)
+                    if len(evlrHeader) < 60:
+                        break
+                    _, userId, recordId, length, _ = struct.unpack('<H16sHQ32s', evlrHeader)
+                    userId = userId.rstrip(b'\0').decode('ascii', 'replace')
+                    if userId != 'LASF_Projection':
+                        # skip data not needed (e.g. waveforms or copc hierarchy)
+                        f.seek(length, os.SEEK_CUR)
+                        continue
+                    vlrs.append((userId, recordId, f.read(length)))
+
+        wkt = PDALtoolsUtils._lasWkt(vlrs)
+        return {
+            'major_version': majorVersion,
+            'minor_version': minorVersion,
+            'dataformat_id': pointFormat & 0x3f,
+            'compressed': bool(pointFormat & 0x80),
+            'point_length': pointLength,
+            'count': count,
+            'header_size': headerSize,
+            'dataoffset': pointOffset,
+            'scale_x': scaleX,
+            'scale_y': scaleY,
+            'scale_z': scaleZ,
+            'offset_x': offsetX,
+            'offset_y': offsetY,
+            'offset_z': offsetZ,
+            'minx': minX,
+            'miny': minY,
+            'minz': minZ,
+            'maxx': maxX,
+            'maxy': maxY,
+            'maxz': maxZ,
+            'spatialreference': wkt,
+            'comp_spatialreference': wkt,
+        }
+
+    @staticmethod
+    def _lasWkt(vlrs):
+        '''Get CRS as WKT from LASF_Projection VLRs. OGC WKT record is
+        preferred, otherwise EPSG code is get from GeoTIFF keys.'''
+        geoKeys = None
+        for userId, recordId, data in vlrs:
+            if userId != 'LASF_Projection':
+                continue
+            if recordId == 2112:
+                return data.split(b'\0', 1)[0].decode('utf-8', 'replace')
+            if recordId == 34735:
+                geoKeys = data
+
+        if not geoKeys or len(geoKeys) < 8:
+            return ''
+
+        # GeoKeyDirectoryTag: 4 shorts of header and 4 shorts for each key
+        keysCount = min(struct.unpack_from('<H', geoKeys, 6)[0], len(geoKeys) // 8 - 1)
+        epsg = None
+        for i in range(keysCount):
+            keyId, location, _, value = struct.unpack_from('<4H', geoKeys, 8 * (i + 1))
+            # ProjectedCSTypeGeoKey has precedence on GeographicTypeGeoKey
+            if location == 0 and keyId == 3072:
+                epsg = value
+                break
+            if location == 0 and keyId == 2048:
+                epsg = value
+
+        if not epsg:
+            return ''
+        import osr
+        srs = osr.SpatialReference()
+        if srs.ImportFromEPSG(epsg) != 0:
+            return ''
+        return srs.ExportToWkt()
+
+
+class PDALtoolsPipeline:
+    '''Parsed pdal pipeline. Stages are normalized by
+    PDALtoolsUtils.pipelineStages and their inputs resolved as pdal does:
+    explicit "inputs" tags or, for filters and writers, the previous stage.
+    Pipelines loaded from file are cached in memory until the file
+    changes, then they have to be considered read only: methods
+    returning stages return copies.
+    A pipeline can also be inline json text in place of the filename: it's
+    run by pdal reading it from stdin, without writing temporary files.'''
+
+    maxCacheEntries = 256
+    _cache = {}
+    _cacheLock = threading.Lock()
+
+    def __init__(self, jsondata, fileName=None):
+        self.fileName = fileName
+        self.jsondata = jsondata
+        self._stages = PDALtoolsUtils.pipelineStages(copy.deepcopy(jsondata))
+        self._tags = {stage['tag']: index for index, stage in enumerate(self._stages) if stage.get('tag')}
+        self._inputs = [self._resolveInputs(index) for index in range(len(self._stages))]
+
+    @staticmethod
+    def isInline(pipeline):
+        '''True if pipeline is json text instead of a filename.'''
+        return pipeline.lstrip().startswith(('{', '['))
+
+    @staticmethod
+    def load(pipelineFileName):
+        '''Return the pipeline of pipelineFileName, or of inline json text,
+        parsing it only if not cached or changed since the last load.'''
+        if PDALtoolsPipeline.isInline(pipelineFileName):
+            return PDALtoolsPipeline._loadInline(pipelineFileName)
+
+        path = os.path.abspath(pipelineFileName)
+        try:
+            stat = os.stat(path)
+        except OSError as ex:
+            raise QgsProcessingException(str(ex))
+        version = (stat.st_mtime_ns, stat.st_size)
+
+        with PDALtoolsPipeline._cacheLock:
+            cached = PDALtoolsPipeline._cache.get(path)
+        if cached and cached[0] == version:
+            return cached[1]
+
+        try:
+            with open(path, 'r') as f:
+                jsondata = PDALtoolsUtils.parseJsonc(f.read())
+        except (OSError, ValueError) as ex:
+            raise QgsProcessingException('Cannot read pipeline {}: {}'.format(pipelineFileName, str(ex)))
+        pipeline = PDALtoolsPipeline(jsondata, pipelineFileName)
+
+        PDALtoolsPipeline._store(path, version, pipeline)
+        return pipeline
+
+    @staticmethod
+    def _loadInline(text):
+        key = 'inline:' + hashlib.sha256(text.encode('utf-8')).hexdigest()
+        with PDALtoolsPipeline._cacheLock:
+            cached = PDALtoolsPipeline._cache.get(key)
+        if cached:
+            return cached[1]
+
+        try:
+            jsondata = PDALtoolsUtils.parseJsonc(text)
+        except ValueError as ex:
+            raise QgsProcessingException('Cannot read inline pipeline: {}'.format(str(ex)))
+        pipeline = PDALtoolsPipeline(jsondata)
+        PDALtoolsPipeline._store(key, None, pipeline)
+        return pipeline
+
+    @staticmethod
+    def _store(key, version, pipeline):
+        with PDALtoolsPipeline._cacheLock:
+            if len(PDALtoolsPipeline._cache) >= PDALtoolsPipeline.maxCacheEntries:
+                PDALtoolsPipeline._cache.clear()
+            PDALtoolsPipeline._cache[key] = (version, pipeline)
+
+    def _resolveInputs(self, index):
+        stage = self._stages[index]
+        if 'inputs' in stage:
+            inputs = stage['inputs']
+            if isinstance(inputs, str):
+                inputs = [inputs]
+            for tag in inputs:
+                if tag not in self._tags:
+                    raise QgsProcessingException("Stage {} references unknown input '{}'".format(
+                        stage.get('tag') or stage.get('type') or index, tag))
+            return [self._tags[tag] for tag in inputs]
+        if self.kind(stage) == 'readers' or index == 0:
+            return []
+        return [index - 1]
+
+    @staticmethod
+    def kind(stage):
+        '''Return readers, filters or writers. None if type is unknown.'''
+        kind = stage.get('type', '').partition('.')[0]
+        return kind if kind in ('readers', 'filters', 'writers') else None
+
+    def stages(self, overrides=None):
+        '''Return a copy of the stages applying the
+        (stage, option, value) overrides of a commandline.'''
+        stages = copy.deepcopy(self._stages)
+        if overrides:
+            stages = PDALtoolsUtils.applyStageOverrides(stages, overrides)
+        return stages
+
+    def readers(self):
+        return [copy.deepcopy(stage) for stage in self._stages if self.kind(stage) == 'readers']
+
+    def filters(self):
+        return [copy.deepcopy(stage) for stage in self._stages if self.kind(stage) == 'filters']
+
+    def writers(self):
+        return [copy.deepcopy(stage) for stage in self._stages if self.kind(stage) == 'writers']
+
+    def withStageTypes(self, types, dropOptions=()):
+        '''Return the pipeline json data with stage types replaced as in
+        types, a dictionary stage index => new type, and without
+        dropOptions in the replaced stages.'''
+        stages = self.stages()
+        for index, stageType in types.items():
+            stages[index] = {option: value for option, value in stages[index].items() if option not in dropOptions}
+            stages[index]['type'] = stageType
+        return {'pipeline': stages}
+
+    def stageByTag(self, tag):
+        index = self._tags.get(tag)
+        return copy.deepcopy(self._stages[index]) if index is not None else None
+
+    def stageIndex(self, name):
+        '''Return the index of the stage referenced by name as in the
+        command line overrides: its tag, stage.<tag> or, for untagged
+        stages, their type if unique (e.g. writers.gdal). None if not found.'''
+        if name.startswith('stage.'):
+            name = name[len('stage.'):]
+        if '.' not in name:
+            return self._tags.get(name)
+        matching = [index for index, stage in enumerate(self._stages)
+                    if not stage.get('tag') and stage.get('type') == name]
+        return matching[0] if len(matching) == 1 else None
+
+    def inputs(self, index):
+        '''Return the indexes of the stages feeding the stage at index.'''
+        return list(self._inputs[index])
+
+    def overrideName(self, stage):
+        '''Return the name used to override options of stage in the
+        command line: stage.<tag> if tagged, otherwise its type.'''
+        if stage.get('tag'):
+            return 'stage.{}'.format(stage['tag'])
+        return stage.get('type')
+
+
+class ProcessOutputReader:
+    '''Event driven reader of a process stdout/stderr pipe.
+    Iterating on it blocks until the process writes something and
+    returns all available complete lines at once. Iteration ends
+    when the pipe is closed (e.g. process terminated or killed).
     '''
+    chunkSize = 65536
+
     def __init__(self, stream):
         '''
-        stream: the stream to read from.
+        stream: the binary stream to read from.
                 Usually a process' stdout or stderr.
         '''
+        self._fd = stream.fileno()
+        self._decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+        self._pending = ''
 
-        self._s = stream
-        self._q = Queue()
+    def __iter__(self):
+        while True:
+            # returns as soon as there is something in the pipe
+            data = os.read(self._fd, self.chunkSize)
+            text = self._pending + self._decoder.decode(data, final=not data)
+            text = text.replace('\r\n', '\n')
+            if not data:
+                # end of stream => flush the last incomplete line
+                self._pending = ''
+                if text:
+                    yield text
+                return
 
-        def _populateQueue(stream, queue):
-            '''
-            Collect lines from 'stream' and put them in 'quque'.
-            '''
+            # keep incomplete last line waiting the rest
+            lines, separator, self._pending = text.rpartition('\n')
+            if separator:
+                yield lines + separator
 
-            while True:
-                try:
-                    if stream:
-                        line = stream.readline()
-                        if line:
-                            queue.put(line)
-                        else:
-                            queue.put('!!!!UnexpectedEndOfStream!!!!')
-                            return
-                            # raise UnexpectedEndOfStream
-                    else:
-                        queue.put('!!!!No more stream!!!!')
-                        return
-                except Exception as ex:
-                    queue.put('!!!!Unexpected exception {}!!!!'.format(str(ex)))
-
-        self._t = Thread(target=_populateQueue,
-                         args=(self._s, self._q))
-        self._t.daemon = True
-        self._t.start() #start collecting lines from the stream
-
-    def __del__(self):
-        if self._t and self._t.is_alive():
-            QgsMessageLog.logMessage('Waiting thread end','PDALTools', Qgis.Info)
-            self._t.wait()
-        QgsMessageLog.logMessage('thread terminated!','PDALTools', Qgis.Info)
-
-    def readline(self, timeout=None):
-        try:
-            return self._q.get(block=timeout is not None,
-                               timeout=timeout)
-        except Empty:
-            return None
 
-# snipped from:
-# http://eyalarubas.com/python-subproc-nonblock.html
-# tnx to: https://github.com/EyalAr
-# adapted to use QgsTask
-class NonBlockingStreamReader:
-    '''Queue reader to avoid stdout/stderr reading block
-    snipped from:
-    http://eyalarubas.com/python-subproc-nonblock.html
-    tnx to: https://github.com/EyalAr
+class ExecutionLog:
+    '''Bounded log of a pdal execution. Only the head and the tail of the
+    log are kept in memory, the full log is written in a compressed file
+    if a folder is set.
     '''
-    def __init__(self, stream):
+    headSize = 64 * 1024
+    tailSize = 256 * 1024
+
+    def __init__(self, folder=None):
+        self.size = 0
+        self._head = []
+        self._headSize = 0
+        self._tail = deque()
+        self._tailSize = 0
+
+        self.fileName = None
+        self._file = None
+        if folder:
+            self.fileName = os.path.join(folder, 'pdaltools_{}.log.gz'.format(uuid.uuid4().hex))
+            # fast compression: log is written while pdal is running
+            self._file = gzip.open(self.fileName, 'wt', encoding='utf-8', compresslevel=1)
+
+    def append(self, text):
+        self.size += len(text)
+        if self._file:
+            self._file.write(text)
+
+        if self._headSize < self.headSize:
+            head = text[:self.headSize - self._headSize]
+            self._head.append(head)
+            self._headSize += len(head)
+            text = text[len(head):]
+            if not text:
+                return
+
+        # ring buffer of the last chunks
+        self._tail.append(text)
+        self._tailSize += len(text)
+        while len(self._tail) > 1 and self._tailSize - len(self._tail[0]) >= self.tailSize:
+            self._tailSize -= len(self._tail.popleft())
+
+    def close(self):
+        if self._file:
+            self._file.close()
+            self._file = None
+
+    def text(self):
+        '''Return head and tail of the log.'''
+        head = ''.join(self._head)
+        tail = ''.join(self._tail)[-self.tailSize:]
+        skipped = self.size - len(head) - len(tail)
+        if skipped <= 0:
+            return head + tail
+
+        where = ', full log in {}'.format(self.fileName) if self.fileName else ''
+        return '{}\n[... {} chars skipped{} ...]\n{}'.format(head, skipped, where, tail)
+
+    def __str__(self):
+        return self.text()
+
+
+class LogForwarder:
+    '''Forward pdal output to slow sinks (e.g. message log and processing
+    console that repaint the GUI) in batches. Lines are collected for
+    interval seconds and sent at once, consecutive repeated lines are
+    collapsed and no more than maxLines lines are forwarded per batch.
+    Lines arrived after a batch are sent by a timer when the interval
+    expires also if the process does not write anything else.
+    '''
+    interval = 0.1
+    maxLines = 200
+
+    def __init__(self, sinks, interval=None, maxLines=None):
         '''
-        stream: the stream to read from.
-                Usually a process' stdout or stderr.
+        sinks: callables receiving the forwarded text.
         '''
+        self.sinks = list(sinks)
+        self.interval = interval or self.interval
+        self.maxLines = maxLines or self.maxLines
+        self._lock = threading.Lock()
+        self._pending = []
+        self._skipped = 0
+        self._lastFlush = 0
+        self._timer = None
 
-        self.task = None
-        self._s = stream
-        self._q = Queue()
-
-        def _populateQueue(task, stream, queue):
-            '''
-            Collect lines from 'stream' and put them in 'quque'.
-            '''
-            while True:
-                line = stream.readline()
-                if line:
-                    queue.put(line)
+    def append(self, text):
+        if not self.sinks:
+            return
+        with self._lock:
+            for line in text.splitlines():
+                if self._pending and self._pending[-1][0] == line:
+                    self._pending[-1][1] += 1
+                elif len(self._pending) < self.maxLines:
+                    self._pending.append([line, 1])
                 else:
-                    break
+                    self._skipped += 1
 
-        self.task=QgsTask.fromFunction('ReadStreamBuffer', _populateQueue, stream=self._s, queue=self._q)
-        QgsApplication.taskManager().addTask(self.task)
+            elapsed = time.monotonic() - self._lastFlush
+            if elapsed >= self.interval:
+                self._flush()
+            elif self._timer is None:
+                self._timer = threading.Timer(self.interval - elapsed, self.flush)
+                self._timer.daemon = True
+                self._timer.start()
 
-    def readline(self, timeout=None):
-        try:
-            return self._q.get(block=timeout is not None,
-                               timeout=timeout)
-        except Empty:
-            try:
-                if not self.task:
-                    return ''
-                if self.task.status() not in [QgsTask.Complete, QgsTask.Terminated]:
-                    return ''
-            except Exception as ex:
-                QgsMessageLog.logMessage('QgsTask end raised exception: {}'.format(str(ex)),'PDALTools', Qgis.Warning)
-                return None
+    def flush(self):
+        with self._lock:
+            self._flush()
+
+    def close(self):
+        '''Forward pending lines and stop the timer.'''
+        self.flush()
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        self._lastFlush = time.monotonic()
+        if not self._pending:
+            return
+
+        lines = []
+        for line, count in self._pending:
+            if count > 1:
+                line = '{} [repeated {} times]'.format(line, count)
+            lines.append(line)
+        if self._skipped:
+            lines.append('[... {} lines not forwarded, see full log ...]'.format(self._skipped))
+        self._pending = []
+        self._skipped = 0
 
-class UnexpectedEndOfStream(Exception):
-    pass
+        # sinks are called holding the lock to keep lines ordered
+        text = '\n'.join(lines)
+        for sink in self.sinks:
+            sink(text)
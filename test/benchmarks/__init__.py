@@ -0,0 +1,2 @@
+# coding=utf-8
+"""Benchmarks of the plugin hot paths. See run_benchmarks.py."""
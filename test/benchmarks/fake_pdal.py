@@ -0,0 +1,141 @@
+# coding=utf-8
+"""Stub of the pdal executable for benchmarks. It emits a configurable
+volume of log lines with a configurable latency and creates the outputs
+of the pipeline writers without processing points.
+
+Environment variables:
+FAKE_PDAL_LINES: number of log lines of "pdal pipeline" (default 100)
+FAKE_PDAL_LINE_SIZE: size of each log line (default 80)
+FAKE_PDAL_LATENCY: seconds waited before exiting (default 0)
+FAKE_PDAL_FAIL: exit with error if set
+
+See install to use it in place of pdal.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+__author__ = 'Luigi Pirelli'
+__date__ = 'October 2026'
+__copyright__ = '(C) 2026, Luigi Pirelli'
+
+import os
+import sys
+import json
+import stat
+import time
+import struct
+
+DRIVERS = [
+    {'name': 'readers.las', 'streamable': True},
+    {'name': 'writers.las', 'streamable': True},
+    {'name': 'filters.range', 'streamable': True},
+    {'name': 'filters.smrf', 'streamable': False},
+    {'name': 'writers.gdal', 'streamable': False},
+]
+
+
+def install(folder):
+    """Install the stub as "pdal" executable in folder. Returns folder,
+    to be put in front of PATH."""
+    os.makedirs(folder, exist_ok=True)
+    pdal = os.path.join(folder, 'pdal')
+    with open(__file__, 'r') as f:
+        source = f.read()
+    with open(pdal, 'w') as f:
+        f.write('#!{}\n'.format(sys.executable))
+        f.write(source)
+    os.chmod(pdal, os.stat(pdal).st_mode | stat.S_IXUSR | stat.S_IXGRP | stat.S_IXOTH)
+    return folder
+
+
+def info(fileName):
+    """Emulate "pdal info --metadata" reading bounds of LAS files."""
+    metadata = {'count': 0, 'minx': 0.0, 'miny': 0.0, 'minz': 0.0, 'maxx': 1.0, 'maxy': 1.0, 'maxz': 1.0}
+    with open(fileName, 'rb') as f:
+        header = f.read(227)
+    if header[:4] == b'LASF' and len(header) == 227:
+        metadata['count'] = struct.unpack_from('<L', header, 107)[0]
+        maxX, minX, maxY, minY, maxZ, minZ = struct.unpack_from('<6d', header, 179)
+        metadata.update({'minx': minX, 'miny': minY, 'minz': minZ, 'maxx': maxX, 'maxy': maxY, 'maxz': maxZ})
+    print(json.dumps({'filename': fileName, 'metadata': metadata}))
+
+
+def pipeline(args):
+    """Emulate "pdal pipeline": log lines and writers outputs."""
+    pipelineFileName = None
+    overrides = []
+    options = []
+    iterator = iter(args)
+    for arg in iterator:
+        if arg in ('-i', '--input'):
+            pipelineFileName = next(iterator)
+        elif arg in ('-s', '--stdin'):
+            pipelineFileName = '-'
+        elif arg.count('.') >= 2 and '=' in arg:
+            key, _, value = arg.partition('=')
+            stage, _, option = key.lstrip('-').rpartition('.')
+            overrides.append((stage, option, value))
+        else:
+            options.append(arg)
+
+    if pipelineFileName == '-':
+        jsondata = json.load(sys.stdin)
+    else:
+        with open(pipelineFileName, 'r') as f:
+            jsondata = json.load(f)
+    stages = jsondata['pipeline'] if isinstance(jsondata, dict) else jsondata
+    stages = [{'filename': stage} if isinstance(stage, str) else stage for stage in stages]
+    if len(stages) > 1 and 'type' not in stages[-1]:
+        stages[-1]['type'] = 'writers.las'
+    for stageName, option, value in overrides:
+        for stage in stages:
+            if stage.get('type') == stageName or 'stage.{}'.format(stage.get('tag')) == stageName:
+                stage[option] = value
+
+    if '--validate' in options:
+        return
+
+    lines = int(os.environ.get('FAKE_PDAL_LINES', 100))
+    lineSize = int(os.environ.get('FAKE_PDAL_LINE_SIZE', 80))
+    names = [stage.get('type', 'readers.las') for stage in stages]
+    for index in range(lines):
+        line = '({} Debug) point {} processed '.format(names[index % len(names)], index)
+        sys.stdout.write(line.ljust(lineSize, '.') + '\n')
+    sys.stdout.flush()
+
+    for stage in stages:
+        if stage.get('type', '').startswith('writers.') and stage.get('filename'):
+            with open(stage['filename'], 'wb') as f:
+                f.write(b'fake')
+    for option in options:
+        if option.startswith('--metadata='):
+            with open(option[len('--metadata='):], 'w') as f:
+                json.dump({'stages': {}}, f)
+
+
+def main(argv):
+    time.sleep(float(os.environ.get('FAKE_PDAL_LATENCY', 0)))
+    if os.environ.get('FAKE_PDAL_FAIL'):
+        sys.stderr.write('PDAL: fake failure\n')
+        return 1
+
+    if argv[:1] == ['--version']:
+        print('pdal 2.6.0 (fake)')
+    elif argv[:1] == ['--drivers']:
+        print(json.dumps(DRIVERS))
+    elif argv[:1] == ['info']:
+        info(argv[-1])
+    elif argv[:1] == ['pipeline']:
+        pipeline(argv[1:])
+    else:
+        sys.stderr.write('PDAL: unsupported fake command {}\n'.format(argv))
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
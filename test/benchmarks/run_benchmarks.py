@@ -0,0 +1,380 @@
+# coding=utf-8
+"""Benchmarks of the plugin hot paths: runAndWait overhead, getDriverType,
+getPCLMetadata and batch throughput. pdal is replaced by fake_pdal and
+inputs are generated by synthetic_las, then timings measure only the
+plugin overhead.
+
+Timings (seconds per operation, best of repeats) are compared with
+baseline.json and the run fails if any benchmark is slower than
+baseline * threshold. Baselines depend on the machine: record them on
+the reference machine with --update-baseline and commit baseline.json
+naming the machine in the commit message.
+
+Until baseline.json is recorded the run only reports timings. Once it
+exists, benchmarks without a baseline make the run fail too, unless
+--allow-missing-baseline is set, so that a stale baseline file cannot
+hide regressions.
+
+    python3 test/benchmarks/run_benchmarks.py [--threshold 1.25] [--update-baseline]
+        [--allow-missing-baseline] [--startup-budget NAME=SECONDS] [names]
+
+Plugin startup (import of the package and provider registration) is
+measured in a fresh interpreter because it slows down QGIS startup for
+every user. Startup steps are stored in the baseline and compared as
+benchmarks; --startup-budget additionally sets a fixed limit (seconds)
+for a step.
+
+Needs a QGIS python environment (e.g. source scripts/run-env-linux.sh).
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+__author__ = 'Luigi Pirelli'
+__date__ = 'October 2026'
+__copyright__ = '(C) 2026, Luigi Pirelli'
+
+import os
+import sys
+import glob
+import json
+import time
+import shutil
+import argparse
+import subprocess
+import tempfile
+import importlib
+
+BENCHMARKS_FOLDER = os.path.dirname(os.path.abspath(__file__))
+PLUGIN_FOLDER = os.path.dirname(os.path.dirname(BENCHMARKS_FOLDER))
+BASELINE = os.path.join(BENCHMARKS_FOLDER, 'baseline.json')
+
+sys.path.insert(0, BENCHMARKS_FOLDER)
+import fake_pdal
+from synthetic_las import writeLas
+
+# name => function(env) returning the number of operations done
+BENCHMARKS = {}
+
+# startup steps measured by STARTUP_SCRIPT. Without iface (as in
+# headless qgis_process) initGui loads algorithms, pipeline catalog and
+# models immediately, then they are part of plugin_init_gui. In QGIS
+# desktop they are loaded when QGIS initialization is completed
+STARTUP_STEPS = ('plugin_import', 'plugin_init_gui')
+
+# run in a fresh interpreter: imports of previous runs would be cached
+STARTUP_SCRIPT = """
+import sys, json, time
+from qgis.core import QgsApplication
+from processing.core.Processing import Processing
+app = QgsApplication([], False)
+app.initQgis()
+Processing.initialize()
+sys.path.insert(0, sys.argv[1])
+sys.path.insert(0, sys.argv[2])
+from qgis_interface import QgisInterface
+timings = {}
+start = time.perf_counter()
+package = __import__(sys.argv[3])
+timings['plugin_import'] = time.perf_counter() - start
+start = time.perf_counter()
+plugin = package.classFactory(QgisInterface(None))
+plugin.initGui()
+timings['plugin_init_gui'] = time.perf_counter() - start
+plugin.unload()
+print(json.dumps(timings))
+app.exitQgis()
+"""
+
+
+def benchmark(name):
+    def register(function):
+        BENCHMARKS[name] = function
+        return function
+    return register
+
+
+def plugin(module):
+    """Import a module of the plugin package."""
+    return importlib.import_module('{}.{}'.format(os.path.basename(PLUGIN_FOLDER), module))
+
+
+class Environment:
+    """QGIS application, plugin settings and fake pdal shared by benchmarks."""
+
+    def __init__(self, folder):
+        from qgis.core import QgsApplication
+        from processing.core.Processing import Processing
+
+        self.folder = folder
+        self.app = QgsApplication([], False)
+        self.app.initQgis()
+        Processing.initialize()
+
+        sys.path.insert(0, os.path.dirname(PLUGIN_FOLDER))
+        self.utils = plugin('pdal_tools_utils').PDALtoolsUtils
+        self.setSetting(self.utils.PDALTOOLS_USE_PYTHON_PDAL, False)
+        self.setSetting(self.utils.PDALTOOLS_METADATA_CACHE, False)
+        self.setSetting(self.utils.PDALTOOLS_SKIP_VALIDATION, False)
+        self.setSetting(self.utils.PDALTOOLS_LOG_TO_CONSOLE, True)
+        self.setSetting(self.utils.PDALTOOLS_LOG_TO_MESSAGE_LOG, True)
+
+        os.environ['PATH'] = fake_pdal.install(os.path.join(folder, 'bin')) + os.pathsep + os.environ['PATH']
+
+        self.inputs = os.path.join(folder, 'inputs')
+        os.makedirs(self.inputs)
+        for index in range(20):
+            writeLas(os.path.join(self.inputs, 'synthetic_{}.las'.format(index)), 10000, seed=index)
+
+        self.pipeline = os.path.join(folder, 'pipeline.json')
+        with open(self.pipeline, 'w') as f:
+            json.dump({'pipeline': [
+                {'type': 'readers.las', 'filename': 'input.las'},
+                {'type': 'filters.range', 'limits': 'Classification[2:2]'},
+                {'type': 'writers.las', 'filename': 'output.las'},
+            ]}, f)
+
+    def setSetting(self, name, value):
+        from processing.core.ProcessingConfig import ProcessingConfig, Setting
+        ProcessingConfig.addSetting(Setting('PDALtools', name, name, value))
+        ProcessingConfig.setSettingValue(name, value)
+
+    def algorithm(self, name='pdal_pipeline_executor', className='PdalPipelineExecutor'):
+        from qgis.core import QgsProcessingFeedback
+        algorithm = getattr(plugin('algorithms.' + name), className)()
+        algorithm.initAlgorithm()
+        algorithm.feedback = QgsProcessingFeedback()
+        return algorithm
+
+    def close(self):
+        self.app.exitQgis()
+
+
+@benchmark('get_driver_type')
+def benchGetDriverType(env):
+    names = ['out.las', 'out.laz', 'dtm.tif', 'dem.asc', 'points.ply', 'points.txt', 'image.png', 'out.copc']
+    for _ in range(1000):
+        for name in names:
+            env.utils.getDriverType(name)
+    return 1000 * len(names)
+
+
+@benchmark('run_and_wait_startup')
+def benchRunAndWaitStartup(env):
+    """Overhead of starting and supervising a pdal process."""
+    os.environ['FAKE_PDAL_LINES'] = '1'
+    algorithm = env.algorithm()
+    algorithm.allowInProcess = False
+    for _ in range(20):
+        algorithm.runAndWait(['pdal', 'pipeline', '-i', env.pipeline])
+    return 20
+
+
+@benchmark('run_and_wait_log')
+def benchRunAndWaitLog(env):
+    """Overhead of reading and forwarding a big pdal log."""
+    os.environ['FAKE_PDAL_LINES'] = '200000'
+    algorithm = env.algorithm()
+    algorithm.allowInProcess = False
+    algorithm.runAndWait(['pdal', 'pipeline', '-i', env.pipeline])
+    return 200000
+
+
+@benchmark('get_pcl_metadata_header')
+def benchGetPCLMetadataHeader(env):
+    """Metadata of LAS files read from their header."""
+    algorithm = env.algorithm()
+    fileNames = sorted(glob.glob(os.path.join(env.inputs, '*.las')))
+    for _ in range(10):
+        for fileName in fileNames:
+            algorithm.getPCLMetadata(fileName)
+    return 10 * len(fileNames)
+
+
+@benchmark('get_pcl_metadata_pdal_info')
+def benchGetPCLMetadataPdalInfo(env):
+    """Metadata of not LAS files get running pdal info."""
+    algorithm = env.algorithm()
+    algorithm.allowInProcess = False
+    fileName = os.path.join(env.folder, 'synthetic.bpf')
+    shutil.copy(os.path.join(env.inputs, 'synthetic_0.las'), fileName)
+    for _ in range(10):
+        algorithm.getPCLMetadata(fileName)
+    return 10
+
+
+@benchmark('get_pcl_metadata_cache')
+def benchGetPCLMetadataCache(env):
+    """Metadata get from the persistent cache."""
+    cacheModule = plugin('pdal_tools_cache')
+    cacheModule.PDALtoolsMetadataCache._instance = cacheModule.PDALtoolsMetadataCache(
+        os.path.join(env.folder, 'metadata_cache.sqlite'))
+    env.setSetting(env.utils.PDALTOOLS_METADATA_CACHE, True)
+    try:
+        algorithm = env.algorithm()
+        fileNames = sorted(glob.glob(os.path.join(env.inputs, '*.las')))
+        for _ in range(10):
+            for fileName in fileNames:
+                algorithm.getPCLMetadata(fileName)
+        return 10 * len(fileNames)
+    finally:
+        env.setSetting(env.utils.PDALTOOLS_METADATA_CACHE, False)
+        cacheModule.PDALtoolsMetadataCache._instance = None
+
+
+@benchmark('batch_throughput')
+def benchBatchThroughput(env):
+    """Seconds per file of the batch executor."""
+    from qgis.core import QgsProcessingContext, QgsProcessingFeedback
+    os.environ['FAKE_PDAL_LINES'] = '1000'
+    algorithm = env.algorithm('pdal_batch_pipeline_executor', 'PdalBatchPipelineExecutor')
+    outputFolder = tempfile.mkdtemp(dir=env.folder)
+    parameters = {
+        'INPUT_FOLDER': env.inputs,
+        'INPUT_PATTERNS': '*.las',
+        'INPUT_PIPELINE': env.pipeline,
+        'OUTPUT_TEMPLATE': '{basename}_out.las',
+        'WORKERS': 4,
+        'INPUT_SKIP_IF_OUT_EXISTS': False,
+        'OUTPUT_FOLDER': outputFolder,
+    }
+    results, ok = algorithm.run(parameters, QgsProcessingContext(), QgsProcessingFeedback())
+    if not ok or results['FAILED']:
+        raise RuntimeError('Batch failed: {}'.format(results))
+    return results['PROCESSED']
+
+
+def measure(function, env, repeats):
+    """Return the best seconds per operation of repeats runs."""
+    best = None
+    for _ in range(repeats):
+        start = time.perf_counter()
+        operations = function(env)
+        seconds = (time.perf_counter() - start) / operations
+        best = seconds if best is None else min(best, seconds)
+    return best
+
+
+def measureStartup(repeats):
+    """Return the best seconds of each startup step of repeats runs."""
+    best = {}
+    for _ in range(repeats):
+        output = subprocess.check_output([sys.executable, '-c', STARTUP_SCRIPT,
+                                          os.path.dirname(PLUGIN_FOLDER),
+                                          os.path.join(PLUGIN_FOLDER, 'test'),
+                                          os.path.basename(PLUGIN_FOLDER)])
+        timings = json.loads(output.decode('utf-8').strip().splitlines()[-1])
+        for name, seconds in timings.items():
+            best[name] = min(best.get(name, seconds), seconds)
+    return best
+
+
+def parseBudgets(parser, values):
+    """Return {startup step: seconds} of --startup-budget NAME=SECONDS values."""
+    budgets = {}
+    for value in values:
+        name, _, seconds = value.partition('=')
+        if name not in STARTUP_STEPS:
+            parser.error('unknown startup step {} (one of {})'.format(name, ', '.join(STARTUP_STEPS)))
+        try:
+            budgets[name] = float(seconds)
+        except ValueError:
+            parser.error('invalid startup budget {}'.format(value))
+    return budgets
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmarks of plugin hot paths')
+    parser.add_argument('names', nargs='*', help='benchmarks to run (default all): {}'.format(', '.join(BENCHMARKS)))
+    parser.add_argument('--repeats', type=int, default=5)
+    parser.add_argument('--threshold', type=float, default=1.25,
+                        help='fail if slower than baseline * threshold')
+    parser.add_argument('--baseline', default=BASELINE)
+    parser.add_argument('--update-baseline', action='store_true', help='store timings as baseline')
+    parser.add_argument('--allow-missing-baseline', action='store_true',
+                        help='do not fail for benchmarks not in an existing baseline')
+    parser.add_argument('--skip-startup', action='store_true', help='do not measure plugin startup')
+    parser.add_argument('--startup-budget', action='append', default=[], metavar='NAME=SECONDS',
+                        help='fail if a startup step ({}) is slower than SECONDS'.format(', '.join(STARTUP_STEPS)))
+    args = parser.parse_args(argv)
+
+    names = args.names or list(BENCHMARKS)
+    for name in names:
+        if name not in BENCHMARKS:
+            parser.error('unknown benchmark {}'.format(name))
+    budgets = parseBudgets(parser, args.startup_budget)
+
+    # without a recorded baseline timings are only reported
+    baseline = None
+    if os.path.exists(args.baseline):
+        with open(args.baseline, 'r') as f:
+            baseline = json.load(f)
+
+    timings = {}
+    regressions = []
+    missing = []
+    overBudget = []
+
+    def report(name, seconds, scale, unit):
+        reference = (baseline or {}).get(name)
+        line = '{:30} {:12.3f} {}'.format(name, seconds * scale, unit)
+        if reference:
+            ratio = seconds / reference
+            if ratio > args.threshold:
+                regressions.append(name)
+            line += '  baseline {:12.3f} {}  x{:.2f} {}'.format(
+                reference * scale, unit, ratio, 'REGRESSION' if ratio > args.threshold else 'ok')
+        else:
+            missing.append(name)
+            line += '  NO BASELINE'
+        if name in budgets:
+            if seconds > budgets[name]:
+                overBudget.append(name)
+            line += '  budget {:12.3f} {} {}'.format(
+                budgets[name] * scale, unit, 'OVER BUDGET' if seconds > budgets[name] else 'ok')
+        print(line)
+
+    if not args.skip_startup:
+        for name, seconds in sorted(measureStartup(args.repeats).items()):
+            timings[name] = seconds
+            report(name, seconds, 1e3, 'ms')
+
+    folder = tempfile.mkdtemp(prefix='pdaltools_benchmarks_')
+    env = Environment(folder)
+    try:
+        for name in names:
+            timings[name] = measure(BENCHMARKS[name], env, args.repeats)
+            report(name, timings[name], 1e6, 'us/op')
+    finally:
+        env.close()
+        shutil.rmtree(folder, ignore_errors=True)
+
+    if args.update_baseline:
+        baseline = baseline or {}
+        baseline.update(timings)
+        with open(args.baseline, 'w') as f:
+            json.dump(baseline, f, indent=2, sort_keys=True)
+            f.write('\n')
+        print('Baseline updated: {}'.format(args.baseline))
+        return 0
+
+    if regressions:
+        print('Slower than baseline * {}: {}'.format(args.threshold, ', '.join(regressions)))
+    if overBudget:
+        print('Startup over budget: {}'.format(', '.join(overBudget)))
+    if baseline is None:
+        print('No baseline recorded in {}: timings are only reported. Record it on the '
+              'reference machine with --update-baseline'.format(args.baseline))
+        missing = []
+    elif missing and not args.allow_missing_baseline:
+        print('No baseline in {} (record it with --update-baseline): {}'.format(args.baseline, ', '.join(missing)))
+    else:
+        missing = []
+    return 1 if regressions or overBudget or missing else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
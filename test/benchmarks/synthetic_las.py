@@ -0,0 +1,91 @@
+# coding=utf-8
+"""Synthetic LAS/LAZ files generator for benchmarks.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+__author__ = 'Luigi Pirelli'
+__date__ = 'October 2026'
+__copyright__ = '(C) 2026, Luigi Pirelli'
+
+import os
+import sys
+import random
+import struct
+import argparse
+
+# point format 3: x, y, z, intensity, return flags, classification,
+# scan angle, user data, point source, gps time, red, green, blue
+POINT_FORMAT = 3
+POINT = struct.Struct('<lllHBBbBHdHHH')
+
+
+def writeLas(fileName, count, bounds=(500000.0, 4000000.0, 501000.0, 4001000.0), scale=0.01, seed=0):
+    """Write a LAS 1.2 file with count random points in bounds
+    (minx, miny, maxx, maxy).
+    Files with .laz extension have a valid LAZ header (compressed point
+    format and laszip VLR) but uncompressed points: they are meant to
+    benchmark header reading only."""
+    compressed = os.path.splitext(fileName)[1].lower() == '.laz'
+    minx, miny, maxx, maxy = bounds
+    minz, maxz = 0.0, 100.0
+
+    vlrs = b''
+    if compressed:
+        laszip = b'\0' * 34
+        vlrs = struct.pack('<H16sHH32s', 0, b'laszip encoded', 22204, len(laszip), b'') + laszip
+
+    headerSize = 227
+    header = b'LASF'
+    header += struct.pack('<HH16sBB32s32sHH', 0, 0, b'', 1, 2, b'synthetic', b'pdaltools benchmarks', 1, 2026)
+    header += struct.pack('<HLLBHL', headerSize, headerSize + len(vlrs), 1 if vlrs else 0,
+                          POINT_FORMAT | (0x80 if compressed else 0), POINT.size, count)
+    header += struct.pack('<5L', count, 0, 0, 0, 0)
+    header += struct.pack('<12d',
+                          scale, scale, scale,
+                          minx, miny, minz,
+                          maxx, minx, maxy, miny, maxz, minz)
+    assert len(header) == headerSize
+
+    rnd = random.Random(seed)
+    maxX = int((maxx - minx) / scale)
+    maxY = int((maxy - miny) / scale)
+    maxZ = int((maxz - minz) / scale)
+    with open(fileName, 'wb') as f:
+        f.write(header)
+        f.write(vlrs)
+        chunk = []
+        for index in range(count):
+            chunk.append(POINT.pack(
+                rnd.randint(0, maxX), rnd.randint(0, maxY), rnd.randint(0, maxZ),
+                rnd.randint(0, 65535), 0x09, rnd.choice((1, 2, 2, 5, 6)),
+                0, 0, 1, float(index),
+                rnd.randint(0, 65535), rnd.randint(0, 65535), rnd.randint(0, 65535)))
+            if len(chunk) == 65536:
+                f.write(b''.join(chunk))
+                chunk = []
+        f.write(b''.join(chunk))
+    return fileName
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Write synthetic LAS/LAZ files')
+    parser.add_argument('--count', type=int, default=100000, help='points per file')
+    parser.add_argument('--files', type=int, default=1, help='number of files')
+    parser.add_argument('folder', help='output folder')
+    parser.add_argument('--extension', default='las', choices=['las', 'laz'])
+    args = parser.parse_args(argv)
+
+    os.makedirs(args.folder, exist_ok=True)
+    for index in range(args.files):
+        writeLas(os.path.join(args.folder, 'synthetic_{}.{}'.format(index, args.extension)),
+                 args.count, seed=index)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,51 @@
+# coding=utf-8
+"""Tests for the batch pipeline executor.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+__author__ = 'Luigi Pirelli'
+__date__ = 'October 2026'
+__copyright__ = '(C) 2026, Luigi Pirelli'
+
+import os
+import sys
+import unittest
+import importlib
+
+from qgis.core import QgsProcessingException
+
+# algorithms use relative imports of the plugin package
+PLUGIN_FOLDER = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(PLUGIN_FOLDER))
+executor = importlib.import_module('{}.algorithms.pdal_batch_pipeline_executor'.format(
+    os.path.basename(PLUGIN_FOLDER)))
+
+
+class BatchExecutorTest(unittest.TestCase):
+    """Test output template validation."""
+
+    def setUp(self):
+        self.algorithm = executor.PdalBatchPipelineExecutor()
+
+    def test_output_template(self):
+        """Templates with allowed fields are file names in the output folder."""
+        self.algorithm.validateOutputTemplate('{basename}_dtm.tif')
+        self.algorithm.validateOutputTemplate('{index}_{name}')
+        with self.assertRaises(QgsProcessingException):
+            self.algorithm.validateOutputTemplate('{unknown}.las')
+
+    def test_output_template_folders(self):
+        """Folders, absolute paths and ".." are rejected."""
+        for template in ('dtm/{basename}.tif', 'dtm\\{basename}.tif', '/tmp/{basename}.las',
+                         '../{basename}.las', '..', '.', ''):
+            with self.assertRaises(QgsProcessingException, msg=template):
+                self.algorithm.validateOutputTemplate(template)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,94 @@
+# coding=utf-8
+"""Tests for the pdal workers daemon.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+__author__ = 'Luigi Pirelli'
+__date__ = 'October 2026'
+__copyright__ = '(C) 2026, Luigi Pirelli'
+
+import os
+import sys
+import time
+import logging
+import tempfile
+import unittest
+import subprocess
+import importlib.util
+
+import pdal_tools_daemon
+from pdal_tools_daemon import PDALtoolsDaemonClient, parseOverrides
+from pdal_tools_common import applyStageOverrides, parseJsonc, setPipelineLogLevel
+
+
+class DaemonTest(unittest.TestCase):
+    """Test daemon protocol and worker recycling."""
+
+    def test_overrides(self):
+        """Overrides reference stages by tag or by type."""
+        stages = [{'type': 'readers.las', 'tag': 'input'}, {'type': 'writers.las'}]
+        overrides = parseOverrides(['--stage.input.filename=a.las', '--writers.las.filename=b.las'])
+        applyStageOverrides(stages, overrides)
+        self.assertEqual([stage['filename'] for stage in stages], ['a.las', 'b.las'])
+        with self.assertRaises(ValueError):
+            applyStageOverrides(stages, [('writers.gdal', 'filename', 'c.tif')])
+
+    def test_jsonc(self):
+        """Workers parse pipeline text as the plugin does."""
+        text = '{"pipeline": [\n  // input\n  "in.las", /* output */ "out.las",\n]}'
+        self.assertEqual(parseJsonc(text), {'pipeline': ['in.las', 'out.las']})
+
+    def test_log_level(self):
+        """Workers set the pipeline log level of the --verbose option."""
+        class Pipeline:
+            loglevel = 0
+
+        class Pdal2:
+            pass
+
+        class Pdal3:
+            class pipeline:
+                LogLevelToPDAL = {}
+
+        pipeline = Pipeline()
+        setPipelineLogLevel(Pdal2, pipeline, 4)
+        self.assertEqual(pipeline.loglevel, 4)
+        setPipelineLogLevel(Pdal3, pipeline, 2)
+        self.assertEqual(pipeline.loglevel, logging.INFO)
+
+    @unittest.skipIf(not hasattr(os, 'fork'), 'Daemon needs fork')
+    def test_recycle(self):
+        """Workers are replaced after max jobs and answer with their pid."""
+        with tempfile.TemporaryDirectory() as tempDir:
+            socketPath = os.path.join(tempDir, 'pdaltools.sock')
+            daemon = subprocess.Popen([sys.executable, pdal_tools_daemon.__file__, 'serve',
+                                       '--socket', socketPath, '--workers', '1', '--max-jobs', '1'])
+            try:
+                for _ in range(50):
+                    if os.path.exists(socketPath):
+                        break
+                    time.sleep(0.1)
+
+                client = PDALtoolsDaemonClient(socketPath)
+                started = []
+                # pipeline references an unknown stage => error without pdal execution
+                request = {'pipeline': [{'type': 'readers.las'}], 'overrides': [('writers.las', 'filename', 'a.las')]}
+                if importlib.util.find_spec('pdal') is None:
+                    request = {'pipeline': []}
+                first = client.submit(request, started.append)
+                second = client.submit(request)
+                self.assertEqual(first['status'], 'error')
+                self.assertEqual(started, [first['pid']])
+                self.assertNotEqual(first['pid'], second['pid'])
+            finally:
+                daemon.terminate()
+                daemon.wait(10)
+
+
+if __name__ == '__main__':
+    unittest.main()
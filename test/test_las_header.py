@@ -0,0 +1,101 @@
+# coding=utf-8
+"""Tests for LAS/LAZ header reading.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+__author__ = 'Luigi Pirelli'
+__date__ = 'October 2026'
+__copyright__ = '(C) 2026, Luigi Pirelli'
+
+import os
+import struct
+import tempfile
+import unittest
+
+from pdal_tools_utils import PDALtoolsUtils
+
+
+def writeLasHeader(fileName, minorVersion=2, pointFormat=3, count=1000, vlrs=()):
+    """Write a LAS header without points with the given VLRs
+    as (userId, recordId, data) tuples."""
+    headerSize = {0: 227, 1: 227, 2: 227, 3: 235, 4: 375}[minorVersion]
+    vlrsData = b''
+    for userId, recordId, data in vlrs:
+        vlrsData += struct.pack('<H16sHH32s', 0, userId.encode('ascii'), recordId, len(data), b'')
+        vlrsData += data
+
+    header = b'LASF'
+    header += struct.pack('<HH16sBB32s32sHH', 0, 0, b'', 1, minorVersion, b'', b'', 1, 2026)
+    legacyCount = count if minorVersion < 4 else 0
+    header += struct.pack('<HLLBHL', headerSize, headerSize + len(vlrsData), len(vlrs),
+                          pointFormat, 34, legacyCount)
+    header += struct.pack('<5L', legacyCount, 0, 0, 0, 0)
+    header += struct.pack('<12d',
+                          0.01, 0.01, 0.01,
+                          500000.0, 4000000.0, 0.0,
+                          500100.5, 500000.5, 4000200.25, 4000000.25, 50.0, -1.5)
+    if minorVersion >= 3:
+        header += struct.pack('<Q', 0)
+    if minorVersion >= 4:
+        header += struct.pack('<QLQ15Q', 0, 0, count, *([0] * 15))
+
+    with open(fileName, 'wb') as f:
+        f.write(header + vlrsData)
+
+
+class LasHeaderTest(unittest.TestCase):
+    """Test PDALtoolsUtils.readLasHeader"""
+
+    def setUp(self):
+        self.tempDir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tempDir.cleanup()
+
+    def test_las_1_2_bounds(self):
+        """Bounds, count, scale and offsets are read from a LAS 1.2 header."""
+        fileName = os.path.join(self.tempDir.name, 'test.las')
+        writeLasHeader(fileName, minorVersion=2, count=1234)
+
+        metadata = PDALtoolsUtils.readLasHeader(fileName)
+        self.assertEqual(metadata['minor_version'], 2)
+        self.assertEqual(metadata['dataformat_id'], 3)
+        self.assertFalse(metadata['compressed'])
+        self.assertEqual(metadata['count'], 1234)
+        self.assertEqual(metadata['minx'], 500000.5)
+        self.assertEqual(metadata['maxx'], 500100.5)
+        self.assertEqual(metadata['miny'], 4000000.25)
+        self.assertEqual(metadata['maxy'], 4000200.25)
+        self.assertEqual(metadata['minz'], -1.5)
+        self.assertEqual(metadata['scale_x'], 0.01)
+        self.assertEqual(metadata['offset_y'], 4000000.0)
+        self.assertEqual(metadata['spatialreference'], '')
+
+    def test_las_1_4_wkt(self):
+        """64 bit point count and WKT VLR are read from a LAZ 1.4 header."""
+        fileName = os.path.join(self.tempDir.name, 'test.laz')
+        wkt = 'PROJCS["WGS 84 / UTM zone 29N"]'
+        writeLasHeader(fileName, minorVersion=4, pointFormat=6 | 0x80, count=5000000000,
+                       vlrs=[('LASF_Projection', 2112, wkt.encode('utf-8') + b'\0')])
+
+        metadata = PDALtoolsUtils.readLasHeader(fileName)
+        self.assertEqual(metadata['dataformat_id'], 6)
+        self.assertTrue(metadata['compressed'])
+        self.assertEqual(metadata['count'], 5000000000)
+        self.assertEqual(metadata['comp_spatialreference'], wkt)
+
+    def test_not_las(self):
+        """None is returned for files that are not LAS."""
+        fileName = os.path.join(self.tempDir.name, 'test.las')
+        with open(fileName, 'wb') as f:
+            f.write(b'not a las file' * 100)
+
+        self.assertIsNone(PDALtoolsUtils.readLasHeader(fileName))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,57 @@
+# coding=utf-8
+"""Tests for batched forwarding of pdal output.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+__author__ = 'Luigi Pirelli'
+__date__ = 'October 2026'
+__copyright__ = '(C) 2026, Luigi Pirelli'
+
+import time
+import unittest
+
+from pdal_tools_utils import LogForwarder
+
+
+class LogForwarderTest(unittest.TestCase):
+    """Test LogForwarder batching."""
+
+    def test_batch(self):
+        """Lines arrived in the same interval are forwarded at once."""
+        forwarded = []
+        forwarder = LogForwarder([forwarded.append], interval=10)
+        forwarder.append('first\n')
+        forwarder.append('second\nthird\n')
+        self.assertEqual(forwarded, ['first'])
+        forwarder.close()
+        self.assertEqual(forwarded, ['first', 'second\nthird'])
+
+    def test_collapse_and_cap(self):
+        """Repeated lines are collapsed and lines exceeding the cap are counted."""
+        forwarded = []
+        forwarder = LogForwarder([forwarded.append], interval=10, maxLines=2)
+        forwarder.append('start\n')
+        forwarder.append('same\nsame\nsame\nother\nlost\nlost too\n')
+        forwarder.close()
+        self.assertEqual(forwarded[1].splitlines(), [
+            'same [repeated 3 times]',
+            'other',
+            '[... 2 lines not forwarded, see full log ...]'])
+
+    def test_timer(self):
+        """Pending lines are forwarded when interval expires."""
+        forwarded = []
+        forwarder = LogForwarder([forwarded.append], interval=0.05)
+        forwarder.append('first\n')
+        forwarder.append('second\n')
+        time.sleep(0.3)
+        self.assertEqual(forwarded, ['first', 'second'])
+        forwarder.close()
+
+if __name__ == '__main__':
+    unittest.main()
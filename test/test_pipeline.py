@@ -0,0 +1,184 @@
+# coding=utf-8
+"""Tests for pipeline parsing.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+__author__ = 'Luigi Pirelli'
+__date__ = 'October 2026'
+__copyright__ = '(C) 2026, Luigi Pirelli'
+
+import os
+import tempfile
+import unittest
+
+from pdal_tools_utils import PDALtoolsUtils, PDALtoolsPipeline
+
+
+PIPELINE = '''{
+    // input file
+    "pipeline": [
+        "input.las", // trailing comment
+        /* multi line
+           comment */
+        {
+            "type": "filters.range",
+            "limits": "Classification[2:2]", // comma before closing bracket
+        },
+        {
+            "type": "filters.merge",
+            "tag": "merged",
+            "inputs": ["ground"],
+        },
+        {
+            "type": "writers.gdal",
+            "filename": "http://host/out.tif",
+            "resolution": 1
+        },
+    ]
+}'''
+
+
+class PipelineTest(unittest.TestCase):
+    """Test pipeline model."""
+
+    def setUp(self):
+        self.tempDir = tempfile.TemporaryDirectory()
+        self.fileName = os.path.join(self.tempDir.name, 'pipeline.json')
+
+    def tearDown(self):
+        self.tempDir.cleanup()
+
+    def writePipeline(self, text):
+        with open(self.fileName, 'w') as f:
+            f.write(text)
+
+    def test_jsonc(self):
+        """Comments and trailing commas are ignored, strings are preserved."""
+        jsondata = PDALtoolsUtils.parseJsonc(PIPELINE)
+        self.assertEqual(len(jsondata['pipeline']), 4)
+        self.assertEqual(jsondata['pipeline'][3]['filename'], 'http://host/out.tif')
+        self.assertEqual(PDALtoolsUtils.parseJsonc('["a,]", "/* b */"]'), ['a,]', '/* b */'])
+
+    def test_stages(self):
+        """Stage types are inferred and inputs resolved by tag or order."""
+        self.writePipeline(PIPELINE.replace('"ground"', '"range"').replace(
+            '"type": "filters.range",', '"type": "filters.range", "tag": "range",'))
+        pipeline = PDALtoolsPipeline.load(self.fileName)
+        self.assertEqual([stage['type'] for stage in pipeline.readers()], ['readers.las'])
+        self.assertEqual(len(pipeline.filters()), 2)
+        self.assertEqual(pipeline.inputs(1), [0])
+        self.assertEqual(pipeline.inputs(2), [1])
+        self.assertEqual(pipeline.inputs(3), [2])
+        self.assertEqual(pipeline.overrideName(pipeline.stageByTag('merged')), 'stage.merged')
+
+        stages = pipeline.stages([('writers.gdal', 'filename', 'out.tif')])
+        self.assertEqual(stages[3]['filename'], 'out.tif')
+        # cached model is not modified by overrides
+        self.assertEqual(pipeline.writers()[0]['filename'], 'http://host/out.tif')
+
+    def test_cache(self):
+        """Pipeline is parsed again only when file changes."""
+        self.writePipeline('["a.las", "b.las"]')
+        pipeline = PDALtoolsPipeline.load(self.fileName)
+        self.assertIs(PDALtoolsPipeline.load(self.fileName), pipeline)
+
+        self.writePipeline('["a.las", "filters.sort", "c.laz"]')
+        os.utime(self.fileName, ns=(0, 0))
+        changed = PDALtoolsPipeline.load(self.fileName)
+        self.assertIsNot(changed, pipeline)
+        self.assertEqual(changed.writers()[0]['filename'], 'c.laz')
+
+    def test_inline(self):
+        """Inline pipelines are sent to pdal via stdin."""
+        text = '{"pipeline": ["a.las", "b.laz"]}'
+        self.assertEqual(PDALtoolsPipeline.load(text).writers()[0]['type'], 'writers.las')
+
+        commandline = ['pdal', 'pipeline', '--verbose=8', '-i', text, '--writers.las.filename=c.las']
+        self.assertEqual(PDALtoolsUtils.stdinCommand(commandline), (
+            ['pdal', 'pipeline', '--verbose=8', '--stdin', '--writers.las.filename=c.las'], text))
+
+        self.writePipeline(text)
+        commandline = ['pdal', 'pipeline', '-i', self.fileName]
+        self.assertEqual(PDALtoolsUtils.stdinCommand(commandline), (commandline, None))
+
+    def test_cloud_optimized(self):
+        """COPC and EPT are recognized by their compound extension or name."""
+        self.assertEqual(PDALtoolsUtils.splitExtension('/a.b/cloud.COPC.laz'), ('/a.b/cloud', '.COPC.laz'))
+        self.assertEqual(PDALtoolsUtils.splitExtension('/data/.copc.laz'), ('/data/.copc', '.laz'))
+        self.assertEqual(PDALtoolsUtils.getDriverType('cloud.copc.laz'), 'copc')
+        self.assertEqual(PDALtoolsUtils.getDriverType('cloud.laz'), 'las')
+        self.assertEqual(PDALtoolsUtils.getDriverType('/data/ept/ept.json'), 'ept')
+
+        pipeline = PDALtoolsPipeline.load('["a.copc.laz", {"type": "writers.las", "filename": "b.laz", "minor_version": 2}]')
+        self.assertEqual(pipeline.readers()[0]['type'], 'readers.copc')
+        jsondata = pipeline.withStageTypes({1: 'writers.copc'}, PDALtoolsUtils.LAS_ONLY_OPTIONS)
+        self.assertEqual(jsondata['pipeline'][1], {'type': 'writers.copc', 'filename': 'b.laz'})
+
+    def test_unknown_extension(self):
+        """Type is not guessed for stages with unknown extension."""
+        self.assertEqual(PDALtoolsUtils.getDriverType('points.bin'), 'las')
+        self.assertIsNone(PDALtoolsUtils.getDriverType('points.bin', default=None))
+        stages = PDALtoolsUtils.pipelineStages(['points.bin', 'mesh.glb', 'out.bin'])
+        self.assertEqual(stages, [{'filename': 'points.bin'}, {'filename': 'mesh.glb'}, {'filename': 'out.bin'}])
+        self.assertEqual(PDALtoolsUtils.pipelineStages(['a.laz', 'b.glb'])[1]['type'], 'writers.gltf')
+
+    def test_stage_index(self):
+        """Stages are referenced by tag or, if untagged and unique, by type."""
+        pipeline = PDALtoolsPipeline.load('[{"type": "readers.las", "tag": "input"}, {"type": "filters.sort"}, "c.xyz"]')
+        self.assertEqual(pipeline.stageIndex('input'), 0)
+        self.assertEqual(pipeline.stageIndex('stage.input'), 0)
+        self.assertEqual(pipeline.stageIndex('writers.text'), 2)
+        # tagged stages are overridden only by tag
+        self.assertIsNone(pipeline.stageIndex('readers.las'))
+        self.assertIsNone(pipeline.stageIndex('output'))
+
+    def test_replace_output(self):
+        """Only writer overrides are redirected to the temporary output."""
+        self.writePipeline('[{"type": "readers.las", "tag": "input"}, {"tag": "out", "filename": "b.xyz"}]')
+        commandline = ['pdal', 'pipeline', '-i', self.fileName,
+                       '--stage.input.filename=a.las', '--stage.out.filename=a.las',
+                       '--readers.las.filename=a.las', '--writers.text.filename=a.las']
+        self.assertEqual(PDALtoolsUtils.replaceOutput(commandline, 'a.las', 'tmp/a.las'), [
+            'pdal', 'pipeline', '-i', self.fileName,
+            '--stage.input.filename=a.las', '--stage.out.filename=tmp/a.las',
+            '--readers.las.filename=a.las', '--writers.text.filename=tmp/a.las'])
+
+    def test_manifest(self):
+        """Outputs are up to date until inputs, pipeline or overrides change."""
+        self.addCleanup(setattr, PDALtoolsUtils, '_pdalVersion', PDALtoolsUtils._pdalVersion)
+        PDALtoolsUtils._pdalVersion = 'pdal 2.6.0'
+        inputFileName = os.path.join(self.tempDir.name, 'a.las')
+        outputFileName = os.path.join(self.tempDir.name, 'b.las')
+        with open(inputFileName, 'w') as f:
+            f.write('points')
+        self.writePipeline('["a.las", {"type": "filters.sort"}, "b.las"]')
+        commandline = ['pdal', 'pipeline', '--verbose=8', '-i', self.fileName,
+                       '--readers.las.filename={}'.format(inputFileName)]
+
+        manifest = PDALtoolsUtils.buildManifest(commandline, hashContent=True)
+        self.assertEqual(list(manifest['inputs']), [inputFileName])
+        self.assertIn('sha256', manifest['inputs'][inputFileName])
+        # run options are not part of the manifest
+        self.assertEqual(manifest, PDALtoolsUtils.buildManifest(
+            PDALtoolsUtils.replaceOptions(commandline, ['--stream']), hashContent=True))
+
+        self.assertFalse(PDALtoolsUtils.isUpToDate(outputFileName, manifest))
+        with open(outputFileName, 'w') as f:
+            f.write('sorted points')
+        self.assertFalse(PDALtoolsUtils.isUpToDate(outputFileName, manifest))
+        PDALtoolsUtils.writeManifest(outputFileName, manifest)
+        self.assertTrue(PDALtoolsUtils.isUpToDate(outputFileName, manifest))
+
+        with open(inputFileName, 'w') as f:
+            f.write('other points')
+        self.assertFalse(PDALtoolsUtils.isUpToDate(outputFileName, PDALtoolsUtils.buildManifest(commandline)))
+        self.assertFalse(PDALtoolsUtils.isUpToDate(outputFileName, PDALtoolsUtils.buildManifest(
+            commandline + ['--filters.sort.dimension=Z'])))
+
+if __name__ == '__main__':
+    unittest.main()
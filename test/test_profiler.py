@@ -0,0 +1,99 @@
+# coding=utf-8
+"""Tests for per-stage profiling of pdal executions.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+__author__ = 'Luigi Pirelli'
+__date__ = 'October 2026'
+__copyright__ = '(C) 2026, Luigi Pirelli'
+
+import os
+import json
+import tempfile
+import unittest
+
+from pdal_tools_profiler import PDALtoolsProfiler
+
+# output of pdal pipeline --log-timing --verbose=8 in standard mode
+LOG = '''(pdal pipeline Debug: 0.001) Attempting to load plugin '/usr/lib/libpdal_plugin_filter_smrf.so'.
+(pdal pipeline Debug: 0.002) Loaded plugin '/usr/lib/libpdal_plugin_filter_smrf.so'.
+(pdal pipeline readers.las Debug: 0.012) Reading 'input.las' with LAS version 1.2
+(pdal pipeline readers.las Debug: 0.015) Read 1000000 points
+(pdal pipeline filters.smrf Debug: 1.215) progressiveFilter: radius = 1
+	243 ground 0 non-ground (0.00%)
+(pdal pipeline filters.smrf Debug: 3.410) progressiveFilter: radius = 18
+	12 ground 0 non-ground (0.00%)
+(pdal pipeline writers.las Debug: 4.010) Wrote 1000000 points to the LAS file
+'''
+
+
+class ProfilerTest(unittest.TestCase):
+    """Test stage timings from pdal log timing."""
+
+    def test_stage_timing(self):
+        """A stage lasts from its first log line to the first one of the next stage."""
+        profiler = PDALtoolsProfiler()
+        run = object()
+        # chunks of complete lines as forwarded by the runner
+        lines = LOG.splitlines(True)
+        profiler.parseLog(''.join(lines[:5]), run)
+        profiler.parseLog(''.join(lines[5:]), run)
+        profiler.pipelineRun(5.0, run)
+
+        report = profiler.report()
+        stages = report['stages']
+        self.assertEqual(report['stage_timing'], PDALtoolsProfiler.TIMING_AVAILABLE)
+        self.assertAlmostEqual(report['pipeline_time'], 5.0)
+        self.assertAlmostEqual(stages['pdal pipeline']['wall_time'], 0.011)
+        self.assertAlmostEqual(stages['readers.las']['wall_time'], 1.203)
+        self.assertAlmostEqual(stages['filters.smrf']['wall_time'], 2.795)
+        # last stage runs until the end of the process
+        self.assertAlmostEqual(stages['writers.las']['wall_time'], 0.99)
+        self.assertEqual(stages['filters.smrf']['log_lines'], 2)
+
+    def test_points_per_second(self):
+        """Point counts of the metadata file are divided by stage time."""
+        profiler = PDALtoolsProfiler()
+        run = object()
+        profiler.parseLog(LOG, run)
+        profiler.pipelineRun(5.0, run)
+        with tempfile.TemporaryDirectory() as tempDir:
+            fileName = os.path.join(tempDir, 'metadata.json')
+            with open(fileName, 'w') as f:
+                json.dump({'stages': {'readers.las': {'count': 1203000}}}, f)
+            profiler.parseMetadataFile(fileName)
+        stage = profiler.report()['stages']['readers.las']
+        self.assertAlmostEqual(stage['points_per_second'], 1000000)
+
+    def test_untimed(self):
+        """Runs without log timing report only the pipeline time."""
+        profiler = PDALtoolsProfiler()
+        run = object()
+        profiler.parseLog(LOG, run)
+        profiler.pipelineRun(5.0, run)
+        # e.g. python-pdal or stream mode
+        profiler.parseLog('(pdal pipeline readers.las Debug) Read 1000 points\n')
+        profiler.pipelineRun(2.0)
+
+        report = profiler.report()
+        self.assertEqual(report['stage_timing'], PDALtoolsProfiler.TIMING_UNAVAILABLE)
+        self.assertAlmostEqual(report['pipeline_time'], 7.0)
+        self.assertEqual(report['pipeline_runs'], 2)
+        self.assertIsNone(report['stages']['readers.las']['wall_time'])
+
+    def test_validation_not_timed(self):
+        """Only pipeline executions get log timing."""
+        commandline = ['pdal', 'pipeline', '--validate', '-i', 'pipeline.json']
+        self.assertIsNone(PDALtoolsProfiler.logTimingCommand(commandline))
+        self.assertIsNone(PDALtoolsProfiler.logTimingCommand(['pdal', 'pipeline', '--stream', '-i', 'pipeline.json']))
+        self.assertEqual(PDALtoolsProfiler.logTimingCommand(['pdal', 'pipeline', '-i', 'pipeline.json']),
+                         ['pdal', 'pipeline', '--log-timing', '-i', 'pipeline.json'])
+
+
+if __name__ == '__main__':
+    unittest.main()
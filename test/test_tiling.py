@@ -0,0 +1,146 @@
+# coding=utf-8
+"""Tests for tiled execution of pipelines.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+__author__ = 'Luigi Pirelli'
+__date__ = 'October 2026'
+__copyright__ = '(C) 2026, Luigi Pirelli'
+
+import math
+import unittest
+
+from pdal_tools_tiling import PDALtoolsTiling
+
+
+class PDALtoolsTilingTest(unittest.TestCase):
+    """Test tiles and tile pipelines."""
+
+    def test_tiles(self):
+        """Tiles cover the bounds with buffered areas around the core."""
+        tiles = PDALtoolsTiling.tiles((0, 0, 250, 100), 100, 10)
+        self.assertEqual(len(tiles), 3)
+        first = tiles[0]
+        self.assertEqual(first.core, (0, 0, 100, 100))
+        self.assertEqual(first.buffered, (-10, -10, 110, 110))
+        last = tiles[-1]
+        self.assertTrue(last.isLastColumn)
+        self.assertEqual(last.core, (200, 0, 250, 100))
+
+    def test_raster_tiles(self):
+        """Raster tiles are aligned to resolution and buffered from the tile area."""
+        tiles = PDALtoolsTiling.tiles((0, 0, 250, 250), 95, 5, resolution=2)
+        # 95 is rounded to 96
+        self.assertEqual(len(tiles), 9)
+        first = tiles[0]
+        # core ends a cell before the next tile
+        self.assertEqual(first.core, (0, 0, 94, 94))
+        self.assertEqual(first.buffered, (-5, -5, 101, 101))
+
+    def test_tile_stages(self):
+        """Tile pipelines crop the buffer after readers and the core before writers."""
+        stages = [
+            {'type': 'readers.copc', 'filename': 'in.copc.laz'},
+            {'type': 'filters.smrf'},
+            {'type': 'writers.las', 'filename': 'out.las'},
+        ]
+        tile = PDALtoolsTiling.tiles((0, 0, 200, 100), 100, 10)[0]
+        tileStages = PDALtoolsTiling.tileStages(stages, tile, 'tile.las')
+        self.assertEqual([stage['type'] for stage in tileStages],
+                         ['readers.copc', 'filters.crop', 'filters.smrf', 'filters.range', 'writers.las'])
+        self.assertEqual(tileStages[0]['bounds'], '([-10, 110], [-10, 110])')
+        self.assertEqual(tileStages[3]['limits'], 'X[0:100),Y[0:100]')
+        self.assertEqual(tileStages[-1]['filename'], 'tile.las')
+        # original stages are not changed
+        self.assertNotIn('bounds', stages[0])
+
+    def test_tile_stages_gdal(self):
+        """gdal writers get the core as bounds."""
+        stages = [
+            {'type': 'readers.copc', 'filename': 'in.copc.laz'},
+            {'type': 'writers.gdal', 'filename': 'out.tif', 'resolution': 1},
+        ]
+        tile = PDALtoolsTiling.tiles((0, 0, 200, 100), 100, 10, resolution=1)[0]
+        tileStages = PDALtoolsTiling.tileStages(stages, tile, 'tile.tif')
+        self.assertEqual([stage['type'] for stage in tileStages],
+                         ['readers.copc', 'filters.crop', 'writers.gdal'])
+        self.assertEqual(tileStages[-1]['bounds'], '([0, 99], [0, 100])')
+
+    def test_split_inputs(self):
+        """Split readers are replaced by the split files of the tile."""
+        stages = [
+            {'type': 'readers.las', 'filename': 'in.las', 'tag': 'input', 'nosrs': True},
+            {'type': 'writers.las', 'filename': 'out.las'},
+        ]
+        self.assertEqual(PDALtoolsTiling.splitReaders(stages), [0])
+        tiles = PDALtoolsTiling.tiles((0, 0, 200, 100), 100, 10)
+        splitFileNames = {(0, 0): 'split_0_0.las', (1, 0): 'split_1_0.las', (2, 0): 'split_2_0.las'}
+
+        # points on the max border are in the next column, with a
+        # buffer also in the buffer of the tile file
+        self.assertEqual(PDALtoolsTiling.splitFiles(tiles[1], splitFileNames), ['split_1_0.las', 'split_2_0.las'])
+        self.assertEqual(PDALtoolsTiling.splitFiles(tiles[1], splitFileNames, 10), ['split_1_0.las'])
+
+        splitInputs = {0: PDALtoolsTiling.splitFiles(tiles[0], splitFileNames)}
+        tileStages = PDALtoolsTiling.tileStages(stages, tiles[0], 'tile.las', splitInputs)
+        self.assertEqual(tileStages[0], {'type': 'readers.las', 'filename': 'split_0_0.las', 'nosrs': True})
+        self.assertEqual(tileStages[1]['type'], 'filters.crop')
+
+        # tile without points
+        self.assertIsNone(PDALtoolsTiling.tileStages(stages, tiles[0], 'tile.las', {0: []}))
+
+    def test_split_counts(self):
+        """Merging tiles of split inputs gives the points of the untiled run."""
+        bounds = (0, 0, 200, 100)
+        # points also on tile and max borders
+        points = [(x, y) for x in range(0, 201, 5) for y in range(0, 101, 5)]
+        for tileBuffer in (0, 10):
+            tiles = PDALtoolsTiling.tiles(bounds, 100, tileBuffer)
+            splitFileNames = splitPoints(points, bounds, 100, tileBuffer)
+            total = 0
+            for tile in tiles:
+                splitInputs = PDALtoolsTiling.splitFiles(tile, splitFileNames, tileBuffer)
+                total += len([point for fileName in splitInputs for point in fileName
+                              if inBuffered(tile, point) and inCore(tile, point)])
+            self.assertEqual(total, len(points), 'buffer {}'.format(tileBuffer))
+
+
+def splitPoints(points, bounds, length, tileBuffer):
+    """Emulate "pdal tile": (column, row) => points of the tile and of
+    its buffer. Split "files" are the lists of points."""
+    splitFileNames = {}
+    for x, y in points:
+        column = math.floor((x - bounds[0]) / length)
+        row = math.floor((y - bounds[1]) / length)
+        for dx in (-1, 0, 1):
+            for dy in (-1, 0, 1):
+                x0 = bounds[0] + (column + dx) * length
+                y0 = bounds[1] + (row + dy) * length
+                if (dx, dy) == (0, 0) or (tileBuffer and
+                        x0 - tileBuffer <= x <= x0 + length + tileBuffer and
+                        y0 - tileBuffer <= y <= y0 + length + tileBuffer):
+                    splitFileNames.setdefault((column + dx, row + dy), []).append((x, y))
+    return splitFileNames
+
+
+def inBuffered(tile, point):
+    """Same as the filters.crop of the tile pipeline."""
+    minx, miny, maxx, maxy = tile.buffered
+    return minx <= point[0] <= maxx and miny <= point[1] <= maxy
+
+
+def inCore(tile, point):
+    """Same as the filters.range of the tile pipeline."""
+    minx, miny, maxx, maxy = tile.core
+    x, y = point
+    return (minx <= x and (x <= maxx if tile.isLastColumn else x < maxx) and
+            miny <= y and (y <= maxy if tile.isLastRow else y < maxy))
+
+
+if __name__ == '__main__':
+    unittest.main()